@@ -9,4 +9,7 @@ npm run build
 # Copy the build output to the Django static directory
 cp -r dist/* backend/frontend_static/
 
+# Fingerprint and precompress the assets for immutable caching
+(cd backend && python manage.py build_frontend_manifest)
+
 echo "React app built and copied to backend/frontend_static/ successfully." 
\ No newline at end of file
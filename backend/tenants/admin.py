@@ -1,41 +1,41 @@
 from django.contrib import admin, messages
-from django.core.management import call_command
 from tenants.models import Tenant
-from websites.models import Website
-from django.db import connection
+from tenants.provisioning import get_progress, start_provisioning
 from django.utils.html import format_html
 
+PROGRESS_COLORS = {
+    'queued': '#666',
+    'migrating': '#2271b1',
+    'done': '#008000',
+    'skipped': '#008000',
+    'failed': '#ba2121',
+}
+
 @admin.action(description="Automate migrations and create default website for selected tenants")
 def automate_tenant_setup(modeladmin, request, queryset):
-    # Run migrate_schemas (for all schemas)
-    call_command('migrate_schemas', interactive=False)
-    created_count = 0
-    for tenant in queryset:
-        # Switch to tenant schema
-        connection.set_schema(tenant.schema_name)
-        # Create a default website if none exists
-        if not Website.objects.exists():
-            Website.objects.create(
-                tenant=tenant,
-                name='Default Website',
-                slug='default-website',
-                template='default',
-                content={},
-                is_published=False,
-                meta_title='Default Website',
-                meta_description='A default website',
-                meta_keywords='default,website',
-                facebook_url='',
-                twitter_url='',
-                instagram_url='',
-                linkedin_url='',
-            )
-            created_count += 1
-    connection.set_schema_to_public()
-    messages.success(request, f"Migrations complete. Created {created_count} default website(s) for selected tenants.")
+    # Migrates only the selected schemas, in the background; see the Provisioning column
+    schema_names = list(queryset.values_list('schema_name', flat=True))
+    start_provisioning(schema_names)
+    messages.success(
+        request,
+        f"Provisioning started for {len(schema_names)} tenant(s). "
+        "Refresh this page to follow progress in the Provisioning column."
+    )
 
 class TenantAdmin(admin.ModelAdmin):
-    list_display = ("name", "schema_name", "created_on", "is_active")
+    list_display = ("name", "schema_name", "created_on", "is_active", "provisioning_status")
     actions = [automate_tenant_setup]
 
+    def provisioning_status(self, obj):
+        progress = get_progress([obj.schema_name]).get(obj.schema_name)
+        if progress is None:
+            return '-'
+        return format_html(
+            '<span style="color: {}" title="{}">{}</span>',
+            PROGRESS_COLORS.get(progress['state'], '#666'),
+            progress['detail'],
+            progress['state'],
+        )
+    provisioning_status.short_description = 'Provisioning'
+
 admin.site.register(Tenant, TenantAdmin)
@@ -0,0 +1,234 @@
+"""
+Per-worker cache of hostname -> tenant resolution.
+
+Entries are kept in a bounded LRU with a TTL. Unknown hostnames are cached
+too (with a shorter TTL) so that bots hammering random hosts don't reach the
+database. Domain/Tenant signals invalidate entries locally and publish the
+invalidation to the other workers over ``website_builder.pubsub``.
+
+ASGI code should use ``aresolve_hostname``: hits are answered without leaving
+the event loop and misses are looked up on a small dedicated thread pool.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+from website_builder import pubsub
+
+INVALIDATION_CHANNEL = 'tenants:domain-cache'
+
+# tier is 'trial' or 'paid', used for telemetry sampling
+TenantRoute = namedtuple('TenantRoute', ['tenant_id', 'schema_name', 'tier'])
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+class DomainCache:
+    """
+    Thread-safe LRU/TTL map of hostname -> TenantRoute (or None for unknown hosts)
+    """
+
+    def __init__(self, max_entries=10000, timeout=300, negative_timeout=30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, hostname):
+        """
+        Return the cached route, None for a cached miss, or _MISSING
+        """
+        with self._lock:
+            entry = self._entries.get(hostname)
+            if entry is None:
+                return _MISSING
+            route, expires = entry
+            if expires < time.monotonic():
+                del self._entries[hostname]
+                return _MISSING
+            self._entries.move_to_end(hostname)
+            return route
+
+    def set(self, hostname, route):
+        timeout = self.timeout if route is not None else self.negative_timeout
+        with self._lock:
+            self._entries[hostname] = (route, time.monotonic() + timeout)
+            self._entries.move_to_end(hostname)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_hostname(self, hostname):
+        with self._lock:
+            self._entries.pop(hostname, None)
+
+    def invalidate_tenant(self, tenant_id):
+        with self._lock:
+            stale = [
+                hostname for hostname, (route, _) in self._entries.items()
+                if route is not None and route.tenant_id == tenant_id
+            ]
+            for hostname in stale:
+                del self._entries[hostname]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_config = getattr(settings, 'TENANT_DOMAIN_CACHE', {})
+domain_cache = DomainCache(
+    max_entries=_config.get('MAX_ENTRIES', 10000),
+    timeout=_config.get('TIMEOUT', 300),
+    negative_timeout=_config.get('NEGATIVE_TIMEOUT', 30),
+)
+
+
+def _route(tenant_id, schema_name, on_trial):
+    return TenantRoute(tenant_id, schema_name, 'trial' if on_trial else 'paid')
+
+
+def peek(hostname):
+    """
+    Cached route for a hostname without ever querying; None if not cached
+    """
+    route = domain_cache.get(hostname)
+    return None if route is _MISSING else route
+
+
+def lookup_hostname(hostname):
+    """
+    Resolve a hostname against the database, bypassing the cache
+    """
+    from .models import Domain
+
+    row = (
+        Domain.objects
+        .filter(domain=hostname)
+        .values_list('tenant_id', 'tenant__schema_name', 'tenant__on_trial')
+        .first()
+    )
+    return _route(*row) if row else None
+
+
+def resolve_hostname(hostname):
+    """
+    Resolve a hostname to a TenantRoute, or None if no domain matches
+    """
+    pubsub.ensure_listener()
+    route = domain_cache.get(hostname)
+    if route is _MISSING:
+        route = lookup_hostname(hostname)
+        domain_cache.set(hostname, route)
+    return route
+
+
+def _lookup_in_thread(hostname):
+    close_old_connections()
+    return lookup_hostname(hostname)
+
+
+_lookup_executor = ThreadPoolExecutor(
+    max_workers=_config.get('LOOKUP_THREADS', 4),
+    thread_name_prefix='tenant-lookup',
+)
+_inflight = {}
+
+
+def _finish_lookup(hostname, future):
+    _inflight.pop(hostname, None)
+    if not future.cancelled() and future.exception() is None:
+        domain_cache.set(hostname, future.result())
+
+
+async def aresolve_hostname(hostname):
+    """
+    Async variant of resolve_hostname that never runs the ORM on the event loop.
+    Concurrent misses for the same hostname share a single lookup.
+    """
+    pubsub.ensure_listener()
+    route = domain_cache.get(hostname)
+    if route is not _MISSING:
+        return route
+
+    future = _inflight.get(hostname)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_lookup_executor, _lookup_in_thread, hostname)
+        future.add_done_callback(lambda f: _finish_lookup(hostname, f))
+        _inflight[hostname] = future
+    # Shielded so one disconnecting client doesn't cancel the lookup for the others
+    return await asyncio.shield(future)
+
+
+def preload():
+    """
+    Warm the cache with every known domain, up to MAX_ENTRIES.
+    Returns the number of hostnames loaded.
+    """
+    from .models import Domain
+
+    rows = (
+        Domain.objects
+        .values_list('domain', 'tenant_id', 'tenant__schema_name', 'tenant__on_trial')
+        .order_by('-is_primary', 'domain')[:domain_cache.max_entries]
+    )
+    count = 0
+    for hostname, tenant_id, schema_name, on_trial in rows.iterator():
+        domain_cache.set(hostname, _route(tenant_id, schema_name, on_trial))
+        count += 1
+    logger.info(f"Preloaded {count} tenant domains")
+    return count
+
+
+def _preload_in_thread():
+    close_old_connections()
+    try:
+        preload()
+    except DatabaseError as e:
+        logger.warning(f"Could not preload tenant domains: {e}")
+    finally:
+        close_old_connections()
+
+
+def start_preload():
+    """
+    Warm the cache in the background on the lookup thread pool. Safe to call
+    from module import under an already running event loop.
+    """
+    return _lookup_executor.submit(_preload_in_thread)
+
+
+def _apply_invalidation(message):
+    if message is None:
+        domain_cache.clear()
+        return
+    if message.get('hostname'):
+        domain_cache.invalidate_hostname(message['hostname'])
+    if message.get('tenant_id') is not None:
+        domain_cache.invalidate_tenant(message['tenant_id'])
+
+
+def invalidate(hostname=None, tenant_id=None):
+    """
+    Drop matching entries in this worker now and in every worker once the
+    current transaction commits
+    """
+    message = {'hostname': hostname, 'tenant_id': tenant_id}
+    _apply_invalidation(message)
+    transaction.on_commit(lambda: pubsub.publish(INVALIDATION_CHANNEL, message))
+
+
+pubsub.subscribe(INVALIDATION_CHANNEL, _apply_invalidation)
@@ -0,0 +1,99 @@
+"""
+Tenant-scoped cacheops keys.
+
+``cacheops_prefix`` (settings.CACHEOPS_PREFIX) puts every cacheops key, and
+the invalidation sets cacheops keeps next to them, under
+'<schema>:<generation>:'. Querysets that only touch shared tables use the
+public schema, so Domain/Tenant lookups are cached once for every tenant.
+
+``flush_tenant`` bumps a tenant's generation. Its old entries are never
+read again and expire with their timeout, so a flush costs one INCR instead
+of a SCAN over the whole database. Generations are cached per process and
+kept in sync over website_builder.pubsub.
+"""
+
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django_tenants.utils import get_public_schema_name
+from redis.exceptions import RedisError
+
+from website_builder import pubsub
+
+GENERATIONS_KEY = 'cacheops:generations'
+GENERATION_CHANNEL = 'tenants:cacheops-generation'
+
+logger = logging.getLogger(__name__)
+
+_generations = {}
+_shared_tables = None
+
+
+def shared_tables():
+    """
+    Tables of apps that only live in the public schema
+    """
+    global _shared_tables
+    if _shared_tables is None:
+        tenant_apps = set(settings.TENANT_APPS)
+        _shared_tables = frozenset(
+            model._meta.db_table
+            for config in apps.get_app_configs() if config.name not in tenant_apps
+            for model in config.get_models(include_auto_created=True)
+        )
+    return _shared_tables
+
+
+def generation(schema_name):
+    gen = _generations.get(schema_name)
+    if gen is None:
+        pubsub.ensure_listener()
+        try:
+            gen = int(pubsub.get_redis().hget(GENERATIONS_KEY, schema_name) or 0)
+        except RedisError as e:
+            # cacheops can't work either; don't remember a guess
+            logger.warning(f"Could not read cache generation of {schema_name}: {e}")
+            return 0
+        _generations[schema_name] = gen
+    return gen
+
+
+def cacheops_prefix(query):
+    public = get_public_schema_name()
+    try:
+        tables = query.tables
+    except AttributeError:
+        # Some cacheops calls (e.g. the reaper) only pass the database
+        tables = None
+    if tables and shared_tables().issuperset(tables):
+        schema_name = public
+    else:
+        schema_name = getattr(connection, 'schema_name', public)
+    return f'{schema_name}:{generation(schema_name)}:'
+
+
+def _apply_generation(message):
+    if message is None:
+        _generations.clear()
+        return
+    schema_name = message['schema_name']
+    _generations[schema_name] = max(_generations.get(schema_name, 0), message['generation'])
+
+
+def flush_tenant(schema_name):
+    """
+    Drop every cacheops entry of a tenant, in all workers, once the current
+    transaction commits
+    """
+    def bump():
+        gen = pubsub.get_redis().hincrby(GENERATIONS_KEY, schema_name, 1)
+        message = {'schema_name': schema_name, 'generation': gen}
+        _apply_generation(message)
+        pubsub.publish(GENERATION_CHANNEL, message)
+
+    transaction.on_commit(bump)
+
+
+pubsub.subscribe(GENERATION_CHANNEL, _apply_generation)
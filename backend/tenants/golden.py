@@ -0,0 +1,157 @@
+"""
+Golden schema: a fully migrated template that new tenant schemas are cloned
+from, instead of replaying every migration for each tenant.
+
+The golden schema records the migration set it was built from in its schema
+comment. When the migrations on disk change it is rebuilt (in a scratch
+schema that is then swapped in) before the next clone, or ahead of time with
+``manage.py build_golden_schema``. Rows in the golden schema, including
+django_migrations, are copied along with the DDL. Per-tenant seed data such
+as the default Website is created after the clone (tenants.signals).
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django_tenants.clone import CloneSchema
+
+logger = logging.getLogger(__name__)
+
+VERSION_PREFIX = 'golden:'
+BUILD_LOCK_KEY = 'tenants:golden:build'
+# Postgres advisory lock: shared while cloning, exclusive while swapping
+SWAP_LOCK_ID = 0x676f6c64
+
+_version = None
+
+
+def enabled():
+    return getattr(settings, 'TENANT_GOLDEN_SCHEMA_ENABLED', False)
+
+
+def schema_name():
+    return getattr(settings, 'TENANT_GOLDEN_SCHEMA', 'golden_template')
+
+
+def _migration_source(migration):
+    module = sys.modules.get(type(migration).__module__)
+    path = getattr(module, '__file__', None)
+    if not path:
+        return b''
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def migrations_version():
+    """
+    Hash of the name and source of every migration on disk. Computed once
+    per process.
+    """
+    global _version
+    if _version is None:
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        digest = hashlib.sha256()
+        for (app, name), migration in sorted(loader.disk_migrations.items()):
+            digest.update(f'{app}.{name}\n'.encode())
+            digest.update(_migration_source(migration))
+        _version = digest.hexdigest()[:16]
+    return _version
+
+
+def built_version(name=None):
+    """
+    Version recorded on the golden schema, or None if it doesn't exist
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname = %s",
+            [name or schema_name()],
+        )
+        row = cursor.fetchone()
+    if not row or not row[0] or not row[0].startswith(VERSION_PREFIX):
+        return None
+    return row[0][len(VERSION_PREFIX):]
+
+
+def is_current():
+    return built_version() == migrations_version()
+
+
+@contextmanager
+def _build_lock(timeout=600):
+    """
+    Only one process rebuilds at a time. Held in the cache rather than as an
+    advisory lock because migrate_schemas closes the database connection.
+    """
+    while not cache.add(BUILD_LOCK_KEY, os.getpid(), timeout):
+        time.sleep(0.5)
+    try:
+        yield
+    finally:
+        cache.delete(BUILD_LOCK_KEY)
+
+
+@contextmanager
+def _swap_lock(shared=False):
+    """
+    Session advisory lock on the golden schema. Clones hold it shared so a
+    concurrent build can't drop the schema they are copying.
+    """
+    suffix = '_shared' if shared else ''
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT pg_advisory_lock{suffix}(%s)', [SWAP_LOCK_ID])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT pg_advisory_unlock{suffix}(%s)', [SWAP_LOCK_ID])
+
+
+def build(force=False, verbosity=0):
+    """
+    (Re)build the golden schema if it is missing or out of date.
+    Returns True if it was rebuilt.
+    """
+    golden = schema_name()
+    scratch = f'{golden}_build'
+    qn = connection.ops.quote_name
+    connection.set_schema_to_public()
+    with _build_lock():
+        version = migrations_version()
+        if not force and built_version(golden) == version:
+            return False
+        logger.info(f"Building golden schema {golden} at version {version}")
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {qn(scratch)} CASCADE')
+            cursor.execute(f'CREATE SCHEMA {qn(scratch)}')
+        call_command('migrate_schemas', tenant=True, schema_name=scratch,
+                     interactive=False, verbosity=verbosity)
+        connection.set_schema_to_public()
+        # Swap the new schema in once no clone is reading the old one
+        with _swap_lock(), connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {qn(golden)} CASCADE')
+            cursor.execute(f'ALTER SCHEMA {qn(scratch)} RENAME TO {qn(golden)}')
+            cursor.execute(f'COMMENT ON SCHEMA {qn(golden)} IS %s', [VERSION_PREFIX + version])
+        return True
+
+
+def clone_into(new_schema_name):
+    """
+    Create ``new_schema_name`` as a copy of the golden schema, rebuilding
+    the golden schema first if migrations changed
+    """
+    if not is_current():
+        build()
+    with _swap_lock(shared=True):
+        CloneSchema().clone_schema(schema_name(), new_schema_name)
+    connection.set_schema_to_public()
+
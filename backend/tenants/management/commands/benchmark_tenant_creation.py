@@ -0,0 +1,57 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from tenants import golden
+from tenants.models import Tenant
+
+
+class Command(BaseCommand):
+    help = 'Time tenant creation with the golden schema versus running migrations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', default='1,100,1000', help='Comma separated tenant counts')
+        parser.add_argument('--modes', default='golden,migrate', help='golden and/or migrate')
+        parser.add_argument('--keep', action='store_true', help="Don't delete the benchmark tenants")
+
+    def create_tenants(self, count):
+        created, durations = [], []
+        for _ in range(count):
+            name = f'bench_{uuid.uuid4().hex[:12]}'
+            start = time.perf_counter()
+            tenant = Tenant(schema_name=name, name=name)
+            tenant.save(verbosity=0)
+            durations.append(time.perf_counter() - start)
+            created.append(tenant)
+        return created, durations
+
+    def cleanup(self, tenants):
+        connection.set_schema_to_public()
+        for tenant in tenants:
+            tenant.delete(force_drop=True)
+
+    def handle(self, *args, **options):
+        counts = [int(c) for c in options['counts'].split(',')]
+        modes = options['modes'].split(',')
+        if 'golden' in modes:
+            # Building the template is a one-off cost, not part of creation
+            golden.build()
+
+        self.stdout.write(f'{"mode":<8} {"tenants":>8} {"total s":>9} {"mean ms":>9} {"p95 ms":>9}')
+        for mode in modes:
+            for count in counts:
+                with override_settings(TENANT_GOLDEN_SCHEMA_ENABLED=(mode == 'golden')):
+                    tenants, durations = self.create_tenants(count)
+                if not options['keep']:
+                    self.cleanup(tenants)
+                durations.sort()
+                p95 = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+                self.stdout.write(
+                    f'{mode:<8} {count:>8} {sum(durations):>9.2f} '
+                    f'{statistics.mean(durations) * 1000:>9.1f} {p95 * 1000:>9.1f}'
+                )
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tenants import golden
+
+
+class Command(BaseCommand):
+    help = 'Build the golden schema new tenants are cloned from, if migrations changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild even if it is up to date')
+
+    def handle(self, *args, **options):
+        rebuilt = golden.build(force=options['force'], verbosity=options['verbosity'])
+        state = 'Built' if rebuilt else 'Already up to date:'
+        self.stdout.write(self.style.SUCCESS(
+            f'{state} golden schema {golden.schema_name()} (version {golden.migrations_version()})'
+        ))
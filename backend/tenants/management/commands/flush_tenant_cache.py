@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tenants.cache_prefix import flush_tenant
+
+
+class Command(BaseCommand):
+    help = "Drop the cached querysets of the given tenant schemas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('schemas', nargs='+', help='Tenant schema names')
+
+    def handle(self, *args, **options):
+        for schema_name in options['schemas']:
+            flush_tenant(schema_name)
+            self.stdout.write(self.style.SUCCESS(f'Flushed cache of {schema_name}'))
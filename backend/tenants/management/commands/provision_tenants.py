@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_public_schema_name
+
+from tenants.models import Tenant
+from tenants.provisioning import provision
+
+
+class Command(BaseCommand):
+    help = 'Migrate tenant schemas that are behind and create their default websites'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema to provision (repeatable; default: all tenants)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Parallel migration processes (default: TENANT_PROVISIONING_WORKERS)')
+
+    def handle(self, *args, **options):
+        schemas = options['schemas'] or list(
+            Tenant.objects.exclude(schema_name=get_public_schema_name())
+            .values_list('schema_name', flat=True)
+        )
+        results = provision(schemas, workers=options['workers'])
+        failed = sorted(name for name, ok in results.items() if not ok)
+        for name in failed:
+            self.stdout.write(self.style.ERROR(f'- {name} failed'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Provisioned {len(results) - len(failed)} of {len(results)} tenant schemas'
+        ))
@@ -1,18 +1,21 @@
-from django.db import connection
-from django.conf import settings
-from django.utils.deprecation import MiddlewareMixin
-from .models import Domain, Tenant
+from django_tenants.middleware import TenantMainMiddleware
+from django_tenants.utils import get_tenant_database_alias, get_tenant_model
+from .cache import resolve_hostname
 
-class TenantMiddleware(MiddlewareMixin):
-    def process_request(self, request):
-        hostname = request.get_host().split(':')[0]
-        try:
-            domain = Domain.objects.get(domain=hostname)
-            connection.set_schema(domain.tenant.schema_name)
-        except Domain.DoesNotExist:
-            connection.set_schema('public')
-        return None
+class TenantMiddleware(TenantMainMiddleware):
+    """
+    TenantMainMiddleware resolving hostnames through tenants.cache instead of
+    querying Domain on every request
+    """
 
-    def process_response(self, request, response):
-        connection.set_schema_to_public()
-        return response 
\ No newline at end of file
+    def get_tenant(self, domain_model, hostname):
+        route = resolve_hostname(hostname)
+        if route is None:
+            raise domain_model.DoesNotExist(f'No domain {hostname}')
+        # Only the routing fields are loaded; the rest are deferred and
+        # fetched if a view reads them
+        return get_tenant_model().from_db(
+            get_tenant_database_alias(),
+            ['id', 'schema_name', 'on_trial'],
+            [route.tenant_id, route.schema_name, route.tier == 'trial'],
+        )
@@ -1,5 +1,6 @@
 from django.db import models
 from django_tenants.models import TenantMixin, DomainMixin
+from django_tenants.utils import schema_exists
 
 class Tenant(TenantMixin):
     name = models.CharField(max_length=100)
@@ -11,6 +12,19 @@ class Tenant(TenantMixin):
     auto_create_schema = True
     auto_drop_schema = False
 
+    def create_schema(self, check_if_exists=False, sync_schema=True, verbosity=1):
+        """
+        Clone new schemas from the golden schema when it is enabled
+        """
+        from . import golden
+
+        if not (sync_schema and golden.enabled()):
+            return super().create_schema(check_if_exists, sync_schema, verbosity)
+        if check_if_exists and schema_exists(self.schema_name):
+            return False
+        golden.clone_into(self.schema_name)
+        return True
+
     class Meta:
         app_label = 'tenants'
 
@@ -0,0 +1,197 @@
+"""
+Tenant provisioning: migrate selected tenant schemas and seed them.
+
+Schemas already at the latest migration are found up front by reading their
+django_migrations tables, and skipped. The rest are migrated in a bounded
+pool of spawned processes, each with its own database connection. Progress
+is kept per schema in the Django cache, so callers (the tenant admin) can
+return immediately and show it later.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.migrations.loader import MigrationLoader
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = 'tenants:provisioning:{}'
+PROGRESS_TIMEOUT = 24 * 60 * 60
+
+QUEUED, MIGRATING, DONE, SKIPPED, FAILED = 'queued', 'migrating', 'done', 'skipped', 'failed'
+
+# Schemas compared per query when checking migration state
+STATE_BATCH = 200
+
+
+def set_progress(schema_name, state, detail=''):
+    cache.set(
+        PROGRESS_KEY.format(schema_name),
+        {'state': state, 'detail': detail, 'updated': time.time()},
+        PROGRESS_TIMEOUT,
+    )
+
+
+def get_progress(schema_names):
+    """
+    Return {schema_name: progress dict} for the schemas with recorded progress
+    """
+    keys = {PROGRESS_KEY.format(name): name for name in schema_names}
+    return {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+
+def latest_migrations():
+    """
+    Leaf migrations on disk, as 'app.name' strings
+    """
+    loader = MigrationLoader(None, ignore_no_migrations=True)
+    return {f'{app}.{name}' for app, name in loader.graph.leaf_nodes()}
+
+
+def outdated_schemas(schema_names):
+    """
+    Return the subset of schema_names missing any of the latest migrations,
+    with one query per STATE_BATCH schemas
+    """
+    leaves = latest_migrations()
+    schema_names = list(schema_names)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT table_schema FROM information_schema.tables "
+            "WHERE table_name = 'django_migrations' AND table_schema = ANY(%s)",
+            [schema_names],
+        )
+        migrated = [row[0] for row in cursor.fetchall()]
+        current = set()
+        for i in range(0, len(migrated), STATE_BATCH):
+            batch = migrated[i:i + STATE_BATCH]
+            union = ' UNION ALL '.join(
+                f"SELECT %s, count(*) FROM {connection.ops.quote_name(name)}.django_migrations "
+                f"WHERE app || '.' || name = ANY(%s)"
+                for name in batch
+            )
+            params = []
+            for name in batch:
+                params += [name, list(leaves)]
+            cursor.execute(union, params)
+            current.update(name for name, count in cursor.fetchall() if count == len(leaves))
+    return [name for name in schema_names if name not in current]
+
+
+def create_default_website(tenant):
+    """
+    Create the tenant's default Website unless it already has one.
+    Must run with the tenant's schema active. Returns True if created.
+    """
+    from websites.models import Website
+
+    if Website.objects.exists():
+        return False
+    Website.objects.create(
+        tenant=tenant,
+        name='Default Website',
+        slug='default-website',
+        template='default',
+        content={},
+        is_published=False,
+        meta_title='Default Website',
+        meta_description='A default website',
+        meta_keywords='default,website',
+        facebook_url='',
+        twitter_url='',
+        instagram_url='',
+        linkedin_url='',
+    )
+    return True
+
+
+def setup_schema(schema_name, migrate=True):
+    """
+    Migrate one tenant schema and create its default website.
+    Runs in a provisioning worker process.
+    """
+    from django_tenants.utils import schema_context
+
+    from .models import Tenant
+
+    try:
+        if migrate:
+            set_progress(schema_name, MIGRATING)
+            call_command('migrate_schemas', schema_name=schema_name, interactive=False, verbosity=0)
+        tenant = Tenant.objects.get(schema_name=schema_name)
+        with schema_context(schema_name):
+            created = create_default_website(tenant)
+        set_progress(schema_name, DONE if migrate else SKIPPED,
+                     'default website created' if created else '')
+        return schema_name, True
+    except Exception as e:
+        logger.exception(f"Provisioning {schema_name} failed")
+        set_progress(schema_name, FAILED, str(e))
+        return schema_name, False
+    finally:
+        connections.close_all()
+
+
+def provision(schema_names, workers=None):
+    """
+    Bring the given tenant schemas up to date, migrating outdated ones in
+    parallel. Returns {schema_name: True/False} for success.
+    """
+    workers = workers or getattr(settings, 'TENANT_PROVISIONING_WORKERS', 4)
+    schema_names = list(schema_names)
+    for name in schema_names:
+        set_progress(name, QUEUED)
+    outdated = set(outdated_schemas(schema_names))
+    logger.info(f"Provisioning {len(schema_names)} schemas, {len(outdated)} need migrations")
+
+    results = {}
+    # Up-to-date schemas only need seeding, which is cheap enough to do here
+    for name in schema_names:
+        if name not in outdated:
+            results[name] = setup_schema(name, migrate=False)[1]
+
+    if outdated:
+        # Spawned rather than forked so workers never share a connection
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(outdated)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            futures = [pool.submit(setup_schema, name) for name in outdated]
+            for future in as_completed(futures):
+                name, ok = future.result()
+                results[name] = ok
+    return results
+
+
+def start_provisioning(schema_names, workers=None):
+    """
+    Run provision() in a background thread and return immediately
+    """
+    schema_names = list(schema_names)
+    for name in schema_names:
+        set_progress(name, QUEUED)
+
+    def run():
+        try:
+            provision(schema_names, workers)
+        except Exception:
+            logger.exception("Tenant provisioning failed")
+            for name, progress in get_progress(schema_names).items():
+                if progress['state'] in (QUEUED, MIGRATING):
+                    set_progress(name, FAILED, 'provisioning aborted')
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, name='tenant-provisioning', daemon=True)
+    thread.start()
+    return thread
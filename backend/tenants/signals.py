@@ -1,19 +1,54 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Tenant
-from .utils import create_tenant_schema, drop_tenant_schema
+from django_tenants.models import TenantMixin
+from django_tenants.signals import post_schema_sync
+from django_tenants.utils import get_public_schema_name, schema_context
+from .models import Domain, Tenant
+from . import cache, cache_prefix
+from .provisioning import create_default_website
+from .utils import drop_tenant_schema
 
-@receiver(post_save, sender=Tenant)
-def create_tenant_schema_handler(sender, instance, created, **kwargs):
+@receiver(post_schema_sync, sender=TenantMixin)
+def seed_tenant_schema_handler(sender, tenant, **kwargs):
     """
-    Create schema when a new tenant is created
+    Create the default website once a new tenant's schema is migrated or cloned.
+    The schema itself is created by Tenant.save (auto_create_schema).
     """
-    if created:
-        create_tenant_schema(instance.schema_name)
+    if tenant.schema_name == get_public_schema_name():
+        return
+    with schema_context(tenant.schema_name):
+        create_default_website(tenant)
 
 @receiver(post_delete, sender=Tenant)
 def drop_tenant_schema_handler(sender, instance, **kwargs):
     """
     Drop schema when a tenant is deleted
     """
-    drop_tenant_schema(instance.schema_name) 
\ No newline at end of file
+    drop_tenant_schema(instance.schema_name)
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain_cache_for_domain(sender, instance, **kwargs):
+    """
+    Drop cached resolutions for a domain that was added, changed or removed
+    """
+    cache.invalidate(hostname=instance.domain, tenant_id=instance.tenant_id)
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def invalidate_domain_cache_for_tenant(sender, instance, **kwargs):
+    """
+    Drop cached resolutions pointing at a tenant that changed
+    """
+    cache.invalidate(tenant_id=instance.pk)
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def flush_tenant_querysets(sender, instance, created=False, **kwargs):
+    """
+    Cached tenant querysets may have joined the old tenant row. A deleted
+    tenant's schema is dropped with raw SQL, so its entries must not be
+    served again if the schema name is reused.
+    """
+    if not created:
+        cache_prefix.flush_tenant(instance.schema_name)
\ No newline at end of file
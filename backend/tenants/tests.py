@@ -1,3 +1,100 @@
-from django.test import TestCase
+import time
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.utils import schema_context
+
+from websites.models import Website
+
+from . import cache, cache_prefix, golden
+from .middleware import TenantMiddleware
+from .models import Domain, Tenant
+
+
+class TenantMiddlewareCacheTests(TenantTestCase):
+    def setUp(self):
+        cache.domain_cache.clear()
+        self.middleware = TenantMiddleware(lambda request: None)
+        self.hostname = self.domain.domain
+
+    def test_cached_hostname_skips_database(self):
+        with self.assertNumQueries(1):
+            tenant = self.middleware.get_tenant(Domain, self.hostname)
+        self.assertEqual((tenant.pk, tenant.schema_name), (self.tenant.pk, self.tenant.schema_name))
+
+        with self.assertNumQueries(0):
+            self.middleware.get_tenant(Domain, self.hostname)
+
+    def test_unknown_hostname_is_cached_as_missing(self):
+        for queries in (1, 0):
+            with self.assertNumQueries(queries), self.assertRaises(Domain.DoesNotExist):
+                self.middleware.get_tenant(Domain, 'unknown.example.com')
+
+    def test_entries_expire(self):
+        self.middleware.get_tenant(Domain, self.hostname)
+        later = time.monotonic() + cache.domain_cache.timeout + 1
+        with mock.patch('tenants.cache.time.monotonic', return_value=later), self.assertNumQueries(1):
+            self.middleware.get_tenant(Domain, self.hostname)
+
+    def test_invalidation_drops_entries(self):
+        self.middleware.get_tenant(Domain, self.hostname)
+        cache.invalidate(tenant_id=self.tenant.pk)
+        with self.assertNumQueries(1):
+            self.middleware.get_tenant(Domain, self.hostname)
+
+
+class GoldenSchemaTests(TenantTestCase):
+    def tearDown(self):
+        golden._version = None
+
+    def test_version_changes_with_migration_source(self):
+        golden._version = None
+        version = golden.migrations_version()
+        golden._version = None
+        with mock.patch('tenants.golden._migration_source', return_value=b'edited'):
+            self.assertNotEqual(golden.migrations_version(), version)
+
+    def test_clone_holds_shared_swap_lock(self):
+        def clone_schema(base_schema_name, new_schema_name):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT mode FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()"
+                )
+                locks.extend(row[0] for row in cursor.fetchall())
+
+        locks = []
+        with mock.patch('tenants.golden.is_current', return_value=True), \
+                mock.patch('tenants.golden.CloneSchema') as clone:
+            clone.return_value.clone_schema.side_effect = clone_schema
+            golden.clone_into('tenant_copy')
+        self.assertEqual(locks, ['ShareLock'])
+
+
+class CacheopsPrefixTests(TenantTestCase):
+    def setUp(self):
+        cache_prefix._generations.clear()
+        redis = mock.patch.object(cache_prefix.pubsub, 'get_redis').start()
+        redis.return_value.hget.return_value = None
+        redis.return_value.hincrby.return_value = 1
+        mock.patch.object(cache_prefix.pubsub, 'publish').start()
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(cache_prefix._generations.clear)
+
+    def prefix(self, model):
+        return cache_prefix.cacheops_prefix(SimpleNamespace(tables=[model._meta.db_table]))
+
+    def test_tenant_tables_are_scoped_to_the_schema(self):
+        self.assertEqual(self.prefix(Website), f'{self.tenant.schema_name}:0:')
+        with schema_context('other_tenant'):
+            self.assertEqual(self.prefix(Website), 'other_tenant:0:')
+        # Shared tables are cached once for every tenant
+        self.assertEqual(self.prefix(Tenant), 'public:0:')
+
+    def test_flush_only_moves_one_tenant(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_prefix.flush_tenant(self.tenant.schema_name)
+        self.assertEqual(self.prefix(Website), f'{self.tenant.schema_name}:1:')
+        with schema_context('other_tenant'):
+            self.assertEqual(self.prefix(Website), 'other_tenant:0:')
@@ -0,0 +1,30 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def install_slow_query_logger(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if getattr(connection, 'slow_query_logger', None) is not None:
+        return
+    from .logging_utils import make_slow_query_logger
+
+    connection.slow_query_logger = make_slow_query_logger(settings.LOG_SLOW_QUERY_MS)
+    connection.execute_wrappers.append(connection.slow_query_logger)
+
+
+class WebsiteBuilderConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'website_builder'
+
+    def ready(self):
+        if getattr(settings, 'LOG_SLOW_QUERY_MS', None):
+            connection_created.connect(install_slow_query_logger, dispatch_uid='slow_query_logger')
+
+        try:
+            from cacheops.signals import cache_read
+        except ImportError:
+            pass
+        else:
+            from .middleware import record_cache_read
+            cache_read.connect(record_cache_read, dispatch_uid='metrics_cache_read')
\ No newline at end of file
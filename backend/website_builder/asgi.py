@@ -13,7 +13,7 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
-from django_tenants.utils import get_tenant_model, get_public_schema_name, schema_context
+from django_tenants.utils import get_public_schema_name
 
 # Set the Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website_builder.settings')
@@ -21,11 +21,15 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website_builder.settings')
 # Initialize Django ASGI application early to ensure the app is loaded properly
 django.setup()
 
+from tenants.cache import TenantRoute, aresolve_hostname, start_preload as start_domain_preload
 from .routing import websocket_urlpatterns
 
 # Get the Django ASGI application
 django_asgi_app = get_asgi_application()
 
+# Warm the hostname cache so connection setup rarely needs a database lookup
+start_domain_preload()
+
 # ASGI middleware to load the correct tenant based on subdomain/domain
 class TenantASGIMiddleware:
     def __init__(self, app):
@@ -35,20 +39,16 @@ class TenantASGIMiddleware:
         host_header = dict(scope.get('headers', [])).get(b'host', b'').decode()
         host = host_header.split(':')[0]  # Remove port if present
 
-        TenantModel = get_tenant_model()
-
-        try:
-            tenant = TenantModel.objects.get(domain_url=host)
-        except TenantModel.DoesNotExist:
+        # Cache hits stay on the event loop; misses go to a thread pool
+        route = await aresolve_hostname(host)
+        if route is None:
             # Use public schema as fallback
-            schema = get_public_schema_name()
-        else:
-            schema = tenant.schema_name
-
-        # Set the tenant schema in the current connection
-        async with schema_context(schema):
-            scope['tenant'] = schema
-            await self.app(scope, receive, send)
+            route = TenantRoute(None, get_public_schema_name(), None)
+
+        # Database work happens in worker threads, which pick the schema up
+        # from the scope rather than from this coroutine's connection
+        scope = dict(scope, tenant=route)
+        await self.app(scope, receive, send)
 
 # Wrap the ASGI application with the tenant middleware
 application = ProtocolTypeRouter({
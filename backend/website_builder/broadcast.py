@@ -0,0 +1,132 @@
+"""
+Batched fan-out of WebSocket messages.
+
+``GroupBatcher`` collects the messages sent to a group during a short window
+(settings.WEBSOCKET_BATCH_WINDOW_MS) and sends them with a single
+group_send, serialized once. Recipients forward the pre-serialized text as
+is. A window with one message is sent as that message; more are wrapped in
+{"type": "batch", "messages": [...]}.
+
+``SendQueue`` sits between a consumer and its socket so a slow client backs
+up its own bounded queue instead of the channel layer: when it is full the
+oldest message is dropped, or the socket is closed, per
+settings.WEBSOCKET_SLOW_CONSUMER_POLICY.
+"""
+
+import asyncio
+import logging
+import weakref
+
+from django.conf import settings
+
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+# Flush a window early once it holds this many messages
+MAX_BATCH = 200
+
+# Close code for sockets dropped for falling behind ("Try Again Later")
+CLOSE_SLOW_CONSUMER = 1013
+
+_batchers = weakref.WeakKeyDictionary()
+
+
+def encode(messages):
+    if len(messages) == 1:
+        return dumps(messages[0]).decode()
+    return dumps({'type': 'batch', 'messages': messages}).decode()
+
+
+class GroupBatcher:
+    def __init__(self, channel_layer, window):
+        self.channel_layer = channel_layer
+        self.window = window
+        self.pending = {}
+        self.timers = {}
+
+    async def add(self, group, message):
+        if self.window <= 0:
+            await self.send(group, [message])
+            return
+        batch = self.pending.get(group)
+        if batch is None:
+            self.pending[group] = [message]
+            self.timers[group] = asyncio.get_running_loop().call_later(self.window, self._flush_soon, group)
+        else:
+            batch.append(message)
+            if len(batch) >= MAX_BATCH:
+                await self.flush(group)
+
+    def _flush_soon(self, group):
+        asyncio.ensure_future(self.flush(group))
+
+    async def flush(self, group):
+        timer = self.timers.pop(group, None)
+        if timer is not None:
+            # Flushed early; the next window starts with the next message
+            timer.cancel()
+        messages = self.pending.pop(group, None)
+        if messages:
+            await self.send(group, messages)
+
+    async def send(self, group, messages):
+        try:
+            await self.channel_layer.group_send(group, {
+                'type': 'broadcast_batch',
+                'text': encode(messages),
+            })
+        except Exception:
+            logger.exception(f"Broadcasting {len(messages)} messages to {group} failed")
+
+
+def get_batcher(channel_layer):
+    """
+    The GroupBatcher of the running event loop, so every consumer in this
+    process shares its windows
+    """
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        window = getattr(settings, 'WEBSOCKET_BATCH_WINDOW_MS', 25) / 1000
+        batcher = _batchers[loop] = GroupBatcher(channel_layer, window)
+    return batcher
+
+
+class SendQueue:
+    def __init__(self, consumer, size=None, policy=None):
+        self.consumer = consumer
+        self.size = size or getattr(settings, 'WEBSOCKET_SEND_QUEUE_SIZE', 100)
+        self.policy = policy or getattr(settings, 'WEBSOCKET_SLOW_CONSUMER_POLICY', 'drop')
+        self.queue = asyncio.Queue()
+        self.dropped = 0
+        self.stopped = False
+        self.task = asyncio.ensure_future(self._run())
+
+    def put(self, text):
+        if self.stopped:
+            return
+        if self.queue.qsize() >= self.size:
+            if self.policy == 'close':
+                logger.warning(f"Closing slow WebSocket {self.consumer.channel_name}")
+                self.stop()
+                asyncio.ensure_future(self.consumer.close(code=CLOSE_SLOW_CONSUMER))
+                return
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Dropped {self.dropped} messages for slow WebSocket {self.consumer.channel_name}")
+        self.queue.put_nowait(text)
+
+    async def _run(self):
+        while True:
+            text = await self.queue.get()
+            try:
+                await self.consumer.send(text_data=text)
+            except Exception:
+                logger.exception(f"Sending to WebSocket {self.consumer.channel_name} failed")
+                return
+
+    def stop(self):
+        self.stopped = True
+        self.task.cancel()
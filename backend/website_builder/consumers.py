@@ -3,32 +3,140 @@ WebSocket consumers for handling real-time data from websites.
 """
 
 import json
+import logging
+from importlib import import_module
+from types import SimpleNamespace
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
-from django_tenants.utils import schema_context
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.utils.crypto import get_random_string
+from django_tenants.utils import get_public_schema_name
+from redis.exceptions import RedisError
+from websites import analytics, documents
 from websites.models import Website
+from . import db
+from .broadcast import SendQueue, get_batcher
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+# Close codes for connections that can't be served
+CLOSE_UNKNOWN_TENANT = 4400
+CLOSE_NOT_FOUND = 4404
+
+def load_website(website_id):
+    return Website.objects.filter(pk=website_id).first()
+
+
+def load_editor(session_key):
+    """
+    Active user signed in with ``session_key`` in the current schema, or
+    None. AuthMiddlewareStack's scope['user'] is looked up before the tenant
+    schema is known, so it can't be used for this.
+    """
+    if not session_key:
+        return None
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user = get_user(SimpleNamespace(session=session))
+    return user if user.is_authenticated and user.is_active else None
+
+
+def load_connection(website_id, session_key):
+    return load_website(website_id), load_editor(session_key)
+
+
+class TenantWebsiteConsumer(AsyncWebsocketConsumer):
+    """
+    Resolves the tenant (a tenants.cache.TenantRoute set by
+    TenantASGIMiddleware), the Website of the URL and the signed-in editor
+    once at connect, and keeps them for the lifetime of the connection.
+    self.editor is None unless the user may edit the website. Database work
+    goes through website_builder.db.
+    """
 
-class WebsiteConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        """Handle WebSocket connection."""
-        self.website_id = self.scope['url_route']['kwargs']['website_id']
-        self.room_group_name = f'website_{self.website_id}'
+        self.tenant = self.scope.get('tenant')
+        if self.tenant is None or self.tenant.schema_name == get_public_schema_name():
+            await self.close(code=CLOSE_UNKNOWN_TENANT)
+            return
+        website_id = self.scope['url_route']['kwargs']['website_id']
+        if not website_id.isdigit():
+            await self.close(code=CLOSE_NOT_FOUND)
+            return
+        session_key = self.scope.get('cookies', {}).get(settings.SESSION_COOKIE_NAME)
+        self.website, user = await self.db(load_connection, int(website_id), session_key)
+        if self.website is None:
+            await self.close(code=CLOSE_NOT_FOUND)
+            return
+        # Same rule as the authenticated REST API: signed in to the tenant
+        # that owns the website
+        self.editor = user if user is not None and self.website.tenant_id == self.tenant.tenant_id else None
+        await self.website_connected()
+
+    async def website_connected(self):
+        """
+        Called once self.tenant and self.website are set
+        """
+        await self.accept()
+
+    async def db(self, func, *args):
+        """
+        Run ``func(*args)`` in the tenant's schema on the database pool
+        """
+        return await db.run(self.tenant.schema_name, func, *args)
+
+    def buffered_write(self, key, func, *args):
+        """
+        Queue a write to be committed with others from this process; see
+        website_builder.db.WriteBuffer
+        """
+        future = db.get_write_buffer().submit(self.tenant.schema_name, key, func, *args)
+        future.add_done_callback(self._write_done)
+        return future
+
+    def _write_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Buffered write for website {self.website.pk} failed: {future.exception()!r}")
 
-        # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+
+class WebsiteConsumer(TenantWebsiteConsumer):
+    """
+    Editors send {"type": "join", "since": <seq>?} to get the document
+    (a snapshot, or the deltas since their last seq) and its updates;
+    website_data frames carry a merge "patch" (or whole "content" /
+    "settings" objects) and are rebroadcast as the applied delta with its
+    seq. Everything but analytics requires a signed-in editor, and
+    everything but analytics and join requires having joined.
+    """
+
+    async def website_connected(self):
+        """Handle WebSocket connection."""
+        self.website_id = self.website.pk
+        self.room_group_name = documents.group_name(self.tenant.schema_name, self.website_id)
+        self.editor_id = get_random_string(12)
+        self.joined = False
 
         await self.accept()
+        self.outbox = SendQueue(self)
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
+        if not hasattr(self, 'outbox'):
+            # Rejected at connect
+            return
+        self.outbox.stop()
+        if not self.joined:
+            return
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        try:
+            await documents.leave(self.tenant.schema_name, self.website_id, self.editor_id)
+        except RedisError as e:
+            logger.warning(f"Could not remove editor {self.editor_id} from website {self.website_id}: {e}")
+        await self.broadcast({'type': 'presence', 'event': 'leave', 'editor': self.editor_id})
 
     async def receive(self, text_data):
         """Handle incoming WebSocket messages."""
@@ -36,44 +144,115 @@ class WebsiteConsumer(AsyncWebsocketConsumer):
             data = json.loads(text_data)
             message_type = data.get('type')
             
-            if message_type == 'website_data':
+            if message_type == 'analytics':
+                # Aggregated and stored; editors don't need every pageview
+                await self.process_analytics_data(data)
+            elif self.editor is None:
+                # Published-site visitors only report analytics
+                await self.send(text_data=json.dumps({
+                    'error': 'Sign in as an editor of this website to change it'
+                }))
+            elif message_type == 'join':
+                await self.join(data)
+            elif not self.joined:
+                await self.send(text_data=json.dumps({
+                    'error': 'Join the document first'
+                }))
+            elif message_type == 'sync':
+                await self.sync(data.get('since'))
+            elif message_type == 'website_data':
                 # Process website data
                 await self.process_website_data(data)
-            elif message_type == 'analytics':
-                # Process analytics data
-                await self.process_analytics_data(data)
-            
-            # Broadcast to room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'broadcast_message',
-                    'message': data
-                }
-            )
+            elif message_type == 'presence':
+                await self.update_presence(data.get('state'))
+            else:
+                await self.broadcast(data)
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
                 'error': 'Invalid JSON format'
             }))
+        except RedisError as e:
+            logger.warning(f"Live document of website {self.website_id} unavailable: {e}")
+            await self.send(text_data=json.dumps({
+                'error': 'Live editing is temporarily unavailable'
+            }))
+        except documents.DocumentNotFound:
+            await self.close(code=CLOSE_NOT_FOUND)
+
+    async def broadcast(self, message):
+        """
+        Send to everyone who joined, batched with other frames sent to the
+        group in the same window
+        """
+        await get_batcher(self.channel_layer).add(self.room_group_name, message)
+
+    def reply(self, message):
+        self.outbox.put(dumps(message).decode())
+
+    async def broadcast_batch(self, event):
+        """Forward a batch serialized once by GroupBatcher."""
+        self.outbox.put(event['text'])
+
+    async def join(self, data):
+        """Join the group and presence, and catch up with the document."""
+        if not self.joined:
+            await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            self.joined = True
+        await self.update_presence(data.get('state'))
+        await self.sync(data.get('since'))
+
+    async def sync(self, since=None):
+        """Send the deltas after ``since``, or a snapshot if they aren't logged."""
+        schema_name = self.tenant.schema_name
+        if isinstance(since, int) and since >= 0:
+            deltas = await documents.deltas_since(schema_name, self.website_id, since)
+            if deltas is not None:
+                self.reply({'type': 'resume', 'since': since, 'deltas': deltas})
+                return
+        seq, state = await documents.snapshot(schema_name, self.website_id)
+        self.reply({
+            'type': 'snapshot',
+            'seq': seq,
+            'state': state,
+            'editors': await documents.editors(schema_name, self.website_id),
+            'editor': self.editor_id,
+        })
+
+    async def update_presence(self, state=None):
+        await documents.join(self.tenant.schema_name, self.website_id, self.editor_id,
+                             self.editor.pk, state)
+        await self.broadcast({
+            'type': 'presence',
+            'event': 'update',
+            'editor': self.editor_id,
+            'user': self.editor.pk,
+            'state': state,
+        })
+
+    async def process_website_data(self, data):
+        """Apply a change to the live document and share the resulting delta."""
+        if isinstance(data.get('patch'), dict):
+            patch = {field: value for field, value in data['patch'].items() if field in documents.FIELDS}
+            change = lambda state: documents.merge_patch(state, patch)
+        else:
+            # Nulls would read as deletions in the broadcast merge patch
+            fields = {
+                field: documents.strip_nulls(data[field]) for field in documents.FIELDS
+                if isinstance(data.get(field), dict)
+            }
+            change = lambda state: dict(state, **fields)
+
+        seq, delta, _ = await documents.apply(self.tenant.schema_name, self.website_id, change)
+        if delta is None:
+            return
+        await self.broadcast({'type': 'delta', 'seq': seq, 'patch': delta, 'editor': self.editor_id})
+        # Written from Redis in one batch with other changes; only the
+        # newest document state reaches the row
+        self.buffered_write(
+            (self.website_id, 'document'), documents.persist, self.tenant.schema_name, self.website_id,
+        )
 
-    async def broadcast_message(self, event):
-        """Broadcast message to WebSocket."""
-        message = event['message']
-        await self.send(text_data=json.dumps(message))
-
-    @database_sync_to_async
-    def process_website_data(self, data):
-        """Process website data in the correct tenant schema."""
-        with schema_context(self.scope['tenant'].schema_name):
-            website = Website.objects.get(id=self.website_id)
-            # Process and store website data
-            # Add your data processing logic here
-            pass
-
-    @database_sync_to_async
-    def process_analytics_data(self, data):
-        """Process analytics data in the correct tenant schema."""
-        with schema_context(self.scope['tenant'].schema_name):
-            # Process analytics data
-            # Add your analytics processing logic here
-            pass 
\ No newline at end of file
+    async def process_analytics_data(self, data):
+        """Count analytics events; websites.analytics writes them in bulk."""
+        analytics.ensure_flusher()
+        analytics.ingest(self.tenant.schema_name, self.website_id, data)
\ No newline at end of file
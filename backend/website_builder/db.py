@@ -0,0 +1,149 @@
+"""
+Database access for async (WebSocket) code.
+
+``run`` executes ORM code on a small fixed pool of threads. Django
+connections are per thread, so the pool is also a bounded pool of database
+connections; unlike database_sync_to_async they stay open between calls
+(up to settings.WEBSOCKET_DB['CONN_MAX_AGE'] seconds) instead of being
+opened per message.
+
+``WriteBuffer`` collects writes from many frames and applies them every
+FLUSH_INTERVAL_MS in one transaction per schema. Writes submitted with the
+same key replace each other while pending, so only the last one runs.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_tenants.utils import schema_context
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'WEBSOCKET_DB', {})
+THREADS = _config.get('THREADS', 4)
+CONN_MAX_AGE = _config.get('CONN_MAX_AGE', 300)
+FLUSH_INTERVAL = _config.get('FLUSH_INTERVAL_MS', 100) / 1000
+MAX_BATCH = _config.get('MAX_BATCH', 500)
+
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='ws-db')
+_local = threading.local()
+
+
+def _checkout():
+    """
+    Keep this thread's connection unless it broke or is older than CONN_MAX_AGE
+    """
+    if connection.connection is None:
+        _local.opened_at = time.monotonic()
+        return
+    expired = time.monotonic() - getattr(_local, 'opened_at', 0) > CONN_MAX_AGE
+    if expired or (connection.errors_occurred and not connection.is_usable()):
+        connection.close()
+        _local.opened_at = time.monotonic()
+
+
+def _call(schema_name, func, args):
+    _checkout()
+    with schema_context(schema_name):
+        return func(*args)
+
+
+async def run(schema_name, func, *args):
+    """
+    Run ``func(*args)`` in ``schema_name`` on the database thread pool
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _call, schema_name, func, args)
+
+
+def _apply(ops):
+    """
+    Run a schema's pending writes in one transaction. A failing write is
+    rolled back to its savepoint without losing the others.
+    """
+    results = []
+    with transaction.atomic():
+        for func, args in ops:
+            try:
+                with transaction.atomic():
+                    results.append((True, func(*args)))
+            except Exception as e:
+                results.append((False, e))
+    return results
+
+
+class WriteBuffer:
+    def __init__(self, interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.interval = interval
+        self.max_batch = max_batch
+        # schema -> {key: (func, args, [futures])}, in submission order
+        self.pending = {}
+        self.timers = {}
+
+    def submit(self, schema_name, key, func, *args):
+        """
+        Queue ``func(*args)``; returns a future with its result. ``key``
+        None never coalesces.
+        """
+        future = asyncio.get_running_loop().create_future()
+        writes = self.pending.get(schema_name)
+        if writes is None:
+            writes = self.pending[schema_name] = {}
+            self.timers[schema_name] = asyncio.get_running_loop().call_later(
+                self.interval, self._flush_soon, schema_name,
+            )
+        if key is None:
+            key = object()
+        replaced = writes.pop(key, None)
+        futures = replaced[2] if replaced else []
+        futures.append(future)
+        writes[key] = (func, args, futures)
+        if len(writes) >= self.max_batch:
+            self._flush_soon(schema_name)
+        return future
+
+    def _flush_soon(self, schema_name):
+        asyncio.ensure_future(self.flush(schema_name))
+
+    async def flush(self, schema_name):
+        timer = self.timers.pop(schema_name, None)
+        if timer is not None:
+            # Flushed early; the next window starts with the next write
+            timer.cancel()
+        writes = self.pending.pop(schema_name, None)
+        if not writes:
+            return
+        ops = [(func, args) for func, args, _ in writes.values()]
+        try:
+            results = await run(schema_name, _apply, ops)
+        except Exception as e:
+            logger.exception(f"Writing {len(ops)} buffered changes in {schema_name} failed")
+            results = [(False, e)] * len(ops)
+        for (_, _, futures), (ok, value) in zip(writes.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+
+_buffers = weakref.WeakKeyDictionary()
+
+
+def get_write_buffer():
+    """
+    The WriteBuffer of the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    buffer = _buffers.get(loop)
+    if buffer is None:
+        buffer = _buffers[loop] = WriteBuffer()
+    return buffer
@@ -0,0 +1,73 @@
+"""
+Idempotency keys for unsafe API calls.
+
+The response to a request carrying an Idempotency-Key header is stored for
+TIMEOUT seconds. Retrying with the same key and body returns the stored
+response instead of running the request again. Reusing a key with a
+different body is rejected with 422, and a retry while the first request is
+still running gets 409.
+"""
+
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+TIMEOUT = 24 * 60 * 60
+# How long a request may run before a retry is allowed to take over
+PENDING_TIMEOUT = 5 * 60
+
+
+def _fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def idempotent(request, scope, handler):
+    """
+    Run ``handler()`` (returning a DRF Response) at most once per key.
+    ``scope`` names the endpoint so keys can't collide across endpoints.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > 255:
+        return Response({'detail': f'{HEADER} is too long.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    cache_key = f'idempotency:{connection.schema_name}:{scope}:{user}:{key}'
+    fingerprint = _fingerprint(request.data)
+
+    stored = cache.get(cache_key)
+    if stored is None and cache.add(cache_key, {'state': 'pending', 'fingerprint': fingerprint}, PENDING_TIMEOUT):
+        try:
+            response = handler()
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {
+                'state': 'done',
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, TIMEOUT)
+        return response
+
+    stored = stored or cache.get(cache_key)
+    if stored is not None and stored['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if stored is None or stored['state'] != 'done':
+        return Response(
+            {'detail': 'A request with this idempotency key is still in progress.'},
+            status=status.HTTP_409_CONFLICT,
+        )
+    return Response(stored['data'], status=stored['status'], headers={'Idempotent-Replayed': 'true'})
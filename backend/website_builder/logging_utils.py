@@ -0,0 +1,148 @@
+"""
+Logging helpers referenced from settings.LOGGING.
+
+- QueueListenerHandler: hands records to a background thread so file and
+  console I/O never happens on the request thread.
+- JsonFormatter: one JSON object per line, including ``extra`` fields.
+- SamplingFilter: keeps a fraction of low-severity records per logger.
+- make_slow_query_logger: logs SQL slower than a threshold, without DEBUG.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+slow_query_logger = logging.getLogger('django.db.backends.slow')
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Enqueue records and write them from a background thread.
+
+    ``handlers`` are the target handler objects, referenced from LOGGING as
+    'cfg://handlers.<name>'. dictConfig builds handlers in alphabetical
+    order, so targets must sort before the queue handler's own name. The
+    targets should not be attached to loggers directly.
+    """
+
+    def __init__(self, handlers, queue_size=10000):
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        super().__init__(queue.Queue(maxsize=queue_size))
+        # Index rather than iterate: dictConfig only resolves cfg:// on item access
+        self.targets = [handlers[i] for i in range(len(handlers))]
+        for target in self.targets:
+            if not isinstance(target, logging.Handler):
+                raise ValueError(
+                    "QueueListenerHandler targets must be configured handlers; "
+                    "check that their names sort before the queue handler's"
+                )
+
+    def _start(self):
+        # Started lazily, and again after a fork, since threads don't survive it
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging; count what we had to drop
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._listener_pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        # Called by logging.shutdown at exit; stop() drains the queue first
+        if self._listener_pid == os.getpid():
+            self._listener.stop()
+        self._listener = self._listener_pid = None
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single-line JSON objects
+    """
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exc_info'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of records below ``min_level`` for the configured
+    loggers. ``rates`` maps logger name prefixes to a 0..1 keep rate; the
+    longest matching prefix wins and unlisted loggers are kept.
+    """
+
+    def __init__(self, rates=None, min_level='WARNING'):
+        super().__init__()
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+        self.min_level = logging.getLevelName(min_level)
+
+    def rate_for(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= self.min_level:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+def make_slow_query_logger(threshold_ms):
+    """
+    Return a connection execute wrapper that logs statements slower than
+    ``threshold_ms``. Works without DEBUG, unlike django.db.backends.
+    """
+    threshold = threshold_ms / 1000
+
+    def log_slow_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= threshold:
+                slow_query_logger.warning(
+                    "Slow query (%.1f ms): %s", duration * 1000, sql,
+                    extra={'duration': duration, 'sql': sql, 'alias': context['connection'].alias},
+                )
+
+    return log_slow_query
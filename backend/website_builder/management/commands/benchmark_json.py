@@ -0,0 +1,86 @@
+import datetime
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from website_builder.parsers import FastJSONParser
+from website_builder.renderers import FastJSONRenderer, orjson
+from websites.models import Page, Website
+from websites.serializers import PublishedWebsiteSerializer
+
+
+def sample_website(sections):
+    """
+    Unsaved Website shaped like a real published site, with ``sections``
+    content blocks
+    """
+    website = Website(
+        id=1, name='Acme Plumbing', slug='acme-plumbing', template='business',
+        meta_title='Acme Plumbing - 24/7 service', meta_description='Local plumbers ' * 10,
+        meta_keywords='plumbing,repairs,emergency', facebook_url='https://facebook.com/acme',
+        settings={'theme': {'primary': '#0055ff', 'font': 'Inter'}, 'locale': 'en-US'},
+        analytics={'google_analytics_id': 'G-XXXXXXX', 'facebook_pixel_id': None},
+        cookies={'enabled': True, 'categories': {'analytics': True, 'marketing': False}},
+        content={'sections': [
+            {
+                'id': f'section-{i}',
+                'type': 'features',
+                'title': f'Section {i} — reliable service',
+                'body': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8,
+                'items': [
+                    {'icon': 'wrench', 'label': f'Item {j}', 'price': 49.5 + j, 'visible': True}
+                    for j in range(6)
+                ],
+            }
+            for i in range(sections)
+        ]},
+    )
+    website.updated_at = datetime.datetime(2024, 5, 1, 12, 0, tzinfo=datetime.timezone.utc)
+    website.published_pages = [
+        Page(id=i, title=f'Page {i}', slug=f'page-{i}', content='<p>Hello</p>' * 50)
+        for i in range(5)
+    ]
+    return PublishedWebsiteSerializer(website).data
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON render/parse throughput of the stock and orjson DRF classes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--sections', default='5,50,200', help='Content sections per payload')
+
+    def time(self, func, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both columns use json'))
+        iterations = options['iterations']
+        stock_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+        stock_parser, fast_parser = JSONParser(), FastJSONParser()
+
+        self.stdout.write(f'{"payload":>10} {"op":<7} {"stock/s":>10} {"orjson/s":>10} {"speedup":>8} {"MB/s":>8}')
+        for sections in [int(s) for s in options['sections'].split(',')]:
+            data = sample_website(sections)
+            body = fast_renderer.render(data)
+            size = len(body)
+            rows = (
+                ('render', lambda: stock_renderer.render(data), lambda: fast_renderer.render(data)),
+                ('parse', lambda: stock_parser.parse(BytesIO(body)), lambda: fast_parser.parse(BytesIO(body))),
+            )
+            for op, stock, fast in rows:
+                stock_time = self.time(stock, iterations)
+                fast_time = self.time(fast, iterations)
+                self.stdout.write(
+                    f'{size / 1024:>8.1f}KB {op:<7} {iterations / stock_time:>10.0f} '
+                    f'{iterations / fast_time:>10.0f} {stock_time / fast_time:>7.1f}x '
+                    f'{size * iterations / fast_time / 1e6:>8.1f}'
+                )
+        self.stdout.write(self.style.SUCCESS(f'{iterations} iterations per measurement'))
@@ -0,0 +1,76 @@
+import time
+
+import sentry_sdk
+from django.core.management.base import BaseCommand
+from sentry_sdk.transport import Transport
+
+from website_builder.sentry import TraceSampler
+
+
+class CountingTransport(Transport):
+    """
+    Serializes envelopes like the HTTP transport would, then discards them
+    """
+    sent = 0
+
+    def capture_envelope(self, envelope):
+        envelope.serialize()
+        CountingTransport.sent += 1
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request Sentry tracing overhead at several sample rates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--spans', type=int, default=10, help='Child spans (e.g. queries) per request')
+        parser.add_argument('--rates', default='0,0.01,0.1,1.0')
+
+    def run(self, iterations, spans, environ):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with sentry_sdk.start_transaction(
+                op='http.server', name=environ['PATH_INFO'],
+                custom_sampling_context={'wsgi_environ': environ},
+            ) as transaction:
+                for _ in range(spans):
+                    with transaction.start_child(op='db', description='SELECT 1'):
+                        pass
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    def measure(self, label, iterations, spans, environ, **options):
+        sentry_sdk.init(
+            dsn='https://public@sentry.invalid/1',
+            transport=CountingTransport,
+            default_integrations=False,
+            **options
+        )
+        CountingTransport.sent = 0
+        per_request = self.run(iterations, spans, environ)
+        sentry_sdk.Hub.current.client.close()
+        self.stdout.write(f'{label:<28} {per_request:10.1f} us/request {CountingTransport.sent:8d} sent')
+        return per_request
+
+    def handle(self, *args, **options):
+        iterations, spans = options['iterations'], options['spans']
+        spa = {'HTTP_HOST': 'example.com', 'PATH_INFO': '/'}
+        api = {'HTTP_HOST': 'example.com', 'PATH_INFO': '/public/api/websites/'}
+
+        # No client: the SDK calls are no-ops
+        sentry_sdk.init()
+        baseline = self.run(iterations, spans, spa)
+        self.stdout.write(f'{"sdk disabled":<28} {baseline:10.1f} us/request')
+
+        for rate in [float(r) for r in options['rates'].split(',')]:
+            self.measure(f'traces_sample_rate={rate}', iterations, spans, spa, traces_sample_rate=rate)
+
+        for rate in (0.01, 0.1):
+            sampler = TraceSampler({'default': rate}, tail_routes=['api'])
+            self.measure(
+                f'tail sampled api, rate={rate}', iterations, spans, api,
+                traces_sampler=sampler.traces_sampler,
+                before_send_transaction=sampler.before_send_transaction,
+            )
+
+        sentry_sdk.init()
+        self.stdout.write(self.style.SUCCESS(f'{iterations} requests with {spans} spans each'))
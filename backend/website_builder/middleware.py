@@ -0,0 +1,111 @@
+"""
+Per-request database cost instrumentation.
+
+QueryCostMiddleware counts queries and SQL time through a connection
+execute wrapper, picks up cacheops hits/misses, and reports them in a
+Server-Timing header and in the /metrics histograms, labelled by route and
+tenant schema.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency', ['route', 'tenant'],
+)
+request_queries = registry.histogram(
+    'db_queries_per_request', 'SQL statements per request', ['route', 'tenant'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+request_db_time = registry.histogram(
+    'db_time_seconds_per_request', 'Total SQL time per request', ['route', 'tenant'],
+)
+cache_reads = registry.counter(
+    'cacheops_reads_total', 'cacheops cache reads', ['tenant', 'result'],
+)
+
+_local = threading.local()
+
+
+class RequestStats:
+    """
+    Execute wrapper accumulating query count and time for one request
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+def current_stats():
+    """
+    Stats of the request being handled on this thread, if any
+    """
+    return getattr(_local, 'stats', None)
+
+
+def record_cache_read(sender, func=None, hit=False, **kwargs):
+    """
+    cacheops.signals.cache_read receiver
+    """
+    tenant = getattr(connection, 'schema_name', 'public')
+    cache_reads.inc(tenant=tenant, result='hit' if hit else 'miss')
+    stats = current_stats()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class QueryCostMiddleware:
+    """
+    Must come after the tenant middleware so the schema is known.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'METRICS_SERVER_TIMING', True)
+        self.tenant_label = getattr(settings, 'METRICS_TENANT_LABEL', True)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        _local.stats = stats
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        route = (match.route or match.view_name) if match else 'unmatched'
+        tenant = getattr(connection, 'schema_name', 'public') if self.tenant_label else 'all'
+
+        request_duration.observe(duration, route=route, tenant=tenant)
+        request_queries.observe(stats.queries, route=route, tenant=tenant)
+        request_db_time.observe(stats.db_time, route=route, tenant=tenant)
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                f'cache;desc="{stats.cache_hits} hits, {stats.cache_misses} misses"',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        return response
@@ -0,0 +1,129 @@
+"""
+Cross-worker invalidation bus built on Redis pub/sub.
+
+Each worker process runs a single daemon thread subscribed to every channel
+registered through ``subscribe``. ``publish`` fans a JSON message out to all
+workers, including the one that sent it.
+"""
+
+import json
+import logging
+import os
+import threading
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_handlers = {}
+_listener = None
+_listener_pid = None
+_client = None
+_client_pid = None
+
+
+def get_redis():
+    """
+    Return a Redis client for the current process
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        _client = redis.Redis.from_url(settings.PUBSUB_REDIS_URL)
+        _client_pid = pid
+    return _client
+
+
+def subscribe(channel, handler):
+    """
+    Register ``handler(message)`` for ``channel``.
+
+    The handler receives the decoded JSON payload, or ``None`` after the
+    listener reconnected and messages may have been missed.
+    """
+    with _lock:
+        _handlers.setdefault(channel, []).append(handler)
+
+
+def publish(channel, message):
+    """
+    Publish a JSON-serializable message to every worker
+    """
+    try:
+        get_redis().publish(channel, json.dumps(message))
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish to {channel}: {e}")
+
+
+def ensure_listener():
+    """
+    Start the listener thread for this process if it isn't running yet.
+    Safe to call on every request; gunicorn workers fork after import so the
+    check is done per pid.
+    """
+    global _listener, _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid and _listener.is_alive():
+        return
+    with _lock:
+        if _listener_pid == pid and _listener.is_alive():
+            return
+        _listener = threading.Thread(target=_listen, name='pubsub-listener', daemon=True)
+        _listener_pid = pid
+        _listener.start()
+
+
+def _dispatch(channel, message):
+    for handler in list(_handlers.get(channel, ())):
+        try:
+            handler(message)
+        except Exception:
+            logger.exception(f"Pub/sub handler for {channel} failed")
+
+
+def _reset_all():
+    for channel in list(_handlers):
+        _dispatch(channel, None)
+
+
+def _listen():
+    backoff = 1
+    connected_before = False
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            subscribed = set()
+            while True:
+                channels = set(_handlers) - subscribed
+                if channels:
+                    pubsub.subscribe(*channels)
+                    subscribed |= channels
+                if connected_before:
+                    # Anything published while we were away is lost
+                    _reset_all()
+                    connected_before = False
+                backoff = 1
+                message = pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                channel = message['channel'].decode()
+                try:
+                    payload = json.loads(message['data'])
+                except (TypeError, ValueError):
+                    logger.warning(f"Dropping malformed message on {channel}")
+                    continue
+                _dispatch(channel, payload)
+        except redis.RedisError as e:
+            logger.warning(f"Pub/sub listener lost connection: {e}")
+            connected_before = True
+            threading.Event().wait(backoff)
+            backoff = min(backoff * 2, 30)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except redis.RedisError:
+                    pass
@@ -0,0 +1,40 @@
+"""
+DRF renderer backed by orjson.
+
+orjson writes straight to bytes and handles datetimes, UUIDs and dataclasses
+itself; anything else (Decimal, lazy translations, querysets, ...) goes
+through DRF's own JSONEncoder.default, so output matches JSONRenderer. Falls
+back to the stock renderer when orjson isn't installed or indented output
+is requested.
+"""
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_encoder = JSONEncoder()
+
+# DRF's encoder renders UTC as 'Z', as does orjson with OPT_UTC_Z
+OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def dumps(data):
+    """
+    Serialize to compact JSON bytes
+    """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    return orjson.dumps(data, default=_encoder.default, option=OPTIONS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,125 @@
+"""
+Sentry performance sampling.
+
+TraceSampler picks a trace rate per request from its route class (SPA shell,
+API, admin, ...) scaled by the tenant's tier, instead of tracing every
+request. Route classes listed in ``tail_routes`` are recorded in full but
+only sent when slow, failed, or picked at their normal rate, so slow and
+error transactions are always kept there. Exceptions are reported as error
+events whatever the trace rate.
+
+Configured from the SENTRY_* settings; see settings.py.
+"""
+
+import random
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# (path prefix, route class); first match wins, anything else is the SPA shell
+ROUTE_CLASSES = (
+    ('/public/api/', 'api'),
+    ('/api/', 'api'),
+    ('/admin/', 'admin'),
+    ('/ws/', 'websocket'),
+    ('/static/', 'static'),
+    ('/media/', 'static'),
+    ('/frontend_static/', 'static'),
+    ('/metrics', 'internal'),
+)
+
+# Transaction statuses that do not count as failures for tail sampling
+OK_STATUSES = ('ok', None)
+
+
+def route_class(path):
+    for prefix, name in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return name
+    return 'spa'
+
+
+def _strip_port(host):
+    return host.rsplit(':', 1)[0] if host and not host.endswith(']') else host
+
+
+def request_target(sampling_context):
+    """
+    (hostname, path) of the request a transaction is about to start for
+    """
+    environ = sampling_context.get('wsgi_environ')
+    if environ is not None:
+        return _strip_port(environ.get('HTTP_HOST', '')), environ.get('PATH_INFO', '/')
+    scope = sampling_context.get('asgi_scope')
+    if scope is not None:
+        headers = dict(scope.get('headers') or ())
+        host = headers.get(b'host', b'').decode('latin-1')
+        return _strip_port(host), scope.get('path', '/')
+    return '', '/'
+
+
+class TraceSampler:
+    """
+    ``traces_sampler`` and ``before_send_transaction`` for sentry_sdk.init.
+
+    rates: route class -> sample rate, with 'default' for unlisted classes
+    tier_multipliers: tenant tier -> factor applied to the route rate
+    tier_overrides: schema name -> tier, for tenants on a custom plan
+    tail_routes: route classes whose slow/failed transactions are always kept
+    slow_ms: duration from which a tail-sampled transaction counts as slow
+    """
+
+    def __init__(self, rates, tier_multipliers=None, tier_overrides=None,
+                 tail_routes=(), slow_ms=1000):
+        self.rates = dict(rates)
+        self.tier_multipliers = dict(tier_multipliers or {})
+        self.tier_overrides = dict(tier_overrides or {})
+        self.tail_routes = frozenset(tail_routes)
+        self.slow = slow_ms / 1000
+
+    def tenant_tier(self, hostname):
+        # Only consult the in-process domain cache: sampling must never query
+        try:
+            from tenants.cache import peek
+            route = peek(hostname)
+        except Exception:
+            return None
+        if route is None:
+            return None
+        return self.tier_overrides.get(route.schema_name, route.tier)
+
+    def rate(self, hostname, path):
+        rate = self.rates.get(route_class(path), self.rates.get('default', 0.0))
+        tier = self.tenant_tier(hostname)
+        if tier is not None:
+            rate *= self.tier_multipliers.get(tier, 1.0)
+        return min(max(rate, 0.0), 1.0)
+
+    def traces_sampler(self, sampling_context):
+        parent_sampled = sampling_context.get('parent_sampled')
+        if parent_sampled is not None:
+            # Keep distributed traces whole
+            return float(parent_sampled)
+        hostname, path = request_target(sampling_context)
+        if route_class(path) in self.tail_routes:
+            # Decided in before_send_transaction, once duration and status are known
+            return 1.0
+        return self.rate(hostname, path)
+
+    def before_send_transaction(self, event, hint):
+        # The transaction name is the URL pattern under DjangoIntegration's default style
+        parts = urlsplit((event.get('request') or {}).get('url') or event.get('transaction') or '')
+        if route_class(parts.path) not in self.tail_routes:
+            return event
+        trace = (event.get('contexts') or {}).get('trace', {})
+        if trace.get('parent_span_id'):
+            # Part of a trace sampled upstream
+            return event
+        if trace.get('status') not in OK_STATUSES:
+            return event
+        start, end = event.get('start_timestamp'), event.get('timestamp')
+        if isinstance(start, datetime) and isinstance(end, datetime):
+            if (end - start).total_seconds() >= self.slow:
+                return event
+        if random.random() < self.rate(parts.hostname or '', parts.path):
+            return event
+        return None
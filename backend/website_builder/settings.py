@@ -47,6 +47,7 @@ SHARED_APPS = [
     'health_check.db',
     'health_check.cache',
     'health_check.storage',
+    'cacheops',
     'tenants',  # Add tenants app
     'website_builder',  # Add website_builder app
 ]
@@ -68,7 +69,8 @@ TENANT_APPS = [
 INSTALLED_APPS = list(SHARED_APPS) + [app for app in TENANT_APPS if app not in SHARED_APPS]
 
 MIDDLEWARE = [
-    'django_tenants.middleware.TenantMainMiddleware',  # Must be first
+    'tenants.middleware.TenantMiddleware',  # Must be first
+    'website_builder.middleware.QueryCostMiddleware',  # Needs the tenant schema
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -115,6 +117,30 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Messages sent to a WebSocket group within this window go out as one batch
+WEBSOCKET_BATCH_WINDOW_MS = int(os.getenv('WEBSOCKET_BATCH_WINDOW_MS', '25'))
+# Outbound messages buffered per socket; past that a slow client gets its
+# oldest messages dropped ('drop') or is disconnected ('close')
+WEBSOCKET_SEND_QUEUE_SIZE = int(os.getenv('WEBSOCKET_SEND_QUEUE_SIZE', '100'))
+WEBSOCKET_SLOW_CONSUMER_POLICY = os.getenv('WEBSOCKET_SLOW_CONSUMER_POLICY', 'drop')
+# Database access from WebSocket consumers (website_builder.db): a fixed pool
+# of threads with persistent connections, and writes from many frames
+# committed together every FLUSH_INTERVAL_MS
+WEBSOCKET_DB = {
+    'THREADS': int(os.getenv('WEBSOCKET_DB_THREADS', '4')),
+    'CONN_MAX_AGE': int(os.getenv('WEBSOCKET_DB_CONN_MAX_AGE', '300')),
+    'FLUSH_INTERVAL_MS': int(os.getenv('WEBSOCKET_DB_FLUSH_INTERVAL_MS', '100')),
+    'MAX_BATCH': 500,
+}
+
+# Real-time analytics from the "analytics" WebSocket frames (websites.analytics)
+ANALYTICS = {
+    'FLUSH_INTERVAL': int(os.getenv('ANALYTICS_FLUSH_INTERVAL', '5')),
+    'MAX_REFERRERS': 50,
+    'MAX_FLUSH_ATTEMPTS': int(os.getenv('ANALYTICS_MAX_FLUSH_ATTEMPTS', '60')),
+    'MAX_PENDING_BUCKETS': int(os.getenv('ANALYTICS_MAX_PENDING_BUCKETS', '100000')),
+}
+
 # Database
 DATABASES = {
     'default': {
@@ -145,6 +171,25 @@ TENANT_DOMAIN_MODEL = 'tenants.Domain'  # Specify the domain model for django-te
 TENANT_APPS_URLCONF = 'website_builder.urls'  # URL configuration for tenant apps
 TENANT_APPS_URLCONF_PREFIX = 'api/'  # URL prefix for tenant apps
 
+# Parallel migration processes per tenant provisioning run (tenants.provisioning)
+TENANT_PROVISIONING_WORKERS = int(os.getenv('TENANT_PROVISIONING_WORKERS', '4'))
+
+# New tenant schemas are cloned from this fully migrated template (tenants.golden)
+# instead of running every migration; it is rebuilt when migrations change.
+TENANT_GOLDEN_SCHEMA_ENABLED = os.getenv('TENANT_GOLDEN_SCHEMA_ENABLED', 'True') == 'True'
+TENANT_GOLDEN_SCHEMA = os.getenv('TENANT_GOLDEN_SCHEMA', 'golden_template')
+
+# Tenant hostname resolution cache (per worker, see tenants.cache)
+TENANT_DOMAIN_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('TENANT_DOMAIN_CACHE_MAX_ENTRIES', '10000')),
+    'TIMEOUT': int(os.getenv('TENANT_DOMAIN_CACHE_TIMEOUT', '300')),  # seconds
+    'NEGATIVE_TIMEOUT': int(os.getenv('TENANT_DOMAIN_CACHE_NEGATIVE_TIMEOUT', '30')),  # seconds
+    'LOOKUP_THREADS': int(os.getenv('TENANT_DOMAIN_CACHE_LOOKUP_THREADS', '4')),  # ASGI miss lookups
+}
+
+# Redis used to fan cache invalidations out across workers (see website_builder.pubsub)
+PUBSUB_REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 # Redis Cache
 CACHES = {
     "default": {
@@ -166,9 +211,36 @@ CACHEOPS_REDIS = os.getenv('REDIS_URL', 'redis://localhost:6379/1')
 CACHEOPS_DEFAULTS = {
     'timeout': 60*15
 }
+# Writes that send no model signals (QuerySet.update(), bulk_update(), raw
+# SQL) must invalidate what they change, with invalidated_update() or
+# cacheops.invalidate_obj, unless their model is left uncached here
 CACHEOPS = {
     'websites.*': {'ops': 'all', 'timeout': 60*15},
     'tenants.*': {'ops': 'all', 'timeout': 60*15},
+    # Append-only and written in bulk; caching it would cost an invalidation per row
+    'websites.previewemailtracker': None,
+    'websites.websitetrafficbucket': None,
+    # Rewritten with raw SQL by websites.rollups, which cacheops can't see
+    'websites.websitetrafficrollup': None,
+    'websites.previewemailopenbucket': None,
+    'websites.rollupwatermark': None,
+}
+# Keys are scoped to the tenant schema and can be flushed per tenant (tenants.cache_prefix)
+CACHEOPS_PREFIX = 'tenants.cache_prefix.cacheops_prefix'
+
+# Published website payloads (websites.render_cache): served fresh for FRESH
+# seconds, then stale for up to STALE more while refreshed in the background
+RENDER_CACHE = {
+    'FRESH': int(os.getenv('RENDER_CACHE_FRESH', '300')),
+    'STALE': int(os.getenv('RENDER_CACHE_STALE', str(24 * 60 * 60))),
+    'LOCK_TIMEOUT': 30,
+}
+
+# Buffered preview email open tracking (websites.tracking)
+EMAIL_OPEN_TRACKING = {
+    'FLUSH_INTERVAL': float(os.getenv('EMAIL_OPEN_FLUSH_INTERVAL', '1.0')),
+    'BATCH_SIZE': int(os.getenv('EMAIL_OPEN_BATCH_SIZE', '5000')),
+    'MAX_ATTEMPTS': int(os.getenv('EMAIL_OPEN_MAX_ATTEMPTS', '60')),
 }
 
 # CORS settings
@@ -261,6 +333,8 @@ STATICFILES_DIRS = [
 # Frontend static files
 FRONTEND_DIR = os.path.join(BASE_DIR, 'frontend_static')
 FRONTEND_INDEX = os.path.join(FRONTEND_DIR, 'index.html')
+FRONTEND_MANIFEST = os.path.join(FRONTEND_DIR, 'frontend-manifest.json')  # written by build_frontend_manifest
+FRONTEND_INDEX_CHECK_INTERVAL = 1 if DEBUG else 5  # seconds between index.html mtime checks
 
 # WhiteNoise configuration
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -300,9 +374,14 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson-backed; the browsable API is only offered in development
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'website_builder.renderers.FastJSONRenderer',
+    ] + (['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'website_builder.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_SCHEMA_CLASS_OPTIONS': {
@@ -329,6 +408,12 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Request metrics (see website_builder.middleware and /metrics)
+# Bearer token Prometheus scrapes /metrics with; the endpoint is disabled without one
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'True') == 'True'
+METRICS_TENANT_LABEL = os.getenv('METRICS_TENANT_LABEL', 'True') == 'True'  # disable for very many tenants
+
 # Health check settings
 HEALTH_CHECK = {
     'DISK_USAGE_MAX': 90,  # percent
@@ -336,6 +421,18 @@ HEALTH_CHECK = {
 }
 
 # Logging configuration
+# 'development' logs every SQL statement synchronously; 'production' writes
+# through a background queue, samples chatty loggers and only logs SQL
+# slower than LOG_SLOW_QUERY_MS.
+LOG_PROFILE = os.getenv('DJANGO_LOG_PROFILE', 'development' if DEBUG else 'production')
+LOG_FORMAT = os.getenv('DJANGO_LOG_FORMAT', 'verbose' if LOG_PROFILE == 'development' else 'json')
+LOG_SLOW_QUERY_MS = int(os.getenv('DJANGO_LOG_SLOW_QUERY_MS', '0' if LOG_PROFILE == 'development' else '200'))
+# Fraction of DEBUG/INFO records kept per logger prefix; warnings and errors are always kept
+LOG_SAMPLE_RATES = {
+    'websites.views_public': float(os.getenv('DJANGO_LOG_SAMPLE_API', '1.0' if LOG_PROFILE == 'development' else '0.01')),
+    'django.request': float(os.getenv('DJANGO_LOG_SAMPLE_REQUEST', '1.0' if LOG_PROFILE == 'development' else '0.1')),
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -348,52 +445,79 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'website_builder.logging_utils.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'website_builder.logging_utils.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
         },
         'file': {
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/django.log'),
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
         },
         'debug_file': {
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/debug.log'),
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
+        },
+        # Loggers write here; console/file I/O happens on a listener thread.
+        # Names must sort after the handlers they reference.
+        'queue': {
+            '()': 'website_builder.logging_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'filters': ['sampling'],
+        },
+        'queue_debug': {
+            '()': 'website_builder.logging_utils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file', 'cfg://handlers.debug_file'],
+            'filters': ['sampling'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': True,
         },
         'django.request': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': 'DEBUG' if LOG_PROFILE == 'development' else 'INFO',
             'propagate': False,
         },
         'django.server': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': 'DEBUG' if LOG_PROFILE == 'development' else 'INFO',
             'propagate': False,
         },
+        # Every statement in development (needs DEBUG); see LOG_SLOW_QUERY_MS otherwise
         'django.db.backends': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': 'DEBUG' if LOG_PROFILE == 'development' else 'WARNING',
+            'propagate': False,
+        },
+        'django.db.backends.slow': {
+            'handlers': ['queue'],
+            'level': 'WARNING',
             'propagate': False,
         },
         'websites': {
-            'handlers': ['console', 'file', 'debug_file'],
-            'level': 'DEBUG',
+            'handlers': ['queue_debug'],
+            'level': 'DEBUG' if LOG_PROFILE == 'development' else 'INFO',
             'propagate': False,
         },
         'tenants': {
-            'handlers': ['console', 'file', 'debug_file'],
-            'level': 'DEBUG',
+            'handlers': ['queue_debug'],
+            'level': 'DEBUG' if LOG_PROFILE == 'development' else 'INFO',
             'propagate': False,
         },
     },
@@ -403,13 +527,44 @@ LOGGING = {
 os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
 
 # Sentry configuration
+# Trace rates per route class (see website_builder.sentry), scaled by tenant tier.
+# Slow or failed transactions on SENTRY_TAIL_SAMPLED_ROUTES are always kept; those
+# routes are traced in full before the decision, so only list low-volume ones.
+SENTRY_TRACES_SAMPLE_RATES = {
+    'spa': float(os.getenv('SENTRY_TRACES_RATE_SPA', '0.01')),
+    'api': float(os.getenv('SENTRY_TRACES_RATE_API', '0.05')),
+    'admin': float(os.getenv('SENTRY_TRACES_RATE_ADMIN', '0.2')),
+    'websocket': float(os.getenv('SENTRY_TRACES_RATE_WEBSOCKET', '0.01')),
+    'static': 0.0,
+    'internal': 0.0,
+    'default': float(os.getenv('SENTRY_TRACES_SAMPLE_RATE', '0.01')),
+}
+SENTRY_TENANT_TIER_MULTIPLIERS = {
+    'trial': float(os.getenv('SENTRY_TRACES_TRIAL_MULTIPLIER', '0.5')),
+    'paid': float(os.getenv('SENTRY_TRACES_PAID_MULTIPLIER', '2.0')),
+}
+# schema name -> tier for tenants that need their own rate, e.g. {'acme': 'enterprise'}
+SENTRY_TENANT_TIERS = {}
+SENTRY_TAIL_SAMPLED_ROUTES = [r for r in os.getenv('SENTRY_TAIL_SAMPLED_ROUTES', 'admin').split(',') if r]
+SENTRY_SLOW_TRANSACTION_MS = int(os.getenv('SENTRY_SLOW_TRANSACTION_MS', '1000'))
+
 if not DEBUG and os.getenv('SENTRY_DSN'):
     import sentry_sdk
     from sentry_sdk.integrations.django import DjangoIntegration
 
+    from website_builder.sentry import TraceSampler
+
+    sentry_sampler = TraceSampler(
+        SENTRY_TRACES_SAMPLE_RATES,
+        tier_multipliers=SENTRY_TENANT_TIER_MULTIPLIERS,
+        tier_overrides=SENTRY_TENANT_TIERS,
+        tail_routes=SENTRY_TAIL_SAMPLED_ROUTES,
+        slow_ms=SENTRY_SLOW_TRANSACTION_MS,
+    )
     sentry_sdk.init(
         dsn=os.getenv('SENTRY_DSN'),
         integrations=[DjangoIntegration()],
-        traces_sample_rate=1.0,
-        send_default_pii=True
+        traces_sampler=sentry_sampler.traces_sampler,
+        before_send_transaction=sentry_sampler.before_send_transaction,
+        send_default_pii=os.getenv('SENTRY_SEND_DEFAULT_PII', 'False') == 'True'
     )
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.test.client import TenantClient
+
+from websites.models import Template
+
+from . import db
+from .broadcast import CLOSE_SLOW_CONSUMER, MAX_BATCH, GroupBatcher, SendQueue
+from .consumers import load_editor
+from .sentry import TraceSampler
+from .views import metrics
+
+
+class MetricsAccessTests(SimpleTestCase):
+    def get(self, **headers):
+        return metrics(RequestFactory().get('/metrics', REMOTE_ADDR='127.0.0.1', **headers))
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_bearer_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_token(self):
+        with self.assertRaises(Http404):
+            self.get()
+
+
+class TraceSamplerTests(SimpleTestCase):
+    def test_api_is_sampled_at_its_rate_by_default(self):
+        sampler = TraceSampler(
+            settings.SENTRY_TRACES_SAMPLE_RATES,
+            tail_routes=settings.SENTRY_TAIL_SAMPLED_ROUTES,
+        )
+
+        def sample(path):
+            return sampler.traces_sampler({'wsgi_environ': {'HTTP_HOST': 'example.com', 'PATH_INFO': path}})
+
+        self.assertEqual(sample('/api/websites/'), settings.SENTRY_TRACES_SAMPLE_RATES['api'])
+        self.assertEqual(sample('/admin/'), 1.0)
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, json.loads(message['text'])))
+
+
+class FakeConsumer:
+    channel_name = 'test.channel'
+
+    def __init__(self):
+        self.closed = None
+        self.unblock = asyncio.Event()
+
+    async def send(self, text_data):
+        # A client that never reads
+        await self.unblock.wait()
+
+    async def close(self, code=None):
+        self.closed = code
+
+
+class GroupBatcherTests(SimpleTestCase):
+    async def test_window_is_sent_as_one_message(self):
+        layer = FakeChannelLayer()
+        batcher = GroupBatcher(layer, window=0.01)
+        await batcher.add('g', {'n': 1})
+        await batcher.add('g', {'n': 2})
+        await asyncio.sleep(0.05)
+        self.assertEqual(layer.sent, [('g', {'type': 'batch', 'messages': [{'n': 1}, {'n': 2}]})])
+
+    async def test_early_flush_restarts_the_window(self):
+        layer = FakeChannelLayer()
+        batcher = GroupBatcher(layer, window=0.1)
+        for n in range(MAX_BATCH):
+            await batcher.add('g', {'n': n})
+        self.assertEqual(len(layer.sent), 1)
+
+        await asyncio.sleep(0.05)
+        await batcher.add('g', {'n': 'next'})
+        # The first window's timer must not flush the new one
+        await asyncio.sleep(0.07)
+        self.assertEqual(len(layer.sent), 1)
+        await asyncio.sleep(0.06)
+        self.assertEqual(layer.sent[-1], ('g', {'n': 'next'}))
+
+
+class SendQueueTests(SimpleTestCase):
+    async def test_drop_policy_keeps_the_newest(self):
+        outbox = SendQueue(FakeConsumer(), size=2, policy='drop')
+        for text in ('a', 'b', 'c'):
+            outbox.put(text)
+        self.assertEqual(outbox.dropped, 1)
+        self.assertEqual([outbox.queue.get_nowait() for _ in range(2)], ['b', 'c'])
+        outbox.stop()
+
+    async def test_close_policy_closes_slow_sockets(self):
+        consumer = FakeConsumer()
+        outbox = SendQueue(consumer, size=2, policy='close')
+        for text in ('a', 'b', 'c', 'd'):
+            outbox.put(text)
+        await asyncio.sleep(0)
+        self.assertTrue(outbox.stopped)
+        self.assertEqual(consumer.closed, CLOSE_SLOW_CONSUMER)
+        self.assertEqual(outbox.queue.qsize(), 2)
+
+
+class WriteBufferTests(SimpleTestCase):
+    async def test_writes_with_the_same_key_coalesce(self):
+        ran = []
+
+        async def run(schema_name, apply, ops):
+            # db._apply without the transaction
+            return [(True, func(*args)) for func, args in ops]
+
+        def write(value):
+            ran.append(value)
+            return value
+
+        buffer = db.WriteBuffer(interval=60)
+        with mock.patch.object(db, 'run', run):
+            first = buffer.submit('tenant', 'k', write, 1)
+            second = buffer.submit('tenant', 'k', write, 2)
+            unkeyed = [buffer.submit('tenant', None, write, 3) for _ in range(2)]
+            await buffer.flush('tenant')
+
+        self.assertEqual(ran, [2, 3, 3])
+        self.assertEqual((first.result(), second.result()), (2, 2))
+        self.assertEqual([future.result() for future in unkeyed], [3, 3])
+
+    async def test_early_flush_restarts_the_window(self):
+        batches = []
+
+        async def run(schema_name, apply, ops):
+            batches.append(len(ops))
+            return [(True, None)] * len(ops)
+
+        write = mock.Mock()
+        buffer = db.WriteBuffer(interval=0.1, max_batch=3)
+        with mock.patch.object(db, 'run', run):
+            for _ in range(3):
+                buffer.submit('tenant', None, write)
+            await asyncio.sleep(0.05)
+            self.assertEqual(batches, [3])
+
+            buffer.submit('tenant', None, write)
+            # The first window's timer must not flush the new one
+            await asyncio.sleep(0.07)
+            self.assertEqual(batches, [3])
+            await asyncio.sleep(0.06)
+            self.assertEqual(batches, [3, 1])
+
+
+class ConnectionRecyclingTests(SimpleTestCase):
+    def checkout(self, age):
+        conn = mock.Mock(connection=object(), errors_occurred=False)
+        with mock.patch.object(db, 'connection', conn):
+            db._local.opened_at = time.monotonic() - age
+            db._checkout()
+        return conn
+
+    def test_connections_are_kept_until_max_age(self):
+        self.checkout(age=1).close.assert_not_called()
+        self.checkout(age=db.CONN_MAX_AGE + 1).close.assert_called_once()
+
+    def test_broken_connections_are_replaced(self):
+        conn = mock.Mock(connection=object(), errors_occurred=True)
+        conn.is_usable.return_value = False
+        with mock.patch.object(db, 'connection', conn):
+            db._local.opened_at = time.monotonic()
+            db._checkout()
+        conn.close.assert_called_once()
+
+
+class BufferedWriteTransactionTests(TenantTestCase):
+    def test_failing_write_only_rolls_back_itself(self):
+        def create(name):
+            return Template.objects.create(
+                name=name, description='', thumbnail_url='https://example.com/t.png',
+                preview_url='https://example.com/p', category='Business',
+            ).pk
+
+        def fail():
+            create('Rolled back')
+            raise IntegrityError('duplicate')
+
+        results = db._apply([(create, ('First',)), (fail, ()), (create, ('Second',))])
+
+        self.assertEqual([ok for ok, _ in results], [True, False, True])
+        self.assertEqual(
+            sorted(Template.objects.values_list('name', flat=True)), ['First', 'Second'],
+        )
+
+
+class EditorSessionTests(TenantTestCase):
+    def test_editor_is_the_user_of_the_session_in_the_tenant_schema(self):
+        user = get_user_model().objects.create_user('editor', password='x')
+        client = TenantClient(self.tenant)
+        client.force_login(user)
+
+        self.assertEqual(load_editor(client.session.session_key), user)
+        self.assertIsNone(load_editor('not-a-session'))
+        self.assertIsNone(load_editor(None))
@@ -21,16 +21,19 @@ from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from rest_framework import viewsets
 from rest_framework.response import Response
-from websites.views import WebsiteViewSet, FrontendAppView
+from websites.views import WebsiteViewSet, ExportView, FrontendAppView, FrontendAssetView
 from websites.views_public import (
     WebsiteViewSet as PublicWebsiteViewSet,
     WebsiteConfigViewSet as PublicWebsiteConfigViewSet,
     TemplateViewSet as PublicTemplateViewSet,
     PreviewEmailViewSet as PublicPreviewEmailViewSet,
     PreviewEmailTrackerViewSet as PublicPreviewEmailTrackerViewSet,
-    BulkWebsiteCreatorViewSet as PublicBulkWebsiteCreatorViewSet
+    BulkWebsiteCreatorViewSet as PublicBulkWebsiteCreatorViewSet,
+    published_website,
+    preview_email_open
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from website_builder.views import metrics
 from django.views.static import serve
 import os
 import logging
@@ -63,19 +66,26 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     
     # API URLs - these must come before the frontend catch-all
+    path('api/export/<slug:kind>/', ExportView.as_view(), name='export'),
     path('api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # Public API URLs
+    path('public/api/websites/<int:pk>/published/', published_website, name='public-website-published'),
+    path('public/api/preview-emails/<int:pk>/open.gif', preview_email_open, name='public-preview-email-open'),
     path('public/api/', include(public_router.urls)),
     
+    # Per-worker Prometheus metrics
+    path('metrics', metrics, name='metrics'),
+    
     # Static files
     re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
     re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^frontend_static/(?P<path>.*)$', FrontendAssetView.as_view(), name='frontend-asset'),
     
     # Frontend catch-all - this must be last and should not match API routes
-    re_path(r'^(?!api/)(?!public/api/)(?!admin/)(?!static/)(?!media/).*$', FrontendAppView.as_view(), name='frontend'),
+    re_path(r'^(?!api/)(?!public/api/)(?!admin/)(?!static/)(?!media/)(?!frontend_static/).*$', FrontendAppView.as_view(), name='frontend'),
 ]
 
 # Serve static files in development
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from websites.views import FrontendAppView
+from websites.views import FrontendAppView, FrontendAssetView
 from rest_framework.routers import DefaultRouter
 from websites.views_public import (
     WebsiteViewSet,
@@ -10,9 +10,12 @@ from websites.views_public import (
     TemplateViewSet,
     PreviewEmailViewSet,
     PreviewEmailTrackerViewSet,
-    BulkWebsiteCreatorViewSet
+    BulkWebsiteCreatorViewSet,
+    published_website,
+    preview_email_open
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from website_builder.views import metrics
 from django.views.static import serve
 from django.views.generic import TemplateView
 import os
@@ -35,13 +38,18 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Public API URLs - these must come before the frontend catch-all
+    path('public/api/websites/<int:pk>/published/', published_website, name='public-website-published'),
+    path('public/api/preview-emails/<int:pk>/open.gif', preview_email_open, name='public-preview-email-open'),
     path('public/api/', include(router.urls)),
     path('public/api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('public/api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
+    # Per-worker Prometheus metrics
+    path('metrics', metrics, name='metrics'),
+    
     # Static files
     re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
-    re_path(r'^frontend_static/(?P<path>.*)$', serve, {'document_root': settings.FRONTEND_DIR}),
+    re_path(r'^frontend_static/(?P<path>.*)$', FrontendAssetView.as_view(), name='frontend-asset'),
     
     # Frontend catch-all - this must be last and should not match API routes
     re_path(r'^(?!public/api/)(?!admin/)(?!static/)(?!frontend_static/).*$', FrontendAppView.as_view(), name='frontend'),
@@ -0,0 +1,19 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from .metrics import registry
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for this worker's metrics. Requires
+    ``Authorization: Bearer <METRICS_TOKEN>``; disabled without a token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        raise Http404
+    supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
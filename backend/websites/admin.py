@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 from django.utils.html import format_html
-from .models import WebsiteConfig, Template
+from .models import WebsiteConfig, Template, BulkWebsiteCreator
 
 class TemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'is_premium', 'created_at')
@@ -22,10 +22,37 @@ class WebsiteConfigAdmin(admin.ModelAdmin):
     deployment_url_link.short_description = 'Deployment URL'
 
     def create_websites_from_list(self, request, queryset):
-        # This action will be triggered from the admin interface
-        # The actual creation will be handled by the frontend
-        self.message_user(request, "Please use the bulk creation form in the frontend interface.")
+        # Bulk jobs are created from the frontend and processed by
+        # `manage.py process_bulk_websites`; see BulkWebsiteCreatorAdmin for progress
+        self.message_user(
+            request,
+            "Please use the bulk creation form in the frontend interface. "
+            "Queued imports are listed under Bulk website creators."
+        )
     create_websites_from_list.short_description = "Create websites from list"
 
+class BulkWebsiteCreatorAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'template', 'status', 'progress', 'created_count', 'failed_count', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    readonly_fields = (
+        'status', 'started_at', 'completed_at', 'processed_count', 'created_count',
+        'failed_count', 'item_errors', 'error_message', 'created_at', 'updated_at',
+    )
+    actions = ['requeue']
+
+    def progress(self, obj):
+        return f'{obj.processed_count}/{obj.total_count}'
+    progress.short_description = 'Progress'
+
+    def requeue(self, request, queryset):
+        # Processing resumes after processed_count. QuerySet.update() would
+        # leave the jobs cached as failed.
+        count = queryset.filter(status='failed').invalidated_update(
+            status='pending', completed_at=None, error_message=None,
+        )
+        self.message_user(request, f"{count} failed bulk jobs queued again.")
+    requeue.short_description = "Retry selected failed jobs"
+
 admin.site.register(Template, TemplateAdmin)
 admin.site.register(WebsiteConfig, WebsiteConfigAdmin)
+admin.site.register(BulkWebsiteCreator, BulkWebsiteCreatorAdmin)
@@ -0,0 +1,303 @@
+"""
+Real-time analytics ingestion.
+
+"analytics" WebSocket frames are folded into per-minute counters in memory
+(``Aggregator``) instead of being written one by one. Every FLUSH_INTERVAL
+seconds the counters are swapped out and upserted per schema into
+WebsiteTrafficBucket with one INSERT ... ON CONFLICT per chunk, adding to
+whatever other workers already wrote for the same minute.
+
+Distinct visitors can't be summed across workers or flushes, so visitor ids
+go into Redis HyperLogLogs per minute, hour and day, and the bucket stores
+the minute estimate (websites.rollups reads the others).
+Without Redis the count seen by the flushing worker is kept as a lower
+bound.
+
+Counters of a schema whose flush fails are kept for the next one, at most
+MAX_PENDING_BUCKETS of them and for MAX_FLUSH_ATTEMPTS flushes in a row;
+after that they are dropped. Schemas without the tables (dropped tenants)
+are dropped at once.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import ProgrammingError, connection, transaction
+from redis.exceptions import RedisError
+
+from website_builder import db, pubsub
+from website_builder.renderers import dumps
+from .models import Website, WebsiteTrafficBucket
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'ANALYTICS', {})
+BUCKET_SECONDS = 60
+FLUSH_INTERVAL = _config.get('FLUSH_INTERVAL', 5)
+# Referrer hosts kept per bucket; the rest are counted as OTHER
+MAX_REFERRERS = _config.get('MAX_REFERRERS', 50)
+# Events accepted in one frame ({"type": "analytics", "events": [...]})
+MAX_EVENTS_PER_FRAME = 100
+# Upsert rows per statement
+UPSERT_CHUNK = 1000
+# Failed flushes of a schema in a row before its counters are dropped
+MAX_FLUSH_ATTEMPTS = _config.get('MAX_FLUSH_ATTEMPTS', 60)
+# Counters kept per schema while its flushes fail; the oldest go first
+MAX_PENDING_BUCKETS = _config.get('MAX_PENDING_BUCKETS', 100_000)
+HLL_TTL = 2 * 24 * 60 * 60
+
+DIRECT = '(direct)'
+OTHER = '(other)'
+
+
+class Bucket:
+    __slots__ = ('pageviews', 'visitors', 'referrers')
+
+    def __init__(self):
+        self.pageviews = 0
+        self.visitors = set()
+        self.referrers = Counter()
+
+    def merge(self, other):
+        self.pageviews += other.pageviews
+        self.visitors |= other.visitors
+        self.referrers.update(other.referrers)
+
+
+def referrer_host(referrer):
+    if not referrer or not isinstance(referrer, str):
+        return DIRECT
+    try:
+        host = urlsplit(referrer).hostname
+    except ValueError:
+        # Sent by the client, e.g. an unclosed IPv6 bracket
+        return OTHER
+    return host[:255] if host else DIRECT
+
+
+class Aggregator:
+    """
+    Thread-safe in-memory counters keyed by (schema, website id, bucket start)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._failures = Counter()
+
+    def add(self, schema_name, website_id, visitor=None, referrer=None, now=None):
+        now = time.time() if now is None else now
+        key = (schema_name, website_id, int(now) // BUCKET_SECONDS * BUCKET_SECONDS)
+        host = referrer_host(referrer)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = Bucket()
+            bucket.pageviews += 1
+            if visitor:
+                bucket.visitors.add(str(visitor)[:64])
+            if host in bucket.referrers or len(bucket.referrers) < MAX_REFERRERS:
+                bucket.referrers[host] += 1
+            else:
+                bucket.referrers[OTHER] += 1
+
+    def swap(self):
+        """
+        Take every counter collected so far, grouped by schema
+        """
+        with self._lock:
+            buckets, self._buckets = self._buckets, {}
+        by_schema = {}
+        for (schema_name, website_id, start), bucket in buckets.items():
+            by_schema.setdefault(schema_name, {})[(website_id, start)] = bucket
+        return by_schema
+
+    def restore(self, schema_name, buckets):
+        """
+        Put counters back after a failed flush, within MAX_FLUSH_ATTEMPTS
+        and MAX_PENDING_BUCKETS. Returns the number of buckets dropped.
+        """
+        with self._lock:
+            self._failures[schema_name] += 1
+            if self._failures[schema_name] >= MAX_FLUSH_ATTEMPTS:
+                del self._failures[schema_name]
+                return len(buckets)
+            for (website_id, start), bucket in buckets.items():
+                current = self._buckets.setdefault((schema_name, website_id, start), Bucket())
+                current.merge(bucket)
+            pending = [key for key in self._buckets if key[0] == schema_name]
+            excess = len(pending) - MAX_PENDING_BUCKETS
+            if excess > 0:
+                for key in sorted(pending, key=lambda key: key[2])[:excess]:
+                    del self._buckets[key]
+            return max(excess, 0)
+
+    def flushed(self, schema_name):
+        with self._lock:
+            self._failures.pop(schema_name, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+aggregator = Aggregator()
+
+
+def ingest(schema_name, website_id, data, now=None):
+    """
+    Count the pageviews of an "analytics" frame. Returns how many were counted.
+    """
+    events = data.get('events')
+    if not isinstance(events, list):
+        events = [data]
+    counted = 0
+    for event in events[:MAX_EVENTS_PER_FRAME]:
+        if not isinstance(event, dict) or event.get('event', 'pageview') != 'pageview':
+            continue
+        aggregator.add(schema_name, website_id, event.get('visitor'), event.get('referrer'), now)
+        counted += 1
+    return counted
+
+
+HLL_PERIODS = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+
+
+def hll_key(schema_name, website_id, granularity, start):
+    """
+    Redis HyperLogLog of the visitors of a website in one minute, hour or day
+    (websites.rollups reads the hour and day ones)
+    """
+    start = int(start) // HLL_PERIODS[granularity] * HLL_PERIODS[granularity]
+    return f'analytics:hll:{schema_name}:{website_id}:{granularity}:{start}'
+
+
+def count_visitors(schema_name, buckets):
+    """
+    Add visitor ids to the Redis HyperLogLogs of their minute, hour and day
+    and return the minute estimates, or the local counts if Redis is
+    unavailable
+    """
+    keys = list(buckets)
+    try:
+        pipe = pubsub.get_redis().pipeline(transaction=False)
+        for website_id, start in keys:
+            visitors = buckets[(website_id, start)].visitors
+            for granularity in HLL_PERIODS:
+                hll = hll_key(schema_name, website_id, granularity, start)
+                if visitors:
+                    pipe.pfadd(hll, *visitors)
+                pipe.expire(hll, HLL_TTL)
+            pipe.pfcount(hll_key(schema_name, website_id, 'minute', start))
+        replies = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Counting visitors locally, Redis failed: {e}")
+        return {key: len(buckets[key].visitors) for key in keys}
+    # Only the PFCOUNTs, which close each key's group of replies
+    counts, position = {}, 0
+    for key in keys:
+        position += len(HLL_PERIODS) * (2 if buckets[key].visitors else 1) + 1
+        counts[key] = replies[position - 1]
+    return counts
+
+
+def _upsert_sql(rows):
+    table = WebsiteTrafficBucket._meta.db_table
+    values = ', '.join(['(%s, %s, %s, %s, %s::jsonb, now())'] * rows)
+    return f"""
+        INSERT INTO {table} AS t (website_id, bucket_start, pageviews, visitors, referrers, updated_at)
+        VALUES {values}
+        ON CONFLICT (website_id, bucket_start) DO UPDATE SET
+            updated_at = EXCLUDED.updated_at,
+            pageviews = t.pageviews + EXCLUDED.pageviews,
+            visitors = GREATEST(t.visitors, EXCLUDED.visitors),
+            referrers = (
+                SELECT COALESCE(jsonb_object_agg(key, total), '{{}}'::jsonb)
+                FROM (
+                    SELECT key, SUM(value::bigint) AS total
+                    FROM (
+                        SELECT * FROM jsonb_each_text(t.referrers)
+                        UNION ALL
+                        SELECT * FROM jsonb_each_text(EXCLUDED.referrers)
+                    ) AS merged
+                    GROUP BY key
+                ) AS summed
+            )
+    """
+
+
+def write_buckets(buckets, visitors):
+    """
+    Upsert the counters of the current schema. Buckets of websites deleted
+    in the meantime are skipped.
+    """
+    existing = set(Website.objects.filter(pk__in={w for w, _ in buckets}).values_list('pk', flat=True))
+    rows = [
+        (
+            website_id,
+            datetime.fromtimestamp(start, dt_timezone.utc),
+            bucket.pageviews,
+            visitors[(website_id, start)],
+            dumps(dict(bucket.referrers)).decode(),
+        )
+        for (website_id, start), bucket in buckets.items() if website_id in existing
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for i in range(0, len(rows), UPSERT_CHUNK):
+            chunk = rows[i:i + UPSERT_CHUNK]
+            cursor.execute(_upsert_sql(len(chunk)), [value for row in chunk for value in row])
+    return len(rows)
+
+
+def flush_schema(schema_name, buckets):
+    """
+    Synchronously write one schema's counters (run in that schema)
+    """
+    return write_buckets(buckets, count_visitors(schema_name, buckets))
+
+
+async def flush():
+    """
+    Write everything collected so far, one schema at a time on the database
+    pool. Counters of a schema that fails are kept for the next flush.
+    """
+    written = 0
+    for schema_name, buckets in aggregator.swap().items():
+        try:
+            written += await db.run(schema_name, flush_schema, schema_name, buckets)
+        except ProgrammingError as e:
+            # Missing tables: the schema was dropped
+            logger.error(f"Dropping {len(buckets)} analytics buckets of {schema_name}: {e}")
+        except Exception:
+            logger.exception(f"Flushing {len(buckets)} analytics buckets in {schema_name} failed")
+            dropped = aggregator.restore(schema_name, buckets)
+            if dropped:
+                logger.error(f"Dropped {dropped} analytics buckets of {schema_name} after repeated failures")
+        else:
+            aggregator.flushed(schema_name)
+    return written
+
+
+async def _flush_forever():
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        await flush()
+
+
+_flushers = weakref.WeakKeyDictionary()
+
+
+def ensure_flusher():
+    """
+    Start the flush task of the running event loop if it isn't running yet
+    """
+    loop = asyncio.get_running_loop()
+    task = _flushers.get(loop)
+    if task is None or task.done():
+        _flushers[loop] = loop.create_task(_flush_forever())
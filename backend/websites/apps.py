@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WebsitesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'websites'
+
+    def ready(self):
+        import websites.signals  # noqa
@@ -0,0 +1,226 @@
+"""
+Processing of BulkWebsiteCreator jobs.
+
+Workers claim pending jobs with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of them can run side by side (``manage.py process_bulk_websites``).
+A job is processed in chunks: each chunk is validated, checked against the
+existing domain names with one query, inserted with bulk_create and recorded
+in the job's progress counters, all in one transaction. A worker that dies
+mid-job leaves the job in_progress; once it is STALE_AFTER old another
+worker reclaims it and resumes after the last committed chunk.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BulkWebsiteCreator, WebsiteConfig
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+
+# Jobs in progress without a committed chunk for this long are reclaimed
+STALE_AFTER = timedelta(minutes=15)
+
+# Per-item errors kept on the job; failed_count has the full number
+MAX_ITEM_ERRORS = 1000
+
+_max_company_length = WebsiteConfig._meta.get_field('company_name').max_length
+_max_domain_length = WebsiteConfig._meta.get_field('domain_name').max_length
+_validate_url = URLValidator()
+
+
+def normalize_domain(domain):
+    return str(domain or '').strip().lower().rstrip('.')
+
+
+def validate_item(company_name, domain_name):
+    """
+    Return an error message for one (company, domain) pair, or None
+    """
+    if not company_name or not str(company_name).strip():
+        return 'Company name is required'
+    if len(str(company_name)) > _max_company_length:
+        return f'Company name is longer than {_max_company_length} characters'
+    if not domain_name:
+        return 'Domain name is required'
+    if len(domain_name) > _max_domain_length:
+        return f'Domain name is longer than {_max_domain_length} characters'
+    try:
+        # Same check as WebsiteConfig.clean
+        _validate_url(f'https://{domain_name}')
+    except ValidationError:
+        return 'Invalid domain name format'
+    return None
+
+
+def claim_job(stale_after=STALE_AFTER):
+    """
+    Mark the oldest pending (or abandoned) job as in progress and return it,
+    or None when there is nothing to do. Never blocks on other workers.
+    """
+    stale = timezone.now() - stale_after
+    with transaction.atomic():
+        job = (
+            BulkWebsiteCreator.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status='pending') | Q(status='in_progress', updated_at__lt=stale))
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        if job.status == 'in_progress':
+            logger.warning(f"Reclaiming stale bulk job {job.pk} at item {job.processed_count}")
+        job.status = 'in_progress'
+        job.started_at = job.started_at or timezone.now()
+        job.save(update_fields=['status', 'started_at', 'updated_at'])
+    return job
+
+
+def _prepare_chunk(job, start, companies, domains, seen):
+    """
+    Validate a chunk and drop domains that already exist. Returns the
+    WebsiteConfig rows to insert and the per-item errors.
+    """
+    errors = []
+    candidates = []
+    for offset, (company, raw_domain) in enumerate(zip(companies, domains)):
+        index = start + offset
+        domain = normalize_domain(raw_domain)
+        error = validate_item(company, domain)
+        if error is None and domain in seen:
+            error = 'Duplicate domain name in this import'
+        if error is not None:
+            errors.append({'index': index, 'domain_name': raw_domain, 'error': error})
+            continue
+        seen.add(domain)
+        candidates.append((index, str(company).strip(), domain))
+
+    existing = set(
+        WebsiteConfig.objects
+        .filter(domain_name__in=[domain for _, _, domain in candidates])
+        .values_list('domain_name', flat=True)
+    )
+    rows = []
+    for index, company, domain in candidates:
+        if domain in existing:
+            errors.append({'index': index, 'domain_name': domain, 'error': 'Domain name already exists'})
+            continue
+        rows.append(WebsiteConfig(
+            template_id=job.template_id,
+            user_id=job.user_id,
+            company_name=company,
+            domain_name=domain,
+        ))
+    return rows, errors
+
+
+def _commit_chunk(job, start, companies, domains, seen, chunk_size):
+    """
+    Insert one chunk and advance the job's progress in a single transaction.
+    Retries once if another writer took one of the domains in between.
+    """
+    for attempt in (1, 2):
+        rows, errors = _prepare_chunk(job, start, companies, domains, set(seen))
+        try:
+            with transaction.atomic():
+                WebsiteConfig.objects.bulk_create(rows, batch_size=chunk_size)
+                job.processed_count = start + len(domains)
+                job.created_count += len(rows)
+                job.failed_count += len(errors)
+                room = MAX_ITEM_ERRORS - len(job.item_errors)
+                job.item_errors = job.item_errors + errors[:max(room, 0)]
+                job.save(update_fields=[
+                    'processed_count', 'created_count', 'failed_count', 'item_errors', 'updated_at',
+                ])
+        except IntegrityError:
+            job.refresh_from_db()
+            if attempt == 2:
+                raise
+            continue
+        seen.update(row.domain_name for row in rows)
+        return
+
+
+def process_job(job, chunk_size=CHUNK_SIZE):
+    """
+    Create the websites of a claimed job, resuming after its last committed
+    chunk. Returns the job with its final status.
+    """
+    companies = list(job.company_names or [])
+    domains = list(job.domain_names or [])
+    if len(companies) != len(domains):
+        return finish_job(
+            job, 'failed',
+            f'{len(companies)} company names but {len(domains)} domain names',
+        )
+
+    # Domains committed by earlier chunks, to report duplicates within the import
+    seen = {normalize_domain(d) for d in domains[:job.processed_count]}
+    try:
+        for start in range(job.processed_count, len(domains), chunk_size):
+            end = start + chunk_size
+            _commit_chunk(job, start, companies[start:end], domains[start:end], seen, chunk_size)
+    except Exception as e:
+        logger.exception(f"Bulk job {job.pk} failed at item {job.processed_count}")
+        return finish_job(job, 'failed', str(e))
+
+    if job.created_count == 0 and job.failed_count:
+        return finish_job(job, 'failed', f'None of the {job.failed_count} websites could be created')
+    message = f'{job.failed_count} of {len(domains)} items failed' if job.failed_count else None
+    return finish_job(job, 'completed', message)
+
+
+def finish_job(job, status, error_message=None):
+    job.status = status
+    job.error_message = error_message
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
+    logger.info(
+        f"Bulk job {job.pk} {status}: {job.created_count} created, {job.failed_count} failed"
+    )
+    return job
+
+
+def run_worker(chunk_size=CHUNK_SIZE, max_jobs=None):
+    """
+    Claim and process jobs in the current schema until none are left.
+    Returns the number of jobs processed.
+    """
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        job = claim_job()
+        if job is None:
+            break
+        process_job(job, chunk_size=chunk_size)
+        done += 1
+    return done
+
+
+def run_worker_in_schemas(schema_names, chunk_size=CHUNK_SIZE):
+    """
+    Process pool entry point: drain the jobs of every given tenant schema.
+    Returns the number of jobs processed.
+    """
+    from django.db import close_old_connections
+    from django_tenants.utils import schema_context
+
+    total = 0
+    try:
+        while True:
+            done = 0
+            for schema_name in schema_names:
+                with schema_context(schema_name):
+                    done += run_worker(chunk_size=chunk_size, max_jobs=1)
+            total += done
+            if not done:
+                return total
+    finally:
+        close_old_connections()
@@ -0,0 +1,350 @@
+"""
+Live editing state of websites, kept in Redis.
+
+Each website being edited has a document ({"content": ..., "settings": ...})
+with a sequence number, a capped log of the deltas that produced the last
+LOG_LENGTH sequence numbers, and a presence hash of the connected editors:
+
+    doc:<schema>:<id>            hash: state (JSON), seq, row_version
+    doc:<schema>:<id>:log        list of {"seq": n, "patch": {...}}
+    doc:<schema>:<id>:presence   hash: editor id -> {"user": ..., "state": ..., "at": ...}
+
+Changes are JSON merge patches (RFC 7386), which can't carry a null value,
+so documents never hold nulls: they are stripped from rows and from whole
+objects sent by editors. ``apply`` updates the document under WATCH and
+returns the minimal patch actually applied, which is what gets broadcast.
+Joiners get a snapshot; reconnecting clients that know their last seq get
+only the deltas since, or a snapshot if the log no longer reaches back that
+far.
+
+The Website row is the source of truth. A document is loaded from the row
+when missing (it expires after STATE_TTL without edits) and records the
+row's updated_at as its row_version. WebsiteConsumer writes it back with
+``persist``, which only does so while the row is still at that version.
+Saves from anywhere else (REST, bulk writes) call ``reload`` once
+committed, which replaces the document with the row and broadcasts the
+difference as a regular delta.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+import redis.asyncio
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from redis.exceptions import RedisError, WatchError
+
+from website_builder import db, pubsub
+from website_builder.renderers import dumps
+from .models import Website
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('content', 'settings')
+LOG_LENGTH = 500
+STATE_TTL = 24 * 60 * 60
+# Editors not heard from for this long are left out of snapshots
+PRESENCE_TTL = 120
+MAX_RETRIES = 20
+
+_clients = weakref.WeakKeyDictionary()
+
+
+class DocumentNotFound(Exception):
+    """
+    The website of a document no longer exists
+    """
+
+
+def get_redis():
+    """
+    asyncio Redis client of the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = redis.asyncio.Redis.from_url(settings.PUBSUB_REDIS_URL)
+    return client
+
+
+def document_key(schema_name, website_id):
+    return f'doc:{schema_name}:{website_id}'
+
+
+def group_name(schema_name, website_id):
+    """
+    Channel layer group of a website's editors; website ids repeat across
+    tenant schemas
+    """
+    return f'website_{schema_name}_{website_id}'
+
+
+def merge_patch(target, patch):
+    """
+    Apply an RFC 7386 merge patch, returning a new value
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def make_patch(old, new):
+    """
+    Smallest merge patch turning ``old`` into ``new``, or None if equal
+    """
+    if old == new:
+        return None
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+        else:
+            change = make_patch(old[key], value)
+            if change is not None:
+                patch[key] = change
+    return patch or None
+
+
+def strip_nulls(value):
+    """
+    ``value`` without null object members, which a merge patch would turn
+    into deletions
+    """
+    if not isinstance(value, dict):
+        return value
+    return {key: strip_nulls(item) for key, item in value.items() if item is not None}
+
+
+def row_version(website):
+    return website.updated_at.isoformat()
+
+
+def row_state(website):
+    return {field: strip_nulls(getattr(website, field) or {}) for field in FIELDS}
+
+
+def initial_seq():
+    """
+    First seq of a freshly loaded document. Starting from the clock keeps
+    seqs growing across reloads, so a client holding a seq of an expired
+    document gets a snapshot rather than unrelated deltas.
+    """
+    return int(time.time() * 1000)
+
+
+def load_row(website_id):
+    return Website.objects.filter(pk=website_id).first()
+
+
+async def _load(schema_name, website_id):
+    website = await db.run(schema_name, load_row, website_id)
+    if website is None:
+        raise DocumentNotFound(website_id)
+    return website
+
+
+async def snapshot(schema_name, website_id):
+    """
+    (seq, state) of a website's document, loading it from the row if needed
+    """
+    key = document_key(schema_name, website_id)
+    client = get_redis()
+    state, seq = await client.hmget(key, 'state', 'seq')
+    if state is None:
+        website = await _load(schema_name, website_id)
+        async with client.pipeline() as pipe:
+            pipe.hsetnx(key, 'state', dumps(row_state(website)))
+            pipe.hsetnx(key, 'seq', initial_seq())
+            pipe.hsetnx(key, 'row_version', row_version(website))
+            pipe.expire(key, STATE_TTL)
+            pipe.hmget(key, 'state', 'seq')
+            state, seq = (await pipe.execute())[-1]
+    return int(seq), json.loads(state)
+
+
+async def apply(schema_name, website_id, change):
+    """
+    Replace the document with ``change(state)``. Returns (seq, patch, state);
+    patch is None if nothing changed.
+    """
+    key = document_key(schema_name, website_id)
+    log_key = key + ':log'
+    client = get_redis()
+    for _ in range(MAX_RETRIES):
+        async with client.pipeline() as pipe:
+            try:
+                await pipe.watch(key)
+                raw, seq = await pipe.hmget(key, 'state', 'seq')
+                if raw is None:
+                    # Expired or never loaded: start from the current row
+                    website = await _load(schema_name, website_id)
+                    state, version, seq = row_state(website), row_version(website), initial_seq()
+                else:
+                    state, version, seq = json.loads(raw), None, int(seq)
+                new_state = change(state)
+                patch = make_patch(state, new_state)
+                if patch is None:
+                    return seq, None, state
+                seq += 1
+                pipe.multi()
+                pipe.hset(key, mapping={'state': dumps(new_state), 'seq': seq})
+                if version is not None:
+                    pipe.hset(key, 'row_version', version)
+                pipe.rpush(log_key, dumps({'seq': seq, 'patch': patch}))
+                pipe.ltrim(log_key, -LOG_LENGTH, -1)
+                pipe.expire(key, STATE_TTL)
+                pipe.expire(log_key, STATE_TTL)
+                await pipe.execute()
+                return seq, patch, new_state
+            except WatchError:
+                continue
+    raise RuntimeError(f'Could not update document {key}: too much contention')
+
+
+async def deltas_since(schema_name, website_id, since):
+    """
+    The logged deltas after ``since``, or None if the log no longer
+    covers them
+    """
+    key = document_key(schema_name, website_id)
+    client = get_redis()
+    async with client.pipeline() as pipe:
+        pipe.hget(key, 'seq')
+        pipe.lrange(key + ':log', 0, -1)
+        seq, log = await pipe.execute()
+    if seq is None or since > int(seq):
+        return None
+    deltas = [json.loads(entry) for entry in log]
+    deltas = [delta for delta in deltas if delta['seq'] > since]
+    if int(seq) > since and (not deltas or deltas[0]['seq'] != since + 1):
+        return None
+    return deltas
+
+
+async def join(schema_name, website_id, editor_id, user=None, state=None):
+    key = document_key(schema_name, website_id) + ':presence'
+    async with get_redis().pipeline() as pipe:
+        pipe.hset(key, editor_id, dumps({'user': user, 'state': state, 'at': time.time()}))
+        pipe.expire(key, STATE_TTL)
+        await pipe.execute()
+
+
+async def leave(schema_name, website_id, editor_id):
+    await get_redis().hdel(document_key(schema_name, website_id) + ':presence', editor_id)
+
+
+async def editors(schema_name, website_id):
+    """
+    Editors seen within PRESENCE_TTL, as {editor id: {"user": ..., "state": ...}}
+    """
+    entries = await get_redis().hgetall(document_key(schema_name, website_id) + ':presence')
+    cutoff = time.time() - PRESENCE_TTL
+    present = {}
+    for editor_id, raw in entries.items():
+        entry = json.loads(raw)
+        if entry['at'] >= cutoff:
+            present[editor_id.decode()] = {'user': entry['user'], 'state': entry['state']}
+    return present
+
+
+def reload(schema_name, website_id, website=None):
+    """
+    Replace a loaded document with the row (in the current schema) if the
+    row changed since the document was loaded or persisted, and broadcast
+    the difference. Synchronous.
+    """
+    key = document_key(schema_name, website_id)
+    log_key = key + ':log'
+    client = pubsub.get_redis()
+    if not client.exists(key):
+        # Nobody is editing it live
+        return
+    if website is None:
+        website = load_row(website_id)
+    if website is None:
+        client.delete(key, log_key)
+        return
+    for _ in range(MAX_RETRIES):
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                raw, seq, version = pipe.hmget(key, 'state', 'seq', 'row_version')
+                if raw is None or (version and version.decode() == row_version(website)):
+                    return
+                state = row_state(website)
+                patch = make_patch(json.loads(raw), state)
+                pipe.multi()
+                pipe.hset(key, 'row_version', row_version(website))
+                if patch is not None:
+                    seq = int(seq) + 1
+                    pipe.hset(key, mapping={'state': dumps(state), 'seq': seq})
+                    pipe.rpush(log_key, dumps({'seq': seq, 'patch': patch}))
+                    pipe.ltrim(log_key, -LOG_LENGTH, -1)
+                pipe.execute()
+                break
+            except WatchError:
+                continue
+    else:
+        raise RuntimeError(f'Could not reload document {key}: too much contention')
+    if patch is not None:
+        async_to_sync(get_channel_layer().group_send)(group_name(schema_name, website_id), {
+            'type': 'broadcast_batch',
+            'text': dumps({'type': 'delta', 'seq': seq, 'patch': patch, 'editor': None}).decode(),
+        })
+
+
+def reload_on_commit(website_id, website=None):
+    """
+    reload() once the current transaction commits; for saves made outside
+    live editing. ``website`` is the saved instance, if there is one.
+    """
+    schema_name = connection.schema_name
+
+    def run():
+        try:
+            reload(schema_name, website_id, website)
+        except (RedisError, RuntimeError) as e:
+            # Stays on the old row version; the next persist reloads it
+            logger.warning(f"Could not reload live document of website {website_id}: {e}")
+
+    transaction.on_commit(run)
+
+
+def persist(schema_name, website_id):
+    """
+    Save the current document to the Website row. Synchronous; runs on the
+    website_builder.db pool, in the website's schema. Reads the latest state
+    so writes from different workers can't regress it, and leaves a row
+    changed outside live editing alone (reloading the document from it).
+    """
+    website = Website.objects.select_for_update().filter(pk=website_id).first()
+    if website is None:
+        return
+    client = pubsub.get_redis()
+    key = document_key(schema_name, website_id)
+    raw, version = client.hmget(key, 'state', 'row_version')
+    if raw is None:
+        return
+    if version is None or version.decode() != row_version(website):
+        reload(schema_name, website_id, website)
+        return
+    state = json.loads(raw)
+    changed = [field for field in FIELDS if strip_nulls(getattr(website, field) or {}) != state.get(field, {})]
+    if changed:
+        for field in changed:
+            setattr(website, field, state.get(field, {}))
+        website.save(update_fields=changed + ['updated_at'])
+        client.hset(key, 'row_version', row_version(website))
@@ -0,0 +1,119 @@
+"""
+Streaming exports of Website and WebsiteConfig rows.
+
+Rows are read through a server-side cursor (QuerySet.iterator) and encoded
+incrementally to NDJSON or CSV, optionally gzipped on the fly, so memory use
+stays flat however large the table is.
+"""
+
+import csv
+import io
+import zlib
+
+from website_builder.renderers import dumps
+
+from .models import Website, WebsiteConfig
+
+CHUNK_SIZE = 2000
+
+# Bytes gathered before handing a piece to the server
+FLUSH_BYTES = 64 * 1024
+
+EXPORTS = {
+    'websites': Website,
+    'website-configs': WebsiteConfig,
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def export_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def export_queryset(model, tenant=None, deployment_status=None):
+    queryset = model.objects.all()
+    if tenant is not None:
+        if not hasattr(model, 'tenant'):
+            raise ValueError(f'{model.__name__} rows have no tenant')
+        lookup = 'tenant_id' if str(tenant).isdigit() else 'tenant__schema_name'
+        queryset = queryset.filter(**{lookup: tenant})
+    if deployment_status is not None:
+        queryset = queryset.filter(deployment_status=deployment_status)
+    return queryset.order_by('pk').values_list(*export_fields(model))
+
+
+def ndjson_lines(fields, rows):
+    for row in rows:
+        yield dumps(dict(zip(fields, row))) + b'\n'
+
+
+class _Line:
+    """
+    File-like sink for csv.writer that hands back what was written
+    """
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+
+    def write(self, value):
+        self.buffer.write(value)
+
+    def pop(self):
+        value = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return value.encode('utf-8')
+
+
+def csv_lines(fields, rows):
+    sink = _Line()
+    writer = csv.writer(sink)
+    writer.writerow(fields)
+    yield sink.pop()
+    for row in rows:
+        # JSON columns (content, settings, ...) become JSON text cells
+        writer.writerow([
+            dumps(value).decode('utf-8') if isinstance(value, (dict, list)) else value
+            for value in row
+        ])
+        yield sink.pop()
+
+
+def batched(pieces, size=FLUSH_BYTES):
+    """
+    Join small pieces into blocks of roughly ``size`` bytes
+    """
+    block, length = [], 0
+    for piece in pieces:
+        block.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield b''.join(block)
+            block, length = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def gzipped(blocks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(queryset, output='ndjson', compress=False, chunk_size=CHUNK_SIZE):
+    """
+    Return an iterator of encoded byte blocks for ``queryset`` (from
+    export_queryset)
+    """
+    fields = export_fields(queryset.model)
+    rows = queryset.iterator(chunk_size=chunk_size)
+    lines = csv_lines(fields, rows) if output == 'csv' else ndjson_lines(fields, rows)
+    blocks = batched(lines)
+    return gzipped(blocks) if compress else blocks
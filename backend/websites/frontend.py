@@ -0,0 +1,276 @@
+"""
+Serving support for the built frontend in FRONTEND_DIR.
+
+index.html: the SPA shell is read, rewritten and compressed once per process
+and rebuilt only when the file on disk (or the asset manifest) changes. Files
+are stat'ed at most every FRONTEND_INDEX_CHECK_INTERVAL seconds, so
+conditional requests are answered from memory.
+
+Assets: ``manage.py build_frontend_manifest`` writes fingerprinted, precompressed
+copies of everything under assets/ plus a manifest. Fingerprinted URLs never
+change content and are served as immutable.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Asset paths emitted by the Vite build, rewritten to where Django serves them
+ASSET_REWRITES = (
+    ('src="./assets/', 'src="/frontend_static/assets/'),
+    ('href="./assets/', 'href="/frontend_static/assets/'),
+    ('href="/vite.svg"', 'href="/frontend_static/vite.svg"'),
+    ('content="/og-image.png"', 'content="/frontend_static/og-image.png"'),
+    # Add base tag for client-side routing
+    ('<head>', '<head><base href="/">'),
+)
+
+Representation = namedtuple('Representation', ['body', 'etag'])
+
+
+class BuiltIndex:
+    """
+    Pre-encoded index.html plus its compressed variants, keyed by content-coding
+    """
+
+    def __init__(self, content):
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        self.variants = {None: Representation(content, f'"{digest}"')}
+        self.variants['gzip'] = Representation(
+            gzip.compress(content, compresslevel=9, mtime=0), f'"{digest}-gzip"'
+        )
+        if brotli is not None:
+            self.variants['br'] = Representation(brotli.compress(content), f'"{digest}-br"')
+
+
+def rewrite_index(content, manifest=None):
+    """
+    Apply the asset path rewrites to the raw index.html text, pointing assets
+    at their fingerprinted copies when a manifest is available
+    """
+    for old, new in ASSET_REWRITES:
+        content = content.replace(old, new)
+    for logical, entry in (manifest or {}).items():
+        hashed_url = f'/frontend_static/{entry.path}'
+        content = content.replace(f'"/frontend_static/{logical}"', f'"{hashed_url}"')
+        content = content.replace(f'"/{logical}"', f'"{hashed_url}"')
+    return content
+
+
+class IndexDocument:
+    """
+    Process-wide cache of the rewritten index.html
+    """
+
+    def __init__(self, path, manifest, check_interval=2):
+        self.path = path
+        self.manifest = manifest
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._built = None
+        self._signature = None
+        self._checked_at = 0
+
+    def _stat_signature(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def get(self):
+        """
+        Return the current BuiltIndex. Raises FileNotFoundError when the
+        frontend hasn't been built.
+        """
+        now = time.monotonic()
+        if self._built is not None and now - self._checked_at < self.check_interval:
+            return self._built
+        with self._lock:
+            if self._built is not None and now - self._checked_at < self.check_interval:
+                return self._built
+            manifest = self.manifest.get()
+            signature = (self._stat_signature(), manifest.signature)
+            if signature != self._signature or self._built is None:
+                with open(self.path, 'rb') as f:
+                    content = rewrite_index(f.read().decode('utf-8'), manifest.files)
+                self._built = BuiltIndex(content.encode('utf-8'))
+                self._signature = signature
+            self._checked_at = now
+            return self._built
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    Pick the best content-coding from an Accept-Encoding header, preferring br
+    """
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in ('br', 'gzip'):
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if coding in available and q > 0:
+            return coding
+    return None
+
+
+AssetEntry = namedtuple('AssetEntry', ['path', 'etag', 'encodings'])
+
+LoadedManifest = namedtuple('LoadedManifest', ['files', 'hashed', 'signature'])
+
+EMPTY_MANIFEST = LoadedManifest({}, {}, None)
+
+# Extensions worth precompressing
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.map', '.svg', '.json', '.html', '.txt')
+
+# Suffixes of the precompressed variants, by content-coding
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def file_digest(path):
+    """
+    Return the sha256 hex digest of a file, read in chunks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(logical, digest):
+    """
+    assets/app.js -> assets/app.<first 12 hex chars of digest>.js
+    """
+    root, ext = os.path.splitext(logical)
+    return f'{root}.{digest[:12]}{ext}'
+
+
+class AssetManifest:
+    """
+    Process-wide view of the manifest written by build_frontend_manifest
+    """
+
+    def __init__(self, path, check_interval=2):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = EMPTY_MANIFEST
+        self._checked_at = None
+
+    def _load(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return EMPTY_MANIFEST
+        signature = (st.st_mtime_ns, st.st_ino, st.st_size)
+        if signature == self._loaded.signature:
+            return self._loaded
+        with open(self.path, 'rb') as f:
+            raw = json.load(f)
+        files = {
+            logical: AssetEntry(info['path'], info['etag'], tuple(info.get('encodings', ())))
+            for logical, info in raw.get('files', {}).items()
+        }
+        hashed = {entry.path: entry for entry in files.values()}
+        return LoadedManifest(files, hashed, signature)
+
+    def get(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._loaded
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_interval:
+                self._loaded = self._load()
+                self._checked_at = now
+            return self._loaded
+
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header. Returns (start, end) inclusive, None
+    when the header should be ignored, or False when it is unsatisfiable.
+    Multi-range requests are answered with the full body.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """
+    File-like view of [start, end] of an open file. Exposes fileno() so WSGI
+    servers with sendfile support (gunicorn) can still send it zero-copy.
+    """
+
+    def __init__(self, f, start, end):
+        self._file = f
+        self._remaining = end - start + 1
+        f.seek(start)
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+asset_manifest = AssetManifest(
+    settings.FRONTEND_MANIFEST,
+    check_interval=getattr(settings, 'FRONTEND_INDEX_CHECK_INTERVAL', 2),
+)
+
+index_document = IndexDocument(
+    settings.FRONTEND_INDEX,
+    asset_manifest,
+    check_interval=getattr(settings, 'FRONTEND_INDEX_CHECK_INTERVAL', 2),
+)
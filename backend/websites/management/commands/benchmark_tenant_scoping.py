@@ -0,0 +1,89 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django_tenants.utils import schema_context
+
+from tenants.models import Tenant
+from websites.models import Website
+
+PAGE_SIZE = 10
+
+
+class Rollback(Exception):
+    pass
+
+
+def variants(tenant):
+    """
+    The list querysets of the authenticated website API, before and after
+    """
+    return (
+        ('join', Website.objects.filter(tenant__schema_name=tenant.schema_name)),
+        ('tenant_id', Website.objects.for_tenant(tenant)),
+        ('schema', Website.objects.all()),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and latency of tenant-scoped website list queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('schema', help='Tenant schema to run in')
+        parser.add_argument('--websites', type=int, default=100_000,
+                            help='Websites to insert for the run (rolled back afterwards)')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(schema_name=options['schema'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"No tenant with schema {options['schema']}")
+
+        with schema_context(tenant.schema_name):
+            try:
+                with transaction.atomic():
+                    self.seed(tenant, options['websites'])
+                    self.run(tenant, options['iterations'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, tenant, count):
+        run = uuid.uuid4().hex[:8]
+        start = time.perf_counter()
+        Website.objects.bulk_create(
+            (
+                Website(tenant=tenant, name=f'Bench {i}', slug=f'bench-{run}-{i}', template='business')
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Website._meta.db_table}')
+        self.stdout.write(f'Inserted {count} websites in {time.perf_counter() - start:.1f}s')
+
+    def list_page(self, queryset):
+        # What the viewset runs for one page: COUNT(*) plus the rows
+        queryset.count()
+        list(queryset.order_by('-created_at')[:PAGE_SIZE])
+
+    def run(self, tenant, iterations):
+        self.stdout.write(f'{"filter":<10} {"queries":>8} {"mean ms":>9} {"p95 ms":>9}')
+        for name, queryset in variants(tenant):
+            with CaptureQueriesContext(connection) as queries:
+                self.list_page(queryset)
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                self.list_page(queryset)
+                durations.append(time.perf_counter() - start)
+            durations.sort()
+            p95 = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+            self.stdout.write(
+                f'{name:<10} {len(queries):>8} {statistics.mean(durations) * 1000:>9.2f} {p95 * 1000:>9.2f}'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{iterations} list requests per filter'))
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+import gzip
+import json
+import os
+from websites.frontend import (
+    COMPRESSIBLE_EXTENSIONS,
+    ENCODING_SUFFIXES,
+    brotli,
+    file_digest,
+    hashed_name,
+)
+
+class Command(BaseCommand):
+    help = 'Fingerprint and precompress frontend_static/assets and write the asset manifest'
+
+    def handle(self, *args, **options):
+        assets_dir = os.path.join(settings.FRONTEND_DIR, 'assets')
+        if not os.path.isdir(assets_dir):
+            self.stderr.write(self.style.ERROR(f'No assets directory at {assets_dir}'))
+            return
+
+        # Remove what the previous run generated so stale copies don't pile up
+        generated = self._previous_outputs()
+        for relpath in generated:
+            path = os.path.join(settings.FRONTEND_DIR, relpath)
+            if os.path.exists(path):
+                os.remove(path)
+
+        files = {}
+        for root, _, names in os.walk(assets_dir):
+            for name in sorted(names):
+                if name.endswith(tuple(ENCODING_SUFFIXES.values())):
+                    continue
+                source = os.path.join(root, name)
+                logical = os.path.relpath(source, settings.FRONTEND_DIR).replace(os.sep, '/')
+                digest = file_digest(source)
+                target = hashed_name(logical, digest)
+                target_path = os.path.join(settings.FRONTEND_DIR, target)
+
+                with open(source, 'rb') as f:
+                    content = f.read()
+                with open(target_path, 'wb') as f:
+                    f.write(content)
+
+                encodings = []
+                if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    encodings = self._precompress(target_path, content)
+
+                files[logical] = {
+                    'path': target,
+                    'etag': f'"{digest[:32]}"',
+                    'size': len(content),
+                    'encodings': encodings,
+                }
+
+        with open(settings.FRONTEND_MANIFEST, 'w') as f:
+            json.dump({'version': 1, 'files': files}, f, indent=2, sort_keys=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Fingerprinted {len(files)} assets into {settings.FRONTEND_MANIFEST}'
+        ))
+
+    def _precompress(self, path, content):
+        """
+        Write .br/.gz siblings of a fingerprinted file, keeping only those that
+        are actually smaller. Returns the content-codings written.
+        """
+        variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['br'] = brotli.compress(content)
+        encodings = []
+        for coding, data in variants.items():
+            if len(data) >= len(content):
+                continue
+            with open(path + ENCODING_SUFFIXES[coding], 'wb') as f:
+                f.write(data)
+            encodings.append(coding)
+        return encodings
+
+    def _previous_outputs(self):
+        try:
+            with open(settings.FRONTEND_MANIFEST) as f:
+                previous = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return []
+        outputs = []
+        for info in previous.get('files', {}).values():
+            outputs.append(info['path'])
+            outputs.extend(info['path'] + ENCODING_SUFFIXES[c] for c in info.get('encodings', ()))
+        return outputs
\ No newline at end of file
@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def registered_viewsets():
+    """
+    (prefix, viewset) for every router-registered viewset backed by a queryset
+    """
+    from website_builder.urls import public_router, router
+
+    for prefix, registry in (('api', router.registry), ('public/api', public_router.registry)):
+        for route, viewset, basename in registry:
+            if issubclass(viewset, GenericAPIView):
+                yield f'{prefix}/{route}/', viewset
+
+
+def list_queries(viewset, tenant):
+    """
+    The querysets a GET on the list endpoint runs: the page, and the COUNT
+    for page number pagination
+    """
+    request = RequestFactory().get('/')
+    request.tenant = tenant
+    view = viewset(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+    view.request = view.initialize_request(request)
+    view.request.user = AnonymousUser()
+    queryset = view.filter_queryset(view.get_queryset())
+
+    paginator = view.paginator
+    if isinstance(paginator, CursorPagination):
+        yield 'page', queryset.order_by(*paginator.ordering)[:paginator.page_size + 1]
+    elif isinstance(paginator, PageNumberPagination):
+        yield 'count', queryset.order_by()
+        yield 'page', queryset[:paginator.page_size]
+    else:
+        yield 'page', queryset
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the list query of each API viewset and flag sequential scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema to explain in (repeatable; default: all tenants)')
+        parser.add_argument('--no-analyze', action='store_false', dest='analyze',
+                            help='Plan only, without running the queries')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help="Don't flag seq scans of tables estimated smaller than this")
+
+    def handle(self, *args, **options):
+        Tenant = get_tenant_model()
+        tenants = Tenant.objects.exclude(schema_name=get_public_schema_name())
+        if options['schemas']:
+            tenants = tenants.filter(schema_name__in=options['schemas'])
+
+        flagged = 0
+        for tenant in tenants:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Schema {tenant.schema_name}'))
+            with schema_context(tenant.schema_name):
+                for endpoint, viewset in registered_viewsets():
+                    for kind, queryset in list_queries(viewset, tenant):
+                        flagged += self.explain(endpoint, kind, queryset, options)
+
+        message = f'{flagged} sequential scans on large tables'
+        self.stdout.write(self.style.WARNING(message) if flagged else self.style.SUCCESS(message))
+
+    def explain(self, endpoint, kind, queryset, options):
+        if kind == 'count':
+            # Same scan as the COUNT(*) the paginator runs
+            queryset = queryset.values('pk')
+        output = queryset.explain(format='json', analyze=options['analyze'])
+        plan = json.loads(output)[0]
+        root = plan['Plan']
+        timing = f" {plan['Execution Time']:.2f}ms" if 'Execution Time' in plan else ''
+        self.stdout.write(f"  {endpoint} [{kind}] cost={root['Total Cost']}{timing}")
+
+        flagged = 0
+        for node in plan_nodes(root):
+            if node['Node Type'] != 'Seq Scan':
+                continue
+            table = node['Relation Name']
+            estimate = self.table_rows(connections[queryset.db], table)
+            line = f"    Seq Scan on {table} (~{estimate} rows)"
+            if estimate >= options['min_rows']:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(line))
+            elif options['verbosity'] > 1:
+                self.stdout.write(line)
+        return flagged
+
+    def table_rows(self, connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                [connection.ops.quote_name(table)],
+            )
+            row = cursor.fetchone()
+        return max(row[0], 0) if row and row[0] is not None else 0
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from websites import tracking
+
+
+class Command(BaseCommand):
+    help = 'Write buffered preview email opens to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep flushing every FLUSH_INTERVAL seconds instead of exiting once drained')
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help='Put dead-lettered opens back into the buffer first')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            moved = tracking.requeue_dead_letters()
+            self.stdout.write(f'Requeued {moved} dead-lettered email opens')
+        total = tracking.drain()
+        while options['loop']:
+            time.sleep(tracking.FLUSH_INTERVAL)
+            total += tracking.drain()
+        self.stdout.write(self.style.SUCCESS(f'Wrote {total} email opens'))
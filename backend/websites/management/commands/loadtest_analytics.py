@@ -0,0 +1,73 @@
+import asyncio
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django_tenants.utils import schema_context
+
+from websites import analytics
+from websites.models import Website
+
+TARGET_EVENTS_PER_SECOND = 10_000
+
+REFERRERS = [None, 'https://www.google.com/search?q=x', 'https://t.co/abc', 'https://news.ycombinator.com/']
+
+
+class Command(BaseCommand):
+    help = 'Feed synthetic analytics frames through the WebSocket ingestion path and report throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=500_000)
+        parser.add_argument('--websites', type=int, default=50, help='Distinct websites (ignored with --schema)')
+        parser.add_argument('--visitors', type=int, default=100_000, help='Distinct visitor ids')
+        parser.add_argument('--per-frame', type=int, default=1, help='Events per analytics frame')
+        parser.add_argument('--schema', help='Tenant schema whose websites receive the events; '
+                                             'the counters are then flushed to its database')
+
+    def handle(self, *args, **options):
+        schema_name = options['schema'] or 'loadtest'
+        if options['schema']:
+            with schema_context(schema_name):
+                website_ids = list(Website.objects.values_list('pk', flat=True)[:options['websites']])
+            if not website_ids:
+                raise CommandError(f'No websites in schema {schema_name}')
+        else:
+            website_ids = list(range(1, options['websites'] + 1))
+
+        per_frame = max(options['per_frame'], 1)
+        frames = []
+        for _ in range(options['events'] // per_frame):
+            events = [
+                {
+                    'event': 'pageview',
+                    'visitor': f"v{random.randrange(options['visitors'])}",
+                    'referrer': random.choice(REFERRERS),
+                    'path': '/',
+                }
+                for _ in range(per_frame)
+            ]
+            frame = {'type': 'analytics', 'events': events} if per_frame > 1 else dict(events[0], type='analytics')
+            frames.append((random.choice(website_ids), json.dumps(frame)))
+
+        # Same work as WebsiteConsumer.receive for an analytics frame
+        start = time.perf_counter()
+        counted = 0
+        for website_id, text in frames:
+            counted += analytics.ingest(schema_name, website_id, json.loads(text))
+        elapsed = time.perf_counter() - start
+        rate = counted / elapsed
+        self.stdout.write(
+            f'Ingested {counted} events in {elapsed:.2f}s: {rate:,.0f} events/s, '
+            f'{len(analytics.aggregator)} buckets in memory'
+        )
+
+        if options['schema']:
+            start = time.perf_counter()
+            written = asyncio.run(analytics.flush())
+            self.stdout.write(f'Flushed {written} buckets in {(time.perf_counter() - start) * 1000:.0f}ms')
+        else:
+            analytics.aggregator.swap()
+
+        style = self.style.SUCCESS if rate >= TARGET_EVENTS_PER_SECOND else self.style.WARNING
+        self.stdout.write(style(f'Target {TARGET_EVENTS_PER_SECOND:,} events/s per worker'))
@@ -0,0 +1,49 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django_tenants.utils import get_public_schema_name, get_tenant_model
+
+from websites.bulk import CHUNK_SIZE, run_worker_in_schemas
+
+
+class Command(BaseCommand):
+    help = 'Create the websites of pending bulk website creation jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema to process (repeatable; default: all tenants)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes; jobs are claimed with SKIP LOCKED so they never overlap')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Websites inserted per transaction')
+
+    def handle(self, *args, **options):
+        schemas = options['schemas'] or list(
+            get_tenant_model().objects
+            .exclude(schema_name=get_public_schema_name())
+            .values_list('schema_name', flat=True)
+        )
+        workers, chunk_size = max(options['workers'], 1), options['chunk_size']
+
+        if workers == 1:
+            processed = run_worker_in_schemas(schemas, chunk_size)
+        else:
+            # Fresh interpreters rather than forks, so no connection is shared
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            ) as pool:
+                futures = [
+                    pool.submit(run_worker_in_schemas, schemas, chunk_size)
+                    for _ in range(workers)
+                ]
+                processed = sum(future.result() for future in futures)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} bulk jobs across {len(schemas)} schemas with {workers} workers'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_tenants.utils import get_public_schema_name, get_tenant_model, schema_context
+
+from websites import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll new analytics rows up into the hour/day traffic and email open buckets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema', action='append', dest='schemas',
+                            help='Tenant schema to roll up (repeatable; default: all tenants)')
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Keep running, once every SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['schemas'])
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def run_once(self, schemas):
+        schemas = schemas or list(
+            get_tenant_model().objects
+            .exclude(schema_name=get_public_schema_name())
+            .values_list('schema_name', flat=True)
+        )
+        traffic = opens = 0
+        start = time.perf_counter()
+        for schema_name in schemas:
+            with schema_context(schema_name):
+                counts = rollups.run()
+            traffic += counts['traffic']
+            opens += counts['opens']
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {traffic} traffic buckets and {opens} email opens across '
+            f'{len(schemas)} schemas in {time.perf_counter() - start:.1f}s'
+        ))
@@ -0,0 +1,39 @@
+"""
+Tenant scoping for websites models.
+
+Every websites table lives in its tenant's schema, so the schema is already
+the tenant boundary. ``for_tenant`` only adds a filter for models that also
+carry a foreign key to the tenant (Website.tenant), and then filters on the
+local tenant_id column rather than joining the public tenants table.
+"""
+
+from django.db import models
+from django_tenants.utils import get_tenant_model
+
+_tenant_fields = {}
+
+
+def tenant_field(model):
+    """
+    Name of ``model``'s foreign key to the tenant model, or None when the
+    schema alone scopes its rows
+    """
+    if model not in _tenant_fields:
+        tenant_model = get_tenant_model()
+        _tenant_fields[model] = next(
+            (field.name for field in model._meta.concrete_fields
+             if field.is_relation and field.related_model is tenant_model),
+            None,
+        )
+    return _tenant_fields[model]
+
+
+class TenantScopedQuerySet(models.QuerySet):
+    def for_tenant(self, tenant):
+        field = tenant_field(self.model)
+        if field is None:
+            return self
+        return self.filter(**{f'{field}_id': tenant.pk})
+
+
+TenantScopedManager = models.Manager.from_queryset(TenantScopedQuerySet)
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0002_rename_supabase_url_to_deployment_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkwebsitecreator',
+            name='created_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkwebsitecreator',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkwebsitecreator',
+            name='item_errors',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='bulkwebsitecreator',
+            name='processed_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkwebsitecreator',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
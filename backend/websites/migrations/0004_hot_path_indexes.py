@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:07
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run in a transaction, and doesn't block
+    # writes to large tenant tables while it builds
+    atomic = False
+
+    dependencies = [
+        ('websites', '0003_bulkwebsitecreator_progress'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='bulkwebsitecreator',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'in_progress'])), fields=['created_at'], name='bulk_claimable_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='page',
+            index=models.Index(fields=['website', 'created_at'], name='page_website_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='page',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['website'], name='page_published_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='previewemail',
+            index=models.Index(fields=['sent_at'], name='pemail_sent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='previewemail',
+            index=models.Index(fields=['website', 'sent_at'], name='pemail_website_sent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='previewemail',
+            index=models.Index(condition=models.Q(('opened_at__isnull', True)), fields=['sent_at'], name='pemail_unopened_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='previewemailtracker',
+            index=models.Index(fields=['opened_at'], name='ptracker_opened_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='previewemailtracker',
+            index=models.Index(fields=['preview_email', 'opened_at'], name='ptracker_email_opened_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='website',
+            index=models.Index(fields=['created_at', 'id'], name='website_created_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='website',
+            index=models.Index(fields=['tenant', 'created_at'], name='website_tenant_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='website',
+            index=models.Index(fields=['deployment_status', 'created_at'], name='website_status_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='websiteconfig',
+            index=models.Index(fields=['created_at'], name='wcfg_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='websiteconfig',
+            index=models.Index(fields=['deployment_status', 'created_at'], name='wcfg_status_created_idx'),
+        ),
+    ]
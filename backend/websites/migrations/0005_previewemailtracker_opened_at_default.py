@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='previewemailtracker',
+            name='opened_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0005_previewemailtracker_opened_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebsiteTrafficBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('pageviews', models.PositiveBigIntegerField(default=0)),
+                ('visitors', models.PositiveBigIntegerField(default=0)),
+                ('referrers', models.JSONField(blank=True, default=dict)),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic_buckets', to='websites.website')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='websitetrafficbucket',
+            constraint=models.UniqueConstraint(fields=('website', 'bucket_start'), name='traffic_bucket_unique'),
+        ),
+    ]
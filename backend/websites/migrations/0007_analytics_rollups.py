@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0006_websitetrafficbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('pending_position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WebsiteTrafficRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('pageviews', models.PositiveBigIntegerField(default=0)),
+                ('visitors', models.PositiveBigIntegerField(default=0)),
+                ('referrers', models.JSONField(blank=True, default=dict)),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic_rollups', to='websites.website')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PreviewEmailOpenBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('opens', models.PositiveBigIntegerField(default=0)),
+                ('preview_email', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='open_buckets', to='websites.previewemail')),
+                ('website', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_open_buckets', to='websites.website')),
+            ],
+            options={
+                'ordering': ['-bucket_start'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='websitetrafficrollup',
+            constraint=models.UniqueConstraint(fields=('website', 'granularity', 'bucket_start'), name='traffic_rollup_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='previewemailopenbucket',
+            index=models.Index(fields=['website', 'granularity', 'bucket_start'], name='open_bucket_website_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='previewemailopenbucket',
+            constraint=models.UniqueConstraint(fields=('preview_email', 'granularity', 'bucket_start'), name='open_bucket_unique'),
+        ),
+    ]
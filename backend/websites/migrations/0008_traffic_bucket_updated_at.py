@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('websites', '0007_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='websitetrafficbucket',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='websitetrafficbucket',
+            index=models.Index(fields=['updated_at'], name='traffic_bucket_updated_idx'),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 from django.conf import settings
 from tenants.models import Tenant
+from .managers import TenantScopedManager
 
 User = get_user_model()
 
@@ -19,6 +21,8 @@ class Template(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TenantScopedManager()
+
     def __str__(self):
         return self.name
 
@@ -74,8 +78,14 @@ class WebsiteConfig(models.Model):
     def __str__(self):
         return f"{self.company_name} ({self.domain_name})"
 
+    objects = TenantScopedManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='wcfg_created_idx'),
+            models.Index(fields=['deployment_status', 'created_at'], name='wcfg_status_created_idx'),
+        ]
 
 class Website(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE, related_name='websites')
@@ -111,11 +121,19 @@ class Website(models.Model):
     deployment_status = models.CharField(max_length=50, blank=True, null=True)
     deployment_url = models.URLField(blank=True, null=True)
     last_deployed_at = models.DateTimeField(blank=True, null=True)
+
+    objects = TenantScopedManager()
     
     class Meta:
         verbose_name = _('Website')
         verbose_name_plural = _('Websites')
         unique_together = ('tenant', 'slug')
+        indexes = [
+            # Cursor pagination order of the public list
+            models.Index(fields=['created_at', 'id'], name='website_created_id_idx'),
+            models.Index(fields=['tenant', 'created_at'], name='website_tenant_created_idx'),
+            models.Index(fields=['deployment_status', 'created_at'], name='website_status_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.tenant.name} - {self.name}"
@@ -128,9 +146,16 @@ class Page(models.Model):
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantScopedManager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['website', 'created_at'], name='page_website_created_idx'),
+            # Published pages of a website, read by the render cache
+            models.Index(fields=['website'], condition=models.Q(is_published=True), name='page_published_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -145,20 +170,34 @@ class PreviewEmail(models.Model):
     def __str__(self):
         return f"Preview for {self.website.name} to {self.recipient_email}"
 
+    objects = TenantScopedManager()
+
     class Meta:
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['sent_at'], name='pemail_sent_idx'),
+            models.Index(fields=['website', 'sent_at'], name='pemail_website_sent_idx'),
+            models.Index(fields=['sent_at'], condition=models.Q(opened_at__isnull=True), name='pemail_unopened_idx'),
+        ]
 
 class PreviewEmailTracker(models.Model):
     preview_email = models.ForeignKey(PreviewEmail, on_delete=models.CASCADE, related_name='trackers')
-    opened_at = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so batched writes keep the time of the open
+    opened_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
 
     def __str__(self):
         return f"Tracker for {self.preview_email}"
 
+    objects = TenantScopedManager()
+
     class Meta:
         ordering = ['-opened_at']
+        indexes = [
+            models.Index(fields=['opened_at'], name='ptracker_opened_idx'),
+            models.Index(fields=['preview_email', 'opened_at'], name='ptracker_email_opened_idx'),
+        ]
 
 class BulkWebsiteCreator(models.Model):
     STATUS_CHOICES = [
@@ -178,8 +217,127 @@ class BulkWebsiteCreator(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
 
+    # Progress, updated with every chunk committed by websites.bulk
+    started_at = models.DateTimeField(null=True, blank=True)
+    processed_count = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    item_errors = models.JSONField(default=list, blank=True)  # [{index, domain_name, error}], capped
+
+    @property
+    def total_count(self):
+        return len(self.domain_names or [])
+
     def __str__(self):
         return f"Bulk creation by {self.user.email} - {self.status}"
 
+    objects = TenantScopedManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Jobs websites.bulk.claim_job can pick up
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status__in=['pending', 'in_progress']),
+                name='bulk_claimable_idx',
+            ),
+        ]
+
+class WebsiteTrafficBucket(models.Model):
+    """
+    Per-minute traffic of a website, upserted by websites.analytics
+    """
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='traffic_buckets')
+    bucket_start = models.DateTimeField()
+    pageviews = models.PositiveBigIntegerField(default=0)
+    # HyperLogLog estimate of distinct visitors in the bucket
+    visitors = models.PositiveBigIntegerField(default=0)
+    referrers = models.JSONField(default=dict, blank=True)  # {host: pageviews}
+    # Set by every upsert; websites.rollups rebuilds the hours changed since its last run
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = TenantScopedManager()
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['website', 'bucket_start'], name='traffic_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='traffic_bucket_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.website_id} @ {self.bucket_start:%Y-%m-%d %H:%M}"
+
+class WebsiteTrafficRollup(models.Model):
+    """
+    Hourly and daily traffic of a website, rebuilt from WebsiteTrafficBucket
+    by websites.rollups
+    """
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='traffic_rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    pageviews = models.PositiveBigIntegerField(default=0)
+    visitors = models.PositiveBigIntegerField(default=0)
+    referrers = models.JSONField(default=dict, blank=True)
+
+    objects = TenantScopedManager()
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['website', 'granularity', 'bucket_start'], name='traffic_rollup_unique'),
+        ]
+
+class PreviewEmailOpenBucket(models.Model):
+    """
+    Opens of a preview email per minute, hour and day, added up from
+    PreviewEmailTracker rows by websites.rollups
+    """
+    GRANULARITY_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    preview_email = models.ForeignKey(PreviewEmail, on_delete=models.CASCADE, related_name='open_buckets')
+    # Copied from the email so a website's opens are read without a join
+    website = models.ForeignKey(Website, on_delete=models.CASCADE, related_name='email_open_buckets')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    opens = models.PositiveBigIntegerField(default=0)
+
+    objects = TenantScopedManager()
+
+    class Meta:
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['preview_email', 'granularity', 'bucket_start'], name='open_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['website', 'granularity', 'bucket_start'], name='open_bucket_website_idx'),
+        ]
+
+class RollupWatermark(models.Model):
+    """
+    How far a rollup has processed its source. ``pending_position`` is the
+    end of the source seen by the previous run; it becomes the next run's
+    upper bound, so rows of transactions still open back then are not
+    skipped.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    pending_position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TenantScopedManager()
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Unlike PageNumberPagination this never runs COUNT(*) and never scans
+    skipped rows with OFFSET, so page cost stays flat on large tables.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Render cache for published websites.
+
+The public payload of a published Website (plus its published pages) is
+serialized once and kept as JSON bytes in the Django cache, one entry per
+(schema, website) holding the current revision. Saves of a Website or Page
+re-render it after commit (websites.signals), so readers rarely miss.
+
+Entries are fresh for FRESH seconds and then served stale for up to STALE
+more while a single background refresh (guarded by cache.add) rebuilds
+them. That also repairs entries missed by writes that bypass signals,
+e.g. QuerySet.update().
+"""
+
+import hashlib
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Prefetch
+from django_tenants.utils import schema_context
+
+from website_builder.renderers import dumps
+from .models import Page, Website
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'RENDER_CACHE', {})
+FRESH = _config.get('FRESH', 300)
+STALE = _config.get('STALE', 24 * 60 * 60)
+LOCK_TIMEOUT = _config.get('LOCK_TIMEOUT', 30)
+
+# body is None for websites that don't exist or aren't published
+Rendered = namedtuple('Rendered', ['revision', 'built_at', 'body'])
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='render-cache')
+
+
+def cache_key(schema_name, website_id):
+    return f'render:{schema_name}:{website_id}'
+
+
+def render(website_id):
+    """
+    Serialize a published website to JSON bytes, or None if it isn't published
+    """
+    from .serializers import PublishedWebsiteSerializer
+
+    website = (
+        Website.objects
+        .filter(pk=website_id, is_published=True)
+        .prefetch_related(Prefetch(
+            'pages', queryset=Page.objects.filter(is_published=True), to_attr='published_pages',
+        ))
+        .first()
+    )
+    if website is None:
+        return None
+    return dumps(PublishedWebsiteSerializer(website).data)
+
+
+def refresh(website_id, schema_name=None):
+    """
+    Re-render a website in the current schema and store it. Returns the entry.
+    """
+    schema_name = schema_name or connection.schema_name
+    body = render(website_id)
+    revision = hashlib.sha256(body).hexdigest()[:20] if body is not None else None
+    entry = Rendered(revision, time.time(), body)
+    cache.set(cache_key(schema_name, website_id), tuple(entry), FRESH + STALE)
+    return entry
+
+
+def refresh_in_schema(schema_name, website_id):
+    """
+    refresh() that logs instead of raising, for callers outside a request
+    """
+    try:
+        with schema_context(schema_name):
+            refresh(website_id, schema_name)
+    except Exception:
+        logger.exception(f"Refreshing render cache of website {website_id} in {schema_name} failed")
+
+
+def refresh_on_commit(website_id):
+    """
+    Write-through: re-render once the current transaction commits
+    """
+    schema_name = connection.schema_name
+    transaction.on_commit(lambda: refresh_in_schema(schema_name, website_id))
+
+
+def _refresh_in_background(schema_name, website_id):
+    close_old_connections()
+    try:
+        refresh_in_schema(schema_name, website_id)
+    finally:
+        cache.delete(cache_key(schema_name, website_id) + ':lock')
+        close_old_connections()
+
+
+def get(website_id):
+    """
+    Return the Rendered entry for a website in the current schema, rendering
+    it on a miss and scheduling a refresh when it is stale
+    """
+    schema_name = connection.schema_name
+    key = cache_key(schema_name, website_id)
+    cached = cache.get(key)
+    if cached is None:
+        return refresh(website_id, schema_name)
+    entry = Rendered(*cached)
+    if time.time() - entry.built_at > FRESH and cache.add(key + ':lock', 1, LOCK_TIMEOUT):
+        _refresh_executor.submit(_refresh_in_background, schema_name, website_id)
+    return entry
@@ -0,0 +1,254 @@
+"""
+Analytics rollups and the queries dashboards read them with.
+
+``rollup_traffic`` rebuilds the hour and day rows of WebsiteTrafficRollup
+for every hour with WebsiteTrafficBucket rows upserted since its last run,
+however old the hour is (e.g. counters re-flushed after a failure). Minute
+rows keep changing while their minute is being flushed, so rollups are
+recomputed from all minutes of the hour (not added to), and each changed
+day is recomputed from its hours.
+
+``rollup_opens`` adds new PreviewEmailTracker rows (by id, past the
+watermark) into per-minute/hour/day PreviewEmailOpenBucket counters.
+
+Both run set-based INSERT ... SELECT ... ON CONFLICT statements in the
+current schema, and the read functions only touch as many rows as there are
+buckets in the requested range.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from website_builder import pubsub
+from . import analytics
+from .models import (
+    PreviewEmail,
+    PreviewEmailOpenBucket,
+    PreviewEmailTracker,
+    RollupWatermark,
+    WebsiteTrafficBucket,
+    WebsiteTrafficRollup,
+)
+
+logger = logging.getLogger(__name__)
+
+TRAFFIC = 'traffic'
+OPENS = 'preview_email_opens'
+
+# Longest a flush transaction may take to commit after stamping updated_at
+LATENESS = timedelta(minutes=2)
+
+# Tracker ids rolled up per statement
+OPENS_CHUNK = 100_000
+
+# Longest range a read may cover, in buckets
+MAX_BUCKETS = 1000
+
+GRANULARITY_SECONDS = {'minute': 60, 'hour': 60 * 60, 'day': 24 * 60 * 60}
+
+
+def _watermark(name):
+    watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(name=name)
+    return watermark
+
+
+def _referrers_merged(source):
+    """
+    SQL for summing the referrers JSON of ``source`` rows per (website_id, b)
+    """
+    return f"""
+        SELECT website_id, b, jsonb_object_agg(key, total) AS referrers
+        FROM (
+            SELECT website_id, b, key, SUM(value::bigint) AS total
+            FROM {source}, jsonb_each_text(referrers)
+            GROUP BY website_id, b, key
+        ) AS per_key
+        GROUP BY website_id, b
+    """
+
+
+def _rebuild(granularity, source_sql, params):
+    """
+    Recompute rollup rows of ``granularity`` from ``source_sql``, which
+    selects (website_id, b, pageviews, visitors, referrers). Returns the
+    (website_id, bucket_start) pairs written.
+    """
+    table = WebsiteTrafficRollup._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            WITH source AS ({source_sql}),
+            totals AS (
+                SELECT website_id, b, SUM(pageviews) AS pageviews, MAX(visitors) AS visitors
+                FROM source GROUP BY website_id, b
+            ),
+            referrers AS ({_referrers_merged('source')})
+            INSERT INTO {table} AS r (website_id, granularity, bucket_start, pageviews, visitors, referrers)
+            SELECT t.website_id, %s, t.b, t.pageviews, t.visitors, COALESCE(ref.referrers, '{{}}'::jsonb)
+            FROM totals t LEFT JOIN referrers ref ON ref.website_id = t.website_id AND ref.b = t.b
+            ON CONFLICT (website_id, granularity, bucket_start) DO UPDATE SET
+                pageviews = EXCLUDED.pageviews,
+                visitors = GREATEST(r.visitors, EXCLUDED.visitors),
+                referrers = EXCLUDED.referrers
+            RETURNING website_id, bucket_start
+        """, params + [granularity])
+        return cursor.fetchall()
+
+
+def _update_visitors(granularity, written):
+    """
+    Replace the lower-bound visitor counts with the HyperLogLog estimates of
+    the whole hour/day, where Redis still has them
+    """
+    if not written:
+        return
+    schema_name = connection.schema_name
+    try:
+        pipe = pubsub.get_redis().pipeline(transaction=False)
+        for website_id, start in written:
+            pipe.pfcount(analytics.hll_key(schema_name, website_id, granularity, start.timestamp()))
+        estimates = pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Keeping lower-bound {granularity} visitor counts, Redis failed: {e}")
+        return
+    rows = [(website_id, start, count) for (website_id, start), count in zip(written, estimates) if count]
+    if not rows:
+        return
+    table = WebsiteTrafficRollup._meta.db_table
+    values = ', '.join(['(%s, %s::timestamptz, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {table} AS r SET visitors = GREATEST(r.visitors, v.visitors)
+            FROM (VALUES {values}) AS v (website_id, bucket_start, visitors)
+            WHERE r.website_id = v.website_id AND r.granularity = %s AND r.bucket_start = v.bucket_start
+        """, [value for row in rows for value in row] + [granularity])
+
+
+@transaction.atomic
+def rollup_traffic(now=None):
+    """
+    Rebuild the hour and day traffic rollups of every hour whose minute
+    buckets changed since the last run. Returns the number of rollup rows
+    written.
+    """
+    now = now or timezone.now()
+    watermark = _watermark(TRAFFIC)
+    # Flushes still committing during the previous run may carry an earlier
+    # updated_at, so look back LATENESS further
+    since = datetime.fromtimestamp(watermark.position, dt_timezone.utc) - LATENESS
+
+    minutes = WebsiteTrafficBucket._meta.db_table
+    changed = f"""
+        SELECT DISTINCT website_id, date_trunc('hour', bucket_start) AS hour
+        FROM {minutes} WHERE updated_at >= %s
+    """
+    hours = _rebuild('hour', f"""
+        SELECT m.website_id, date_trunc('hour', m.bucket_start) AS b, m.pageviews, m.visitors, m.referrers
+        FROM {minutes} m JOIN ({changed}) AS c ON c.website_id = m.website_id
+            AND m.bucket_start >= c.hour AND m.bucket_start < c.hour + interval '1 hour'
+    """, [since])
+    _update_visitors('hour', hours)
+
+    days = _rebuild('day', f"""
+        SELECT r.website_id, date_trunc('day', r.bucket_start) AS b, r.pageviews, r.visitors, r.referrers
+        FROM {WebsiteTrafficRollup._meta.db_table} r
+        JOIN (SELECT DISTINCT website_id, date_trunc('day', hour) AS day FROM ({changed}) AS c) AS d
+            ON d.website_id = r.website_id AND r.granularity = 'hour'
+            AND r.bucket_start >= d.day AND r.bucket_start < d.day + interval '1 day'
+    """, [since])
+    _update_visitors('day', days)
+
+    watermark.position = int(now.timestamp())
+    watermark.save()
+    return len(hours) + len(days)
+
+
+@transaction.atomic
+def rollup_opens():
+    """
+    Add tracker rows up to the end seen by the previous run into the open
+    buckets. Returns the size of the tracker id range rolled up.
+    """
+    watermark = _watermark(OPENS)
+    lower, upper = watermark.position, watermark.pending_position
+    buckets = PreviewEmailOpenBucket._meta.db_table
+    trackers = PreviewEmailTracker._meta.db_table
+    emails = PreviewEmail._meta.db_table
+    with connection.cursor() as cursor:
+        for chunk_start in range(lower, upper, OPENS_CHUNK):
+            chunk_end = min(chunk_start + OPENS_CHUNK, upper)
+            for granularity in GRANULARITY_SECONDS:
+                cursor.execute(f"""
+                    INSERT INTO {buckets} AS o (preview_email_id, website_id, granularity, bucket_start, opens)
+                    SELECT t.preview_email_id, e.website_id, '{granularity}', date_trunc('{granularity}', t.opened_at), COUNT(*)
+                    FROM {trackers} t JOIN {emails} e ON e.id = t.preview_email_id
+                    WHERE t.id > %s AND t.id <= %s
+                    GROUP BY 1, 2, 4
+                    ON CONFLICT (preview_email_id, granularity, bucket_start) DO UPDATE SET
+                        opens = o.opens + EXCLUDED.opens
+                """, [chunk_start, chunk_end])
+
+    watermark.position = max(upper, lower)
+    watermark.pending_position = PreviewEmailTracker.objects.aggregate(last=Max('id'))['last'] or 0
+    watermark.save()
+    return max(upper - lower, 0)
+
+
+def run(now=None):
+    return {'traffic': rollup_traffic(now), 'opens': rollup_opens()}
+
+
+def _range(granularity, start, end):
+    """
+    Validate a requested range; defaults to the last MAX_BUCKETS buckets
+    (at most 30 days)
+    """
+    if granularity not in GRANULARITY_SECONDS:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITY_SECONDS)}")
+    step = timedelta(seconds=GRANULARITY_SECONDS[granularity])
+    end = end or timezone.now()
+    start = start or end - min(step * MAX_BUCKETS, timedelta(days=30))
+    if start > end:
+        raise ValueError('start must be before end')
+    if (end - start) / step > MAX_BUCKETS:
+        raise ValueError(f'At most {MAX_BUCKETS} {granularity} buckets can be read at once')
+    return start, end
+
+
+def traffic_series(website_id, granularity='hour', start=None, end=None):
+    start, end = _range(granularity, start, end)
+    if granularity == 'minute':
+        queryset = WebsiteTrafficBucket.objects.filter(website_id=website_id)
+    else:
+        queryset = WebsiteTrafficRollup.objects.filter(website_id=website_id, granularity=granularity)
+    return list(
+        queryset
+        .filter(bucket_start__gte=start, bucket_start__lt=end)
+        .order_by('bucket_start')
+        .values('bucket_start', 'pageviews', 'visitors', 'referrers')
+    )
+
+
+def email_open_series(granularity='hour', start=None, end=None, preview_email_id=None, website_id=None):
+    """
+    Opens per bucket of one preview email, or of all of a website's preview
+    emails
+    """
+    start, end = _range(granularity, start, end)
+    queryset = PreviewEmailOpenBucket.objects.filter(
+        granularity=granularity, bucket_start__gte=start, bucket_start__lt=end,
+    )
+    if preview_email_id is not None:
+        queryset = queryset.filter(preview_email_id=preview_email_id)
+    else:
+        queryset = queryset.filter(website_id=website_id)
+    return list(
+        queryset
+        .values('bucket_start')
+        .annotate(opens=Sum('opens'))
+        .order_by('bucket_start')
+    )
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Website,
+    Page,
     WebsiteConfig,
     Template,
     PreviewEmail,
@@ -8,6 +9,54 @@ from .models import (
     BulkWebsiteCreator
 )
 
+def parse_fieldset(request, available):
+    """
+    Return the field names selected by ?fields=a,b and/or ?omit=c on a GET
+    request, or None when the request doesn't restrict fields.
+    Unknown names are ignored.
+    """
+    if request is None or request.method != 'GET':
+        return None
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if not fields and not omit:
+        return None
+    selected = set(available)
+    if fields:
+        selected &= {name.strip() for name in fields.split(',')}
+    if omit:
+        selected -= {name.strip() for name in omit.split(',')}
+    return selected
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin that drops fields not selected by ?fields= / ?omit=
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = parse_fieldset(self.context.get('request'), self.fields.keys())
+        if selected is not None:
+            for name in set(self.fields) - selected:
+                self.fields.pop(name)
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that first looks the object up in
+    context['prefetched'][model], filled by batch endpoints so validating
+    many items doesn't cost a query each
+    """
+
+    def to_internal_value(self, data):
+        prefetched = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if prefetched is not None:
+            try:
+                return prefetched[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
 class TemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Template
@@ -15,7 +64,7 @@ class TemplateSerializer(serializers.ModelSerializer):
 
 class WebsiteConfigSerializer(serializers.ModelSerializer):
     template = TemplateSerializer(read_only=True)
-    template_id = serializers.PrimaryKeyRelatedField(
+    template_id = PrefetchedPrimaryKeyRelatedField(
         queryset=Template.objects.all(),
         source='template',
         write_only=True
@@ -54,24 +103,34 @@ class WebsiteConfigSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_deployed_at']
 
+    # Flat model fields exposed again as the nested 'analytics' and 'cookies'
+    # objects, as (nested key, model field, default on write)
+    ANALYTICS_FIELDS = (
+        ('google_analytics_id', 'google_analytics_id', None),
+        ('google_tag_manager_id', 'google_tag_manager_id', None),
+        ('facebook_pixel_id', 'facebook_pixel_id', None),
+        ('custom_analytics_script', 'custom_analytics_script', None),
+    )
+    COOKIE_FIELDS = (
+        ('enabled', 'cookie_enabled', True),
+        ('banner_text', 'cookie_banner_text', 'We use cookies to enhance your experience.'),
+        ('accept_button_text', 'cookie_accept_button_text', 'Accept All'),
+        ('decline_button_text', 'cookie_decline_button_text', 'Decline All'),
+        ('cookie_policy_url', 'cookie_policy_url', None),
+        ('cookie_duration', 'cookie_duration', 365),
+        ('cookie_categories', 'cookie_categories', {
+            'necessary': True,
+            'analytics': True,
+            'marketing': True,
+            'preferences': True,
+        }),
+    )
+
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        # Convert cookie settings to the expected format
-        data['analytics'] = {
-            'google_analytics_id': instance.google_analytics_id,
-            'google_tag_manager_id': instance.google_tag_manager_id,
-            'facebook_pixel_id': instance.facebook_pixel_id,
-            'custom_analytics_script': instance.custom_analytics_script,
-        }
-        data['cookies'] = {
-            'enabled': instance.cookie_enabled,
-            'banner_text': instance.cookie_banner_text,
-            'accept_button_text': instance.cookie_accept_button_text,
-            'decline_button_text': instance.cookie_decline_button_text,
-            'cookie_policy_url': instance.cookie_policy_url,
-            'cookie_duration': instance.cookie_duration,
-            'cookie_categories': instance.cookie_categories,
-        }
+        # Reuse the already serialized flat values instead of re-reading the instance
+        data['analytics'] = {key: data[field] for key, field, _ in self.ANALYTICS_FIELDS}
+        data['cookies'] = {key: data[field] for key, field, _ in self.COOKIE_FIELDS}
         return data
 
     def to_internal_value(self, data):
@@ -79,36 +138,47 @@ class WebsiteConfigSerializer(serializers.ModelSerializer):
         if 'analytics' in data:
             analytics = data.pop('analytics')
             data.update({
-                'google_analytics_id': analytics.get('google_analytics_id'),
-                'google_tag_manager_id': analytics.get('google_tag_manager_id'),
-                'facebook_pixel_id': analytics.get('facebook_pixel_id'),
-                'custom_analytics_script': analytics.get('custom_analytics_script'),
+                field: analytics.get(key, default)
+                for key, field, default in self.ANALYTICS_FIELDS
             })
 
         if 'cookies' in data:
             cookies = data.pop('cookies')
             data.update({
-                'cookie_enabled': cookies.get('enabled', True),
-                'cookie_banner_text': cookies.get('banner_text', 'We use cookies to enhance your experience.'),
-                'cookie_accept_button_text': cookies.get('accept_button_text', 'Accept All'),
-                'cookie_decline_button_text': cookies.get('decline_button_text', 'Decline All'),
-                'cookie_policy_url': cookies.get('cookie_policy_url'),
-                'cookie_duration': cookies.get('cookie_duration', 365),
-                'cookie_categories': cookies.get('cookie_categories', {
-                    'necessary': True,
-                    'analytics': True,
-                    'marketing': True,
-                    'preferences': True,
-                }),
+                field: cookies.get(key, default)
+                for key, field, default in self.COOKIE_FIELDS
             })
 
         return super().to_internal_value(data)
 
-class WebsiteSerializer(serializers.ModelSerializer):
+class WebsiteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+
     class Meta:
         model = Website
         fields = '__all__'
 
+class PageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Page
+        fields = ('id', 'title', 'slug', 'content', 'updated_at')
+
+class PublishedWebsiteSerializer(serializers.ModelSerializer):
+    """
+    Public payload of a published website, cached by websites.render_cache.
+    Expects published pages prefetched into ``published_pages``.
+    """
+    pages = PageSerializer(many=True, source='published_pages')
+
+    class Meta:
+        model = Website
+        fields = (
+            'id', 'name', 'slug', 'template', 'content', 'settings',
+            'meta_title', 'meta_description', 'meta_keywords',
+            'facebook_url', 'twitter_url', 'instagram_url', 'linkedin_url',
+            'analytics', 'cookies', 'updated_at', 'pages',
+        )
+
 class PreviewEmailSerializer(serializers.ModelSerializer):
     class Meta:
         model = PreviewEmail
@@ -118,8 +188,14 @@ class PreviewEmailTrackerSerializer(serializers.ModelSerializer):
     class Meta:
         model = PreviewEmailTracker
         fields = '__all__'
+        read_only_fields = ('opened_at',)
 
 class BulkWebsiteCreatorSerializer(serializers.ModelSerializer):
     class Meta:
         model = BulkWebsiteCreator
-        fields = '__all__' 
\ No newline at end of file
+        fields = '__all__'
+        # Maintained by websites.bulk while the job is processed
+        read_only_fields = (
+            'status', 'started_at', 'completed_at', 'error_message',
+            'processed_count', 'created_count', 'failed_count', 'item_errors',
+        ) 
\ No newline at end of file
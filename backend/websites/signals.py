@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import documents, render_cache
+from .models import Page, Website
+
+
+@receiver(post_save, sender=Website)
+@receiver(post_delete, sender=Website)
+def refresh_rendered_website(sender, instance, **kwargs):
+    """
+    Write the new published payload to the render cache once committed
+    """
+    render_cache.refresh_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Website)
+def reload_live_document(sender, instance, **kwargs):
+    """
+    Bring editors' live document up to date with changes made outside it
+    """
+    documents.reload_on_commit(instance.pk, instance)
+
+
+@receiver(post_delete, sender=Website)
+def drop_live_document(sender, instance, **kwargs):
+    documents.reload_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Page)
+@receiver(post_delete, sender=Page)
+def refresh_rendered_website_for_page(sender, instance, **kwargs):
+    """
+    Pages are part of their website's payload
+    """
+    render_cache.refresh_on_commit(instance.website_id)
@@ -1,3 +1,413 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django_tenants.test.cases import TenantTestCase
+from django_tenants.test.client import TenantClient
+
+from . import analytics, documents, rollups, tracking
+from .admin import BulkWebsiteCreatorAdmin
+from .models import (
+    BulkWebsiteCreator, PreviewEmail, PreviewEmailTracker, Template, Website, WebsiteConfig, WebsiteTrafficBucket,
+)
+from .tracking import write_batch
+
+
+class QueryBudgetTestCase(TenantTestCase):
+    """
+    Base class for asserting that list endpoints run a fixed number of
+    queries no matter how many rows end up on the page.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = TenantClient(self.tenant)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url, grow):
+        """
+        Call ``grow()`` between requests to add rows and check that the
+        query count of ``url`` doesn't change
+        """
+        baseline = self.count_queries(url)
+        grow()
+        self.assertEqual(self.count_queries(url), baseline)
+
+
+class WebsiteConfigListQueryTests(QueryBudgetTestCase):
+    url = '/public/api/website-configs/'
+
+    def create_configs(self, count, offset=0):
+        for i in range(offset, offset + count):
+            template = Template.objects.create(
+                name=f'Template {i}',
+                description='',
+                thumbnail_url='https://example.com/thumb.png',
+                preview_url='https://example.com/preview',
+                category='Business',
+            )
+            WebsiteConfig.objects.create(
+                template=template,
+                company_name=f'Company {i}',
+                domain_name=f'company{i}.example.com',
+            )
+
+    def test_list_query_count_independent_of_page_size(self):
+        self.create_configs(1)
+        self.assertConstantQueries(self.url, lambda: self.create_configs(9, offset=1))
+
+    def test_list_includes_nested_template(self):
+        self.create_configs(2)
+        response = self.client.get(self.url)
+        for row in response.json()['results']:
+            self.assertIn('name', row['template'])
+            self.assertEqual(row['analytics']['google_analytics_id'], None)
+            self.assertEqual(row['cookies']['enabled'], True)
+
+
+class PublishedWebsiteRenderCacheTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = TenantClient(self.tenant)
+        self.website = Website.objects.create(
+            tenant=self.tenant, name='Acme', slug='acme', template='default', is_published=True,
+        )
+        self.url = f'/public/api/websites/{self.website.pk}/published/'
+
+    def test_serves_cached_payload_with_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Acme')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_writes_through(self):
+        first = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.website.name = 'Acme Inc'
+            self.website.save()
+        second = self.client.get(self.url)
+        self.assertEqual(second.json()['name'], 'Acme Inc')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_unpublished_website_is_not_found(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.website.is_published = False
+            self.website.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class WebsiteConfigBulkWriteTests(TenantTestCase):
+    url = '/public/api/website-configs/bulk/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = TenantClient(self.tenant)
+        self.template = Template.objects.create(
+            name='Template', description='', thumbnail_url='https://example.com/t.png',
+            preview_url='https://example.com/p', category='Business',
+        )
+        self.config = WebsiteConfig.objects.create(
+            template=self.template, company_name='Old', domain_name='old.example.com',
+        )
+
+    def post(self, items, **headers):
+        return self.client.post(self.url, items, content_type='application/json', **headers)
+
+    def test_mixed_creates_updates_and_errors(self):
+        response = self.post([
+            {'template_id': self.template.pk, 'company_name': 'A', 'domain_name': 'a.example.com'},
+            {'id': self.config.pk, 'color_scheme': '#ff0000'},
+            {'template_id': self.template.pk, 'company_name': 'B', 'domain_name': 'a.example.com'},
+            {'id': 999999, 'color_scheme': '#00ff00'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['created', 'updated', 'error', 'error'])
+        self.config.refresh_from_db()
+        self.assertEqual(self.config.color_scheme, '#ff0000')
+        self.assertTrue(WebsiteConfig.objects.filter(domain_name='a.example.com').exists())
+
+    def test_batch_updates_invalidate_cached_querysets(self):
+        self.client.get('/public/api/website-configs/')
+        with mock.patch('websites.views_public.invalidate_obj') as invalidate_obj, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.post([{'id': self.config.pk, 'company_name': 'New'}])
+        self.assertEqual(response.status_code, 200)
+        # The row as it was and as it is now
+        self.assertEqual(
+            [(call.args[0].pk, call.args[0].company_name) for call in invalidate_obj.call_args_list],
+            [(self.config.pk, 'Old'), (self.config.pk, 'New')],
+        )
+        listed = self.client.get('/public/api/website-configs/').json()['results']
+        self.assertEqual([config['company_name'] for config in listed], ['New'])
+
+    def test_idempotency_key_replays_response(self):
+        items = [{'template_id': self.template.pk, 'company_name': 'C', 'domain_name': 'c.example.com'}]
+        first = self.post(items, HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = self.post(items, HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(WebsiteConfig.objects.filter(domain_name='c.example.com').count(), 1)
+
+
+class BulkJobRequeueTests(TenantTestCase):
+    def test_requeue_invalidates_the_requeued_jobs(self):
+        template = Template.objects.create(
+            name='Template', description='', thumbnail_url='https://example.com/t.png',
+            preview_url='https://example.com/p', category='Business',
+        )
+        user = get_user_model().objects.create_user('admin', password='x')
+        failed, done = [
+            BulkWebsiteCreator.objects.create(
+                user=user, template=template, company_names=[], domain_names=[], status=status,
+            )
+            for status in ('failed', 'completed')
+        ]
+        model_admin = BulkWebsiteCreatorAdmin(BulkWebsiteCreator, site)
+        with mock.patch('cacheops.query.invalidate_obj') as invalidate_obj, \
+                mock.patch.object(model_admin, 'message_user'):
+            model_admin.requeue(None, BulkWebsiteCreator.objects.all())
+        self.assertEqual(
+            [(call.args[0].pk, call.args[0].status) for call in invalidate_obj.call_args_list],
+            [(failed.pk, 'failed'), (failed.pk, 'pending')],
+        )
+
+
+class TenantScopingTests(TenantTestCase):
+    def test_for_tenant_filters_on_the_local_column(self):
+        sql = str(Website.objects.for_tenant(self.tenant).query)
+        self.assertIn('"websites_website"."tenant_id" =', sql)
+        self.assertNotIn('tenants_tenant', sql)
+
+    def test_models_without_a_tenant_key_rely_on_the_schema(self):
+        queryset = WebsiteConfig.objects.all()
+        self.assertIs(queryset.for_tenant(self.tenant), queryset)
+
+    def test_public_api_lists_filter_on_the_local_column(self):
+        client = TenantClient(self.tenant)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get('/public/api/websites/').status_code, 200)
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertIn('"websites_website"."tenant_id" =', sql)
+        self.assertNotIn('tenants_tenant', sql)
+
+
+class EmailOpenBatchTests(TenantTestCase):
+    def test_batch_inserts_trackers_and_stamps_first_open(self):
+        website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business')
+        email = PreviewEmail.objects.create(website=website, recipient_email='a@example.com',
+                                            preview_url='https://example.com')
+        first = timezone.now() - timedelta(minutes=5)
+        events = [
+            {'id': email.pk, 'at': (first + timedelta(minutes=1)).isoformat(), 'ip': None, 'ua': 'x'},
+            {'id': email.pk, 'at': first.isoformat(), 'ip': '10.0.0.1', 'ua': 'y'},
+            {'id': email.pk + 1000, 'at': first.isoformat(), 'ip': None, 'ua': None},
+        ]
+        self.assertEqual(write_batch(self.tenant.schema_name, events), 2)
+        email.refresh_from_db()
+        self.assertEqual(email.opened_at, first)
+        self.assertEqual(PreviewEmailTracker.objects.filter(preview_email=email).count(), 2)
+
+    def test_stamping_first_opens_invalidates_only_those_emails(self):
+        website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business')
+        opened, other = [
+            PreviewEmail.objects.create(website=website, recipient_email=f'{name}@example.com',
+                                        preview_url='https://example.com')
+            for name in ('a', 'b')
+        ]
+        events = [{'id': opened.pk, 'at': timezone.now().isoformat(), 'ip': None, 'ua': None}]
+        with mock.patch('cacheops.query.invalidate_obj') as invalidate_obj, \
+                mock.patch('cacheops.invalidation.redis_client') as redis_client:
+            write_batch(self.tenant.schema_name, events)
+        # The email before and after the update
+        invalidated = [call.args[0] for call in invalidate_obj.call_args_list]
+        self.assertEqual([email.pk for email in invalidated], [opened.pk, opened.pk])
+        self.assertIsNotNone(invalidated[-1].opened_at)
+        redis_client.keys.assert_not_called()
+
+    def flush(self, *events):
+        raw = [json.dumps(dict({'id': 1, 'at': timezone.now().isoformat(), 'ip': None, 'ua': None}, **event))
+               for event in events]
+        with mock.patch.object(tracking, 'pop_batch', return_value=raw), \
+                mock.patch.object(tracking, 'requeue') as requeue, \
+                mock.patch.object(tracking, 'dead_letter') as dead_letter:
+            consumed = tracking.flush()
+        return consumed, requeue, dead_letter
+
+    def test_events_of_missing_schemas_are_dropped(self):
+        consumed, requeue, dead_letter = self.flush({'schema': 'dropped_tenant'})
+        self.assertEqual(consumed, 1)
+        requeue.assert_not_called()
+        dead_letter.assert_not_called()
+
+    def test_failing_events_are_retried_then_dead_lettered(self):
+        schema_name = self.tenant.schema_name
+        with mock.patch.object(tracking, 'write_batch', side_effect=OperationalError):
+            consumed, requeue, dead_letter = self.flush(
+                {'schema': schema_name},
+                {'schema': schema_name, 'attempts': tracking.MAX_ATTEMPTS - 1},
+            )
+        self.assertEqual(consumed, 1)
+        self.assertEqual([json.loads(e)['attempts'] for e in requeue.call_args[0][0]], [1])
+        self.assertEqual([json.loads(e)['attempts'] for e in dead_letter.call_args[0][0]], [tracking.MAX_ATTEMPTS])
+
+
+class TrafficBucketUpsertTests(TenantTestCase):
+    def test_flushes_add_up_in_one_row(self):
+        website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business')
+        now = 1_700_000_030
+        for referrer in ('https://google.com/a', 'https://google.com/b', None):
+            aggregator = analytics.Aggregator()
+            aggregator.add(self.tenant.schema_name, website.pk, 'v1', referrer, now)
+            buckets = aggregator.swap()[self.tenant.schema_name]
+            analytics.write_buckets(buckets, {key: 1 for key in buckets})
+
+        bucket = WebsiteTrafficBucket.objects.get(website=website)
+        self.assertEqual(bucket.pageviews, 3)
+        self.assertEqual(bucket.visitors, 1)
+        self.assertEqual(bucket.referrers, {'google.com': 2, analytics.DIRECT: 1})
+        self.assertEqual(bucket.bucket_start.timestamp(), now // 60 * 60)
+
+
+class ReferrerHostTests(SimpleTestCase):
+    def test_malformed_referrers_are_counted_as_other(self):
+        aggregator = analytics.Aggregator()
+        with mock.patch.object(analytics, 'aggregator', aggregator):
+            counted = analytics.ingest('tenant', 1, {'events': [
+                {'referrer': 'http://[x'},
+                {'referrer': 'https://example.com/page'},
+                {},
+            ]}, now=0)
+        self.assertEqual(counted, 3)
+        [bucket] = aggregator._buckets.values()
+        self.assertEqual(
+            dict(bucket.referrers),
+            {analytics.OTHER: 1, 'example.com': 1, analytics.DIRECT: 1},
+        )
+
+
+class AggregatorRestoreTests(SimpleTestCase):
+    def failed_flush(self, aggregator):
+        for schema_name, buckets in aggregator.swap().items():
+            return aggregator.restore(schema_name, buckets)
+
+    def test_counters_are_dropped_after_repeated_failures(self):
+        aggregator = analytics.Aggregator()
+        aggregator.add('tenant', 1, 'v1', None, 0)
+        for _ in range(analytics.MAX_FLUSH_ATTEMPTS - 1):
+            self.assertEqual(self.failed_flush(aggregator), 0)
+        self.assertEqual(self.failed_flush(aggregator), 1)
+        self.assertEqual(len(aggregator), 0)
+
+    def test_oldest_counters_go_past_the_cap(self):
+        aggregator = analytics.Aggregator()
+        with mock.patch.object(analytics, 'MAX_PENDING_BUCKETS', 2):
+            for minute in range(3):
+                aggregator.add('tenant', 1, 'v1', None, minute * 60)
+            self.assertEqual(self.failed_flush(aggregator), 1)
+        self.assertEqual(sorted(start for _, _, start in aggregator._buckets), [60, 120])
+
+
+class EmailOpenRollupTests(TenantTestCase):
+    def test_rollup_counts_new_trackers_once(self):
+        website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business')
+        email = PreviewEmail.objects.create(website=website, recipient_email='a@example.com',
+                                            preview_url='https://example.com')
+        PreviewEmailTracker.objects.bulk_create([PreviewEmailTracker(preview_email=email) for _ in range(3)])
+
+        # The first run only records where the trackers end
+        self.assertEqual(rollups.rollup_opens(), 0)
+        self.assertGreater(rollups.rollup_opens(), 0)
+        self.assertEqual(rollups.rollup_opens(), 0)
+
+        series = rollups.email_open_series('day', preview_email_id=email.pk)
+        self.assertEqual([bucket['opens'] for bucket in series], [3])
+
+
+class DocumentPatchTests(SimpleTestCase):
+    def test_patch_is_minimal_and_round_trips(self):
+        old = {'content': {'title': 'A', 'blocks': [1, 2], 'hero': {'image': 'x'}}, 'settings': {}}
+        new = {'content': {'title': 'B', 'blocks': [1, 2]}, 'settings': {'theme': 'dark'}}
+
+        patch = documents.make_patch(old, new)
+        self.assertEqual(patch, {'content': {'title': 'B', 'hero': None}, 'settings': {'theme': 'dark'}})
+        self.assertEqual(documents.merge_patch(old, patch), new)
+        self.assertIsNone(documents.make_patch(new, new))
+
+    def test_nulls_in_whole_objects_dont_become_deletions(self):
+        old = {'content': {'title': 'A', 'subtitle': 'B'}}
+        new = {'content': documents.strip_nulls({'title': 'A', 'subtitle': 'B', 'hero': None, 'seo': {'tag': None}})}
+
+        patch = documents.make_patch(old, new)
+        self.assertEqual(patch, {'content': {'seo': {}}})
+        self.assertEqual(documents.merge_patch(old, patch), new)
+
+
+class DocumentPersistTests(TenantTestCase):
+    def setUp(self):
+        super().setUp()
+        self.website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business',
+                                              content={'title': 'REST'})
+        self.redis = mock.patch.object(documents.pubsub, 'get_redis').start().return_value
+        self.reload = mock.patch.object(documents, 'reload').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def persist(self, version):
+        state = json.dumps({'content': {'title': 'Live'}, 'settings': {}})
+        self.redis.hmget.return_value = (state.encode(), version.encode())
+        documents.persist(self.tenant.schema_name, self.website.pk)
+        self.website.refresh_from_db()
+
+    def test_persists_documents_loaded_from_the_current_row(self):
+        self.persist(documents.row_version(self.website))
+        self.assertEqual(self.website.content, {'title': 'Live'})
+        self.redis.hset.assert_called_once_with(
+            documents.document_key(self.tenant.schema_name, self.website.pk),
+            'row_version', documents.row_version(self.website),
+        )
+
+    def test_rows_changed_outside_live_editing_win(self):
+        self.persist('2000-01-01T00:00:00+00:00')
+        self.assertEqual(self.website.content, {'title': 'REST'})
+        self.reload.assert_called_once()
+
+
+class TrafficRollupTests(TenantTestCase):
+    def write_minute(self, website, at):
+        aggregator = analytics.Aggregator()
+        aggregator.add(self.tenant.schema_name, website.pk, 'v1', None, at.timestamp())
+        buckets = aggregator.swap()[self.tenant.schema_name]
+        analytics.write_buckets(buckets, {key: 1 for key in buckets})
+
+    def test_late_minutes_are_rolled_into_past_hours(self):
+        website = Website.objects.create(tenant=self.tenant, name='Site', slug='site', template='business')
+        hour = (timezone.now() - timedelta(hours=3)).replace(minute=0, second=0, microsecond=0)
+        self.write_minute(website, hour + timedelta(minutes=5))
+        rollups.rollup_traffic()
+
+        # Re-flushed long after the hour ended
+        self.write_minute(website, hour + timedelta(minutes=6))
+        rollups.rollup_traffic()
+
+        series = rollups.traffic_series(website.pk, 'hour', start=hour, end=hour + timedelta(hours=1))
+        self.assertEqual([bucket['pageviews'] for bucket in series], [2])
+        day = rollups.traffic_series(website.pk, 'day', start=hour - timedelta(days=1), end=hour + timedelta(days=1))
+        self.assertEqual(sum(bucket['pageviews'] for bucket in day), 2)
+
+    def test_series_of_unknown_objects_are_not_found(self):
+        client = TenantClient(self.tenant)
+        self.assertEqual(client.get('/public/api/websites/999999/traffic/').status_code, 404)
+        self.assertEqual(client.get('/public/api/preview-emails/999999/opens/').status_code, 404)
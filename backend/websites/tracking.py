@@ -0,0 +1,255 @@
+"""
+Buffered ingestion of preview email opens.
+
+The tracking pixel only appends an event to a Redis list (or, while Redis
+is unreachable, to an in-process buffer) and returns a prebuilt GIF. A
+flusher thread in each process drains the buffer every FLUSH_INTERVAL
+seconds and writes each batch per schema with one bulk INSERT of
+PreviewEmailTracker rows and one UPDATE setting PreviewEmail.opened_at.
+Workers pop disjoint events, so any number of them can flush at once.
+
+Events of a schema whose tables don't exist (a dropped tenant) are dropped.
+A batch that fails for another database error is put back and retried up
+to MAX_ATTEMPTS times, then moved to a capped dead-letter list that
+``flush_email_opens --requeue-dead`` puts back once the cause is fixed.
+"""
+
+import atexit
+import base64
+import json
+import logging
+import os
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError, ProgrammingError, close_old_connections, connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django_tenants.utils import schema_context
+from redis.exceptions import RedisError
+
+from website_builder import pubsub
+from .models import PreviewEmail, PreviewEmailTracker
+
+logger = logging.getLogger(__name__)
+
+_config = getattr(settings, 'EMAIL_OPEN_TRACKING', {})
+FLUSH_INTERVAL = _config.get('FLUSH_INTERVAL', 1.0)
+BATCH_SIZE = _config.get('BATCH_SIZE', 5000)
+# Events kept in memory while Redis is down; the oldest are dropped past this
+MEMORY_LIMIT = _config.get('MEMORY_LIMIT', 100_000)
+# Failed writes of an event before it is dead-lettered
+MAX_ATTEMPTS = _config.get('MAX_ATTEMPTS', 60)
+DEAD_LETTER_LIMIT = _config.get('DEAD_LETTER_LIMIT', 100_000)
+
+BUFFER_KEY = 'tracking:email-opens'
+DEAD_LETTER_KEY = 'tracking:email-opens:dead'
+
+# Transparent 1x1 GIF
+PIXEL = base64.b64decode('R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+_memory = deque(maxlen=MEMORY_LIMIT)
+_lock = threading.Lock()
+_flusher = None
+_flusher_pid = None
+
+
+def record_open(preview_email_id, opened_at, ip_address=None, user_agent=None):
+    """
+    Buffer an open of a preview email in the current schema
+    """
+    event = json.dumps({
+        'schema': connection.schema_name,
+        'id': preview_email_id,
+        'at': opened_at.isoformat(),
+        'ip': ip_address,
+        'ua': user_agent,
+    })
+    ensure_flusher()
+    try:
+        pubsub.get_redis().rpush(BUFFER_KEY, event)
+    except RedisError as e:
+        logger.warning(f"Buffering email open in memory, Redis failed: {e}")
+        _memory.append(event)
+
+
+def pop_batch(size=BATCH_SIZE):
+    """
+    Take up to ``size`` buffered events, in-memory ones first
+    """
+    events = []
+    while _memory and len(events) < size:
+        try:
+            events.append(_memory.popleft())
+        except IndexError:
+            break
+    if len(events) < size:
+        try:
+            events.extend(pubsub.get_redis().lpop(BUFFER_KEY, size - len(events)) or ())
+        except RedisError as e:
+            logger.warning(f"Could not read buffered email opens: {e}")
+    return events
+
+
+def requeue(events):
+    try:
+        pubsub.get_redis().rpush(BUFFER_KEY, *events)
+    except RedisError:
+        _memory.extend(events)
+
+
+def dead_letter(events):
+    try:
+        pipe = pubsub.get_redis().pipeline()
+        pipe.rpush(DEAD_LETTER_KEY, *events)
+        pipe.ltrim(DEAD_LETTER_KEY, -DEAD_LETTER_LIMIT, -1)
+        pipe.execute()
+    except RedisError as e:
+        logger.error(f"Dropping {len(events)} email opens, Redis failed: {e}")
+
+
+def requeue_dead_letters():
+    """
+    Move dead-lettered events back into the buffer with fresh attempts.
+    Returns how many were moved.
+    """
+    moved = 0
+    client = pubsub.get_redis()
+    while True:
+        raw = client.lpop(DEAD_LETTER_KEY, BATCH_SIZE)
+        if not raw:
+            return moved
+        events = []
+        for item in raw:
+            event = json.loads(item)
+            event.pop('attempts', None)
+            events.append(json.dumps(event))
+        client.rpush(BUFFER_KEY, *events)
+        moved += len(events)
+
+
+def write_batch(schema_name, events):
+    """
+    Store the opens of one schema: one INSERT of tracker rows and one UPDATE
+    stamping the first open on each email that had none
+    """
+    with schema_context(schema_name), transaction.atomic():
+        existing = set(
+            PreviewEmail.objects
+            .filter(pk__in={event['id'] for event in events})
+            .values_list('pk', flat=True)
+        )
+        trackers, first_open = [], {}
+        for event in events:
+            if event['id'] not in existing:
+                continue
+            opened_at = datetime.fromisoformat(event['at'])
+            trackers.append(PreviewEmailTracker(
+                preview_email_id=event['id'],
+                opened_at=opened_at,
+                ip_address=event['ip'],
+                user_agent=event['ua'],
+            ))
+            if event['id'] not in first_open or opened_at < first_open[event['id']]:
+                first_open[event['id']] = opened_at
+
+        PreviewEmailTracker.objects.bulk_create(trackers, batch_size=BATCH_SIZE)
+        if first_open:
+            # QuerySet.update() bypasses cacheops; invalidated_update() drops
+            # the cached queries of just these emails once this commits
+            PreviewEmail.objects.filter(pk__in=first_open, opened_at__isnull=True).invalidated_update(
+                opened_at=Case(
+                    *[When(pk=pk, then=Value(at)) for pk, at in first_open.items()],
+                    output_field=DateTimeField(),
+                )
+            )
+    return len(trackers)
+
+
+def flush(size=BATCH_SIZE):
+    """
+    Write one batch of buffered opens. Returns the number of events
+    consumed, not counting any put back after a database error.
+    """
+    raw = pop_batch(size)
+    consumed = len(raw)
+    by_schema = defaultdict(list)
+    for item in raw:
+        try:
+            event = json.loads(item)
+        except (TypeError, ValueError):
+            logger.warning("Dropping malformed email open event")
+            continue
+        by_schema[event['schema']].append(event)
+
+    for schema_name, events in by_schema.items():
+        try:
+            write_batch(schema_name, events)
+        except ProgrammingError as e:
+            # Missing tables: the schema was dropped or isn't a tenant schema
+            logger.error(f"Dropping {len(events)} email opens of {schema_name}: {e}")
+        except DatabaseError:
+            retry, dead = [], []
+            for event in events:
+                event['attempts'] = event.get('attempts', 0) + 1
+                (retry if event['attempts'] < MAX_ATTEMPTS else dead).append(json.dumps(event))
+            logger.exception(
+                f"Writing {len(events)} email opens in {schema_name} failed, "
+                f"requeueing {len(retry)} and dead-lettering {len(dead)}"
+            )
+            if retry:
+                requeue(retry)
+                consumed -= len(retry)
+            if dead:
+                dead_letter(dead)
+    return consumed
+
+
+def drain():
+    """
+    Flush until the buffer is empty or writes fail. Returns the number of
+    events consumed.
+    """
+    total = 0
+    while True:
+        taken = flush()
+        total += taken
+        if taken < BATCH_SIZE:
+            return total
+
+
+def _run():
+    wake = threading.Event()
+    while True:
+        wake.wait(FLUSH_INTERVAL)
+        close_old_connections()
+        try:
+            drain()
+        except Exception:
+            logger.exception("Flushing email opens failed")
+        finally:
+            close_old_connections()
+
+
+def ensure_flusher():
+    """
+    Start the flusher thread for this process if it isn't running yet
+    """
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid and _flusher.is_alive():
+        return
+    with _lock:
+        if _flusher_pid == pid and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(target=_run, name='email-open-flusher', daemon=True)
+        _flusher_pid = pid
+        _flusher.start()
+
+
+@atexit.register
+def _flush_memory_on_exit():
+    # Redis-buffered events survive the process; in-memory ones don't
+    if _memory:
+        requeue(list(_memory))
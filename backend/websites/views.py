@@ -1,121 +1,207 @@
 from django.shortcuts import render
 from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
+from .managers import tenant_field
 from .models import Website, WebsiteConfig, Template
 from .serializers import WebsiteSerializer, WebsiteConfigSerializer, TemplateSerializer
 from django.views.generic import View
-from django.http import FileResponse, HttpResponse
-import os
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.db import connection
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.core.exceptions import SuspiciousFileOperation
 from django.conf import settings
+from .frontend import (
+    ENCODING_SUFFIXES,
+    RangeFile,
+    asset_manifest,
+    choose_encoding,
+    index_document,
+    parse_range,
+)
+from . import export
+import mimetypes
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Create your views here.
 
-class WebsiteViewSet(viewsets.ModelViewSet):
-    serializer_class = WebsiteSerializer
-    permission_classes = [IsAuthenticated]
-    
+class TenantScopedViewSetMixin:
+    """
+    Limit a viewset to request.tenant with the model's for_tenant(), and
+    attach new rows to it
+    """
+
     def get_queryset(self):
-        # Filter websites based on tenant
-        return Website.objects.filter(tenant__schema_name=self.request.tenant.schema_name)
-    
+        return super().get_queryset().for_tenant(self.request.tenant)
+
     def perform_create(self, serializer):
-        serializer.save(tenant=self.request.tenant)
+        field = tenant_field(serializer.Meta.model)
+        if field is None:
+            serializer.save()
+        else:
+            serializer.save(**{field: self.request.tenant})
+
+class WebsiteViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
+    queryset = Website.objects.all()
+    serializer_class = WebsiteSerializer
+    permission_classes = [IsAuthenticated]
+
+class ExportView(APIView):
+    """
+    Stream every row of a table as NDJSON (default) or CSV.
+
+    ?output=ndjson|csv, ?compress=gzip, ?tenant=<id or schema>,
+    ?deployment_status=<status>
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, kind):
+        model = export.EXPORTS.get(kind)
+        if model is None:
+            raise NotFound(f"Unknown export '{kind}'")
+        output = request.query_params.get('output', 'ndjson')
+        if output not in export.FORMATS:
+            raise ValidationError({'output': f"Choose one of {', '.join(export.FORMATS)}"})
+        compress = request.query_params.get('compress') == 'gzip'
+        try:
+            queryset = export.export_queryset(
+                model,
+                tenant=request.query_params.get('tenant'),
+                deployment_status=request.query_params.get('deployment_status'),
+            )
+        except ValueError as e:
+            raise ValidationError({'tenant': str(e)})
+
+        filename = f"{kind}-{connection.schema_name}-{timezone.now():%Y%m%d%H%M%S}.{output}"
+        if compress:
+            filename += '.gz'
+        response = StreamingHttpResponse(
+            export.stream(queryset, output, compress),
+            content_type='application/gzip' if compress else export.FORMATS[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+        return response
 
 class FrontendAppView(View):
     def get(self, request, *args, **kwargs):
         try:
-            # Get the absolute path to index.html
-            index_file = settings.FRONTEND_INDEX
-            logger.info("=" * 50)
-            logger.info("FrontendAppView - GET request received")
-            logger.info(f"Request path: {request.path}")
-            logger.info(f"Request method: {request.method}")
-            logger.info(f"Request headers: {dict(request.headers)}")
-            logger.info(f"Request GET params: {request.GET}")
-            logger.info(f"Request POST params: {request.POST}")
-            logger.info(f"Request tenant: {getattr(request, 'tenant', None)}")
-            logger.info(f"Request schema_name: {getattr(request, 'schema_name', None)}")
-            logger.info(f"Attempting to serve frontend from: {index_file}")
-            logger.info(f"File exists: {os.path.exists(index_file)}")
-            logger.info(f"Current working directory: {os.getcwd()}")
-            logger.info(f"BASE_DIR: {settings.BASE_DIR}")
-            logger.info(f"FRONTEND_DIR: {settings.FRONTEND_DIR}")
-            logger.info(f"FRONTEND_INDEX: {settings.FRONTEND_INDEX}")
-            logger.info("=" * 50)
-            
-            # Check if file exists
-            if not os.path.exists(index_file):
-                logger.error(f"Frontend file not found at: {index_file}")
-                return HttpResponse(f"Frontend files not found at {index_file}", status=404)
-            
-            # Read and return the file
-            with open(index_file, 'rb') as f:
-                content = f.read()
-                logger.info(f"Successfully read {len(content)} bytes from index.html")
-                
-                try:
-                    # Replace asset paths to include /frontend_static/assets/ prefix
-                    content = content.decode('utf-8')
-                    logger.info("Successfully decoded content")
-                    
-                    # Log the content before replacement
-                    logger.info("Content before replacement:")
-                    logger.info(content[:500])  # Log first 500 chars
-                    
-                    # Update asset paths
-                    content = content.replace('src="./assets/', 'src="/frontend_static/assets/')
-                    content = content.replace('href="./assets/', 'href="/frontend_static/assets/')
-                    content = content.replace('href="/vite.svg"', 'href="/frontend_static/vite.svg"')
-                    content = content.replace('content="/og-image.png"', 'content="/frontend_static/og-image.png"')
-                    
-                    # Add base tag for client-side routing
-                    content = content.replace('<head>', '<head><base href="/">')
-                    
-                    # Log the content after replacement
-                    logger.info("Content after replacement:")
-                    logger.info(content[:500])  # Log first 500 chars
-                    
-                    response = HttpResponse(content, content_type='text/html')
-                    
-                    # Add CORS headers
-                    response["Access-Control-Allow-Origin"] = "*"
-                    response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
-                    response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-                    response["Access-Control-Allow-Credentials"] = "true"
-                    
-                    # Add cache control headers
-                    response["Cache-Control"] = "no-cache, no-store, must-revalidate"
-                    response["Pragma"] = "no-cache"
-                    response["Expires"] = "0"
-                    
-                    logger.info("Successfully created response with frontend content")
-                    return response
-                    
-                except Exception as e:
-                    logger.error("Error processing content:")
-                    logger.error(f"Error type: {type(e)}")
-                    logger.error(f"Error message: {str(e)}")
-                    logger.error("Content that caused error:")
-                    logger.error(content[:1000])  # Log first 1000 chars
-                    raise
-                
+            try:
+                document = index_document.get()
+            except FileNotFoundError:
+                logger.error(f"Frontend file not found at: {settings.FRONTEND_INDEX}")
+                return HttpResponse(f"Frontend files not found at {settings.FRONTEND_INDEX}", status=404)
+
+            encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), document.variants)
+            representation = document.variants[encoding]
+
+            if representation.etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(representation.body, content_type='text/html; charset=utf-8')
+                if encoding:
+                    response["Content-Encoding"] = encoding
+
+            response["ETag"] = representation.etag
+            response["Vary"] = "Accept-Encoding"
+            # Always revalidate the shell; unchanged copies come back as 304
+            response["Cache-Control"] = "no-cache"
+            self._add_cors_headers(response)
+            return response
+
         except Exception as e:
-            logger.error("=" * 50)
-            logger.error("Error in FrontendAppView")
-            logger.error(f"Error type: {type(e)}")
-            logger.error(f"Error message: {str(e)}")
-            logger.error(f"Error args: {e.args}")
-            logger.error("Full traceback:", exc_info=True)
-            logger.error("=" * 50)
+            logger.error("Error in FrontendAppView", exc_info=True)
             return HttpResponse(f"Error serving frontend: {str(e)}", status=500)
-            
+
     def options(self, request, *args, **kwargs):
         response = HttpResponse()
+        self._add_cors_headers(response)
+        return response
+
+    def _add_cors_headers(self, response):
         response["Access-Control-Allow-Origin"] = "*"
         response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
         response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
         response["Access-Control-Allow-Credentials"] = "true"
+
+class FrontendAssetView(View):
+    """
+    Serve files from FRONTEND_DIR. Fingerprinted paths from the asset manifest
+    are immutable; everything else is revalidated against its ETag.
+    """
+    IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    def get(self, request, path):
+        manifest = asset_manifest.get()
+        entry = manifest.hashed.get(path)
+        try:
+            full_path = safe_join(settings.FRONTEND_DIR, path)
+        except SuspiciousFileOperation:
+            raise Http404("Invalid path")
+
+        encoding = None
+        range_header = request.headers.get('Range')
+        if entry is not None and entry.encodings and not range_header:
+            encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), entry.encodings)
+
+        serve_path = full_path + ENCODING_SUFFIXES[encoding] if encoding else full_path
+        try:
+            f = open(serve_path, 'rb')
+        except (FileNotFoundError, IsADirectoryError):
+            raise Http404("Asset not found")
+        st = os.fstat(f.fileno())
+
+        if entry is not None:
+            etag = entry.etag if encoding is None else f'{entry.etag[:-1]}-{encoding}"'
+            cache_control = self.IMMUTABLE_CACHE_CONTROL
+        else:
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+            cache_control = "no-cache"
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            f.close()
+            response = HttpResponseNotModified()
+            self._set_cache_headers(response, etag, cache_control, st)
+            return response
+
+        byte_range = None
+        if range_header and self._if_range_matches(request, etag):
+            byte_range = parse_range(range_header, st.st_size)
+            if byte_range is False:
+                f.close()
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{st.st_size}"
+                return response
+
+        content_type, _ = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if byte_range:
+            start, end = byte_range
+            response = FileResponse(RangeFile(f, start, end), status=206, content_type=content_type)
+            response["Content-Length"] = str(end - start + 1)
+            response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        else:
+            # FileResponse hands the file to wsgi.file_wrapper, i.e. sendfile under gunicorn
+            response = FileResponse(f, content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        if entry is not None and entry.encodings:
+            response["Vary"] = "Accept-Encoding"
+        response["Accept-Ranges"] = "bytes"
+        self._set_cache_headers(response, etag, cache_control, st)
         return response
+
+    def _if_range_matches(self, request, etag):
+        if_range = request.headers.get('If-Range')
+        return if_range is None or if_range == etag
+
+    def _set_cache_headers(self, response, etag, cache_control, st):
+        response["ETag"] = etag
+        response["Cache-Control"] = cache_control
+        response["Last-Modified"] = http_date(st.st_mtime)
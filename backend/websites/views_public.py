@@ -1,5 +1,21 @@
-from rest_framework import viewsets
+import copy
+
+from cacheops import invalidate_obj
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+from django_tenants.utils import get_public_schema_name
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from tenants.models import Tenant
+from website_builder.idempotency import idempotent
 from .models import Website, WebsiteConfig, Template, PreviewEmail, PreviewEmailTracker, BulkWebsiteCreator
 from .serializers import (
     WebsiteSerializer,
@@ -7,110 +23,322 @@ from .serializers import (
     TemplateSerializer,
     PreviewEmailSerializer,
     PreviewEmailTrackerSerializer,
-    BulkWebsiteCreatorSerializer
+    BulkWebsiteCreatorSerializer,
+    parse_fieldset
 )
+from .managers import tenant_field
+from .pagination import CreatedAtCursorPagination
+from .views import TenantScopedViewSetMixin
+from . import documents, render_cache, rollups, tracking
 import logging
 
 logger = logging.getLogger(__name__)
 
-class WebsiteViewSet(viewsets.ModelViewSet):
+class SparseFieldsetQuerysetMixin:
+    """
+    Restrict the SELECT column list to the fields requested with ?fields= /
+    ?omit= (see SparseFieldsetMixin), so large JSON columns that won't be
+    serialized aren't fetched either.
+    """
+    # Columns needed regardless of the fieldset, e.g. for cursor pagination
+    always_fetch = ('id', 'created_at')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_fields = self.get_serializer_class()().fields
+        selected = parse_fieldset(self.request, serializer_fields.keys())
+        if selected is None:
+            return queryset
+        concrete = {f.name for f in queryset.model._meta.concrete_fields}
+        columns = set(self.always_fetch)
+        for name in selected:
+            source = serializer_fields[name].source
+            if source in concrete:
+                columns.add(source)
+        return queryset.only(*columns)
+
+class RequestLogMixin:
+    """
+    One structured log line per handled request. Volume is controlled by
+    the sampling rate for this logger in settings.LOG_SAMPLE_RATES.
+    """
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s.%s -> %s", type(self).__name__, self.action, response.status_code,
+                extra={
+                    'view': type(self).__name__,
+                    'action': self.action,
+                    'pk': kwargs.get('pk'),
+                    'status': response.status_code,
+                },
+            )
+        return response
+
+class BulkWriteMixin:
+    """
+    POST <list url>/bulk/ with a JSON array of objects. Items with an "id"
+    are partial updates of that object, the others are creates. Every item
+    is validated by the viewset's serializer before anything is written;
+    valid items are then saved with bulk_create/bulk_update in one
+    transaction, and the response lists a result per item. With ?atomic=1
+    nothing is written unless every item is valid.
+
+    Send an Idempotency-Key header to make retries safe. Note that bulk
+    writes don't send post_save; see after_bulk_write.
+    """
+    bulk_max_items = 1000
+    bulk_batch_size = 500
+    # Serializer field -> model of related ids resolved with one in_bulk()
+    bulk_prefetch = {}
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        return idempotent(request, f'{type(self).__name__}.bulk', lambda: self.bulk_write(request))
+
+    def _prefetch_related(self, items):
+        prefetched = {}
+        for field, model in self.bulk_prefetch.items():
+            ids = {item[field] for item in items if isinstance(item.get(field), (int, str))}
+            prefetched[model] = model.objects.in_bulk([i for i in ids if str(i).isdigit()])
+        return prefetched
+
+    def _item_pk(self, item, pk_field):
+        try:
+            return pk_field.to_python(item['id'])
+        except Exception:
+            return None
+
+    def bulk_write(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValidationError({'detail': 'Expected a JSON array of objects.'})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'detail': f'At most {self.bulk_max_items} items per request.'})
+
+        queryset = self.get_queryset()
+        model = queryset.model
+        pk_field = model._meta.pk
+        existing = queryset.in_bulk([
+            pk for pk in (self._item_pk(item, pk_field) for item in items if 'id' in item) if pk is not None
+        ])
+        context = self.get_serializer_context()
+        context['prefetched'] = self._prefetch_related(items)
+        serializer_class = self.get_serializer_class()
+        unique_fields = [
+            f.attname for f in model._meta.concrete_fields if f.unique and not f.primary_key
+        ]
+        tenant_attr = tenant_field(model)
+
+        results, creates, updates, update_fields = {}, [], [], set()
+        # Updated objects as loaded, for cache invalidation
+        originals = []
+        seen_unique = {name: set() for name in unique_fields}
+        for index, item in enumerate(items):
+            if 'id' in item:
+                instance = existing.get(self._item_pk(item, pk_field))
+                if instance is None:
+                    results[index] = {'index': index, 'status': 'error', 'errors': {'id': ['Not found.']}}
+                    continue
+                serializer = serializer_class(instance, data=item, partial=True, context=context)
+            else:
+                serializer = serializer_class(data=item, context=context)
+            if not serializer.is_valid():
+                results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+                continue
+
+            obj = serializer.instance or model()
+            original = copy.copy(obj)
+            for attr, value in serializer.validated_data.items():
+                setattr(obj, attr, value)
+            if tenant_attr is not None and serializer.instance is None:
+                # Same as TenantScopedViewSetMixin.perform_create
+                setattr(obj, tenant_attr, request.tenant)
+            duplicate = [
+                name for name in unique_fields
+                if getattr(obj, name) is not None and getattr(obj, name) in seen_unique[name]
+            ]
+            if duplicate:
+                results[index] = {'index': index, 'status': 'error', 'errors': {
+                    name: ['Duplicate value within this request.'] for name in duplicate
+                }}
+                continue
+            for name in unique_fields:
+                seen_unique[name].add(getattr(obj, name))
+            if serializer.instance is None:
+                creates.append((index, obj))
+            else:
+                updates.append((index, obj))
+                originals.append(original)
+                update_fields.update(
+                    model._meta.get_field(attr).attname for attr in serializer.validated_data
+                )
+
+        if results and request.query_params.get('atomic') in ('1', 'true'):
+            return Response({'results': self._ordered(results)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            model.objects.bulk_create([obj for _, obj in creates], batch_size=self.bulk_batch_size)
+            if updates and update_fields:
+                now = timezone.now()
+                for field in model._meta.concrete_fields:
+                    if getattr(field, 'auto_now', False):
+                        for _, obj in updates:
+                            setattr(obj, field.attname, now)
+                        update_fields.add(field.attname)
+                model.objects.bulk_update(
+                    [obj for _, obj in updates], sorted(update_fields), batch_size=self.bulk_batch_size,
+                )
+                # bulk_update() bypasses cacheops (bulk_create doesn't): drop
+                # cached queries matching the rows before or after the change
+                changed = originals + [obj for _, obj in updates]
+
+                def invalidate():
+                    for obj in changed:
+                        invalidate_obj(obj)
+
+                transaction.on_commit(invalidate)
+            self.after_bulk_write([obj for _, obj in creates + updates])
+
+        for index, obj in creates:
+            results[index] = {'index': index, 'status': 'created', 'id': obj.pk}
+        for index, obj in updates:
+            results[index] = {'index': index, 'status': 'updated', 'id': obj.pk}
+        errors = sum(1 for result in results.values() if result['status'] == 'error')
+        return Response(
+            {
+                'created': len(creates),
+                'updated': len(updates),
+                'errors': errors,
+                'results': self._ordered(results),
+            },
+            status=status.HTTP_207_MULTI_STATUS if errors else status.HTTP_200_OK,
+        )
+
+    def _ordered(self, results):
+        return [results[index] for index in sorted(results)]
+
+    def after_bulk_write(self, objs):
+        """
+        Hook for work post_save receivers would otherwise do
+        """
+
+def series_response(request, series, **lookup):
+    """
+    Run a websites.rollups series function with ?granularity=, ?start= and
+    ?end= (ISO 8601) from the request
+    """
+    params = request.query_params
+    bounds = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        if value:
+            bounds[name] = parse_datetime(value)
+            if bounds[name] is None:
+                raise ValidationError({name: 'Expected an ISO 8601 datetime.'})
+            if timezone.is_naive(bounds[name]):
+                bounds[name] = timezone.make_aware(bounds[name])
+    granularity = params.get('granularity', 'hour')
+    try:
+        buckets = series(granularity=granularity, **bounds, **lookup)
+    except ValueError as e:
+        raise ValidationError({'detail': str(e)})
+    return Response({'granularity': granularity, 'buckets': buckets})
+
+class WebsiteViewSet(TenantScopedViewSetMixin, RequestLogMixin, BulkWriteMixin, SparseFieldsetQuerysetMixin, viewsets.ModelViewSet):
     queryset = Website.objects.all()
     serializer_class = WebsiteSerializer
     permission_classes = [AllowAny]
+    pagination_class = CreatedAtCursorPagination
+    bulk_prefetch = {'tenant': Tenant}
 
-    def list(self, request, *args, **kwargs):
-        logger.info("🔵 Fetching all websites")
-        try:
-            response = super().list(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched {len(response.data)} websites")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in WebsiteViewSet.list:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-    def retrieve(self, request, *args, **kwargs):
-        logger.info(f"🔵 Fetching website with ID: {kwargs.get('pk')}")
-        try:
-            response = super().retrieve(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched website: {response.data.get('name', 'Unknown')}")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in WebsiteViewSet.retrieve:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-class WebsiteConfigViewSet(viewsets.ModelViewSet):
-    queryset = WebsiteConfig.objects.all()
+    def after_bulk_write(self, objs):
+        for website in objs:
+            render_cache.refresh_on_commit(website.pk)
+            documents.reload_on_commit(website.pk, website)
+
+    @action(detail=True, methods=['get'])
+    def traffic(self, request, pk=None):
+        """
+        Pageviews, visitors and referrers per minute, hour or day
+        """
+        return series_response(request, rollups.traffic_series, website_id=self.get_object().pk)
+
+    @action(detail=True, methods=['get'], url_path='email-opens')
+    def email_opens(self, request, pk=None):
+        """
+        Opens of all of this website's preview emails per bucket
+        """
+        return series_response(request, rollups.email_open_series, website_id=self.get_object().pk)
+
+@require_safe
+def published_website(request, pk):
+    """
+    Public payload of a published website straight from the render cache,
+    without going through DRF's serializer and renderer stack
+    """
+    entry = render_cache.get(pk)
+    if entry.body is None:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    etag = f'"{entry.revision}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry.body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@never_cache
+@require_safe
+def preview_email_open(request, pk):
+    """
+    Tracking pixel of a preview email. The open is buffered and written in
+    a batch by websites.tracking, so this never touches the database.
+    """
+    if connection.schema_name == get_public_schema_name():
+        # No preview emails outside tenant schemas
+        return HttpResponse(status=404)
+    tracking.record_open(
+        pk, timezone.now(),
+        ip_address=request.META.get('REMOTE_ADDR'),
+        user_agent=request.headers.get('User-Agent'),
+    )
+    return HttpResponse(tracking.PIXEL, content_type='image/gif')
+
+class WebsiteConfigViewSet(TenantScopedViewSetMixin, RequestLogMixin, BulkWriteMixin, viewsets.ModelViewSet):
+    # The nested TemplateSerializer reads config.template; user_id is a plain
+    # column so 'user' needs no join
+    queryset = WebsiteConfig.objects.select_related('template')
     serializer_class = WebsiteConfigSerializer
     permission_classes = [AllowAny]
+    bulk_prefetch = {'template_id': Template}
 
-    def list(self, request, *args, **kwargs):
-        logger.info("🔵 Fetching all website configs")
-        try:
-            response = super().list(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched {len(response.data)} website configs")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in WebsiteConfigViewSet.list:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-    def retrieve(self, request, *args, **kwargs):
-        logger.info(f"🔵 Fetching website config with ID: {kwargs.get('pk')}")
-        try:
-            response = super().retrieve(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched website config: {response.data.get('company_name', 'Unknown')}")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in WebsiteConfigViewSet.retrieve:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-class TemplateViewSet(viewsets.ModelViewSet):
+class TemplateViewSet(TenantScopedViewSetMixin, RequestLogMixin, viewsets.ModelViewSet):
     queryset = Template.objects.all()
     serializer_class = TemplateSerializer
     permission_classes = [AllowAny]
 
-    def list(self, request, *args, **kwargs):
-        logger.info("🔵 Fetching all templates")
-        try:
-            response = super().list(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched {len(response.data)} templates")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in TemplateViewSet.list:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-    def retrieve(self, request, *args, **kwargs):
-        logger.info(f"🔵 Fetching template with ID: {kwargs.get('pk')}")
-        try:
-            response = super().retrieve(request, *args, **kwargs)
-            logger.info(f"✅ Successfully fetched template: {response.data.get('name', 'Unknown')}")
-            return response
-        except Exception as e:
-            logger.error("🔴 Error in TemplateViewSet.retrieve:")
-            logger.error(f"• Error type: {type(e).__name__}")
-            logger.error(f"• Error message: {str(e)}")
-            raise
-
-class PreviewEmailViewSet(viewsets.ModelViewSet):
+class PreviewEmailViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = PreviewEmail.objects.all()
     serializer_class = PreviewEmailSerializer
     permission_classes = [AllowAny]
 
-class PreviewEmailTrackerViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'])
+    def opens(self, request, pk=None):
+        """
+        Opens of this preview email per minute, hour or day
+        """
+        return series_response(request, rollups.email_open_series, preview_email_id=self.get_object().pk)
+
+class PreviewEmailTrackerViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = PreviewEmailTracker.objects.all()
     serializer_class = PreviewEmailTrackerSerializer
     permission_classes = [AllowAny]
 
-class BulkWebsiteCreatorViewSet(viewsets.ModelViewSet):
+class BulkWebsiteCreatorViewSet(TenantScopedViewSetMixin, viewsets.ModelViewSet):
     queryset = BulkWebsiteCreator.objects.all()
     serializer_class = BulkWebsiteCreatorSerializer
     permission_classes = [AllowAny] 
\ No newline at end of file